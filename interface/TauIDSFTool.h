@@ -21,11 +21,15 @@
 #include <TF1.h>     // TF1
 #include <TString.h> // Form
 #include <TGraph.h>     // TGraph
+#include <ROOT/RVec.hxx> // ROOT::RVec
 #include <string>    // std::string
 #include <vector>    // std::vector
 #include <map>       // std::map
+#include <set>       // std::set
+#include <array>     // std::array
 #include <stdlib.h>  // getenv
 #include <functional>
+#include <stdexcept> // std::invalid_argument
 
 class TauIDSFTool {
 
@@ -38,8 +42,24 @@ class TauIDSFTool {
     std::map<std::string, const TF1*> funcs_dm1;
     std::map<std::string, const TF1*> funcs_dm10;
     std::map<std::string, const TF1*> funcs_dm11;
+    std::set<std::string> uncs_dm; // names of the DM- and pT-dependent functions that exist for at least one DM
     [[noreturn]] void disabled() const;
 
+    // uncertainty variation resolved once by getUncHandle, so the getters need no string comparisons or map look-ups
+    struct Variation {
+      std::array<const TF1*,4> funcs = {{nullptr,nullptr,nullptr,nullptr}}; // vs. pT: first only; vs. DM and pT: per DM 0, 1, 10, 11
+      std::array<double,2> statShift = {{0.,0.}}; // high pT: additive shift for pT < 200 and pT >= 200 GeV
+      std::array<double,2> systShift = {{0.,0.}};
+      int sign = 0;                          // vs. DM or eta: +1 (-1) to add (subtract) the bin error
+      bool extrapUp = false;                 // high pT: multiply by the extrapolation uncertainty function f(pT)
+      bool extrapDown = false;               // high pT: multiply by 2-f(pT)
+    };
+    std::map<std::string,unsigned int> handles;
+    std::vector<Variation> variations;
+    std::array<float,2> highptSF = {{1.,1.}}; // for pT < 200 and pT >= 200 GeV
+    const TF1* extrapFunc = nullptr;
+    int dmIndex(int dm) const;
+
   public:
 
     std::string ID;
@@ -66,6 +86,62 @@ class TauIDSFTool {
     float getSFvsEta(double eta,         int genmatch, const std::string& unc="") const;
     float getSFvsDMandPT( double pt,  int dm, int genmatch, const std::string& unc="") const;
     float getSFvsDMandPT( double pt,  int dm,               const std::string& unc="") const;
+    std::vector<std::string> getUncertainties() const;
+
+    // batched getters with pre-resolved uncertainties: get a handle once per variation (before any multithreaded loop),
+    // e.g. UncHandle h = tool.getUncHandle("syst_alleras_up"), and then pass it for every (array of) tau(s);
+    // the nominal SF has handle 0
+    typedef unsigned int UncHandle;
+    UncHandle getUncHandle(const std::string& unc="");
+    float getSFvsPT(      double pt,          int genmatch, UncHandle unc) const;
+    float getHighPTSFvsPT(double pt,          int genmatch, UncHandle unc) const;
+    float getSFvsDM(      double pt,  int dm, int genmatch, UncHandle unc) const;
+    float getSFvsEta(     double eta,         int genmatch, UncHandle unc) const;
+    float getSFvsDMandPT( double pt,  int dm, int genmatch, UncHandle unc) const;
+
+    // evaluate n taus from input arrays of any numeric type, writing into a caller-provided output array
+    template<typename P, typename G>
+    void getSFvsPT(std::size_t n, const P* pt, const G* genmatch, float* out, UncHandle unc=0) const {
+      for (std::size_t i=0; i<n; ++i) out[i] = getSFvsPT(pt[i],genmatch[i],unc);
+    }
+    template<typename P, typename G>
+    void getHighPTSFvsPT(std::size_t n, const P* pt, const G* genmatch, float* out, UncHandle unc=0) const {
+      for (std::size_t i=0; i<n; ++i) out[i] = getHighPTSFvsPT(pt[i],genmatch[i],unc);
+    }
+    template<typename P, typename D, typename G>
+    void getSFvsDM(std::size_t n, const P* pt, const D* dm, const G* genmatch, float* out, UncHandle unc=0) const {
+      for (std::size_t i=0; i<n; ++i) out[i] = getSFvsDM(pt[i],dm[i],genmatch[i],unc);
+    }
+    template<typename E, typename G>
+    void getSFvsEta(std::size_t n, const E* eta, const G* genmatch, float* out, UncHandle unc=0) const {
+      for (std::size_t i=0; i<n; ++i) out[i] = getSFvsEta(eta[i],genmatch[i],unc);
+    }
+    template<typename P, typename D, typename G>
+    void getSFvsDMandPT(std::size_t n, const P* pt, const D* dm, const G* genmatch, float* out, UncHandle unc=0) const {
+      for (std::size_t i=0; i<n; ++i) out[i] = getSFvsDMandPT(pt[i],dm[i],genmatch[i],unc);
+    }
+
+    // same for RVecs (e.g. NanoAOD columns in RDataFrame); the output is resized to the number of taus
+    template<typename P, typename G>
+    void getSFvsPT(const ROOT::RVec<P>& pt, const ROOT::RVec<G>& genmatch, ROOT::RVec<float>& out, UncHandle unc=0) const {
+      out.resize(pt.size()); getSFvsPT(pt.size(),pt.data(),genmatch.data(),out.data(),unc);
+    }
+    template<typename P, typename G>
+    void getHighPTSFvsPT(const ROOT::RVec<P>& pt, const ROOT::RVec<G>& genmatch, ROOT::RVec<float>& out, UncHandle unc=0) const {
+      out.resize(pt.size()); getHighPTSFvsPT(pt.size(),pt.data(),genmatch.data(),out.data(),unc);
+    }
+    template<typename P, typename D, typename G>
+    void getSFvsDM(const ROOT::RVec<P>& pt, const ROOT::RVec<D>& dm, const ROOT::RVec<G>& genmatch, ROOT::RVec<float>& out, UncHandle unc=0) const {
+      out.resize(pt.size()); getSFvsDM(pt.size(),pt.data(),dm.data(),genmatch.data(),out.data(),unc);
+    }
+    template<typename E, typename G>
+    void getSFvsEta(const ROOT::RVec<E>& eta, const ROOT::RVec<G>& genmatch, ROOT::RVec<float>& out, UncHandle unc=0) const {
+      out.resize(eta.size()); getSFvsEta(eta.size(),eta.data(),genmatch.data(),out.data(),unc);
+    }
+    template<typename P, typename D, typename G>
+    void getSFvsDMandPT(const ROOT::RVec<P>& pt, const ROOT::RVec<D>& dm, const ROOT::RVec<G>& genmatch, ROOT::RVec<float>& out, UncHandle unc=0) const {
+      out.resize(pt.size()); getSFvsDMandPT(pt.size(),pt.data(),dm.data(),genmatch.data(),out.data(),unc);
+    }
 
 };
 
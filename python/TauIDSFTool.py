@@ -1,31 +1,86 @@
 # Author: Izaak Neutelings (July 2019)
 # https://twiki.cern.ch/twiki/bin/viewauth/CMS/TauIDRecommendationForRun2
 from __future__ import print_function
-import os
+import os, re
 from math import sqrt
-import ctypes
+import threading
+import numpy as np
 if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
-  from TauPOG.TauIDSFs.helpers import ensureTFile, extractTH1, extractTF1DMandPT
+  from TauPOG.TauIDSFs.helpers import ensurePayloadFile, extractTH1, extractTF1DMandPT, getBackend
+  from TauPOG.TauIDSFs.compiled import CompiledTF1, CompiledTH1, CompiledGraph, TabulatedTF1, WeightedSumTF1, compileState
+  from TauPOG.TauIDSFs.jagged import jaggedBatch
+  from TauPOG.TauIDSFs.manifest import getManifest, eraAliases, parseFilename
+  from TauPOG.TauIDSFs.payloadcache import iterObjects
   datapath = os.path.join(os.environ.get('CMSSW_BASE',""),"src/TauPOG/TauIDSFs/data")
 else:
-  from helpers import ensureTFile, extractTH1
+  from helpers import ensurePayloadFile, extractTH1, extractTF1DMandPT, getBackend
+  from compiled import CompiledTF1, CompiledTH1, CompiledGraph, TabulatedTF1, WeightedSumTF1, compileState
+  from jagged import jaggedBatch
+  from manifest import getManifest, eraAliases, parseFilename
+  from payloadcache import iterObjects
   datapath = os.path.join(os.environ.get('TAUIDSFs',""),"data")
 campaigns  = [
   '2016Legacy','2017ReReco','2018ReReco',
   'UL2016_preVFP', 'UL2016_postVFP', 'UL2017', 'UL2018',
 ]
+_lock      = threading.Lock() # for the rare modifications of tools after construction
+highptUncs = ['stat_bin1_up','stat_bin1_down','stat_bin2_up','stat_bin2_down',
+              'syst_up','syst_down','extrap_up','extrap_down']
+
+
+def shiftBatch(sf, err, unc=None):
+  """Apply the Up/Down variation to arrays of SFs with errors, like the non-vectorized getters:
+  Down variations are set to 0 if the error exceeds the SF; 'All' returns (down, nominal, up)."""
+  if unc=='Up':
+    return sf+err
+  elif unc=='Down':
+    return np.where(err<sf,sf-err,0.0) # prevent negative SF
+  elif unc=='All':
+    return np.where(err<sf,sf-err,0.0), sf, sf+err
+  return sf
+
+
+def selectTag(fnames, tag=None, what="payloads"):
+  """Return the single payload file of a list of files found in the manifest for one era, ID and WPs.
+  If there are several versions, the file with the given tag (e.g. 'Run3_Dec05') is returned,
+  else an IOError is raised, so that a version is never chosen silently."""
+  if tag:
+    fnames = [f for f in fnames if parseFilename(f)['tag']==tag]
+    if not fnames:
+      raise IOError("Did not find %s with tag %r!"%(what,tag))
+  if len(fnames)>1:
+    tags = sorted(parseFilename(f)['tag'] for f in fnames)
+    raise IOError("Found several versions of the %s with tags [%s]! Please choose one with the tag option."%(what,', '.join(tags)))
+  return fnames[0]
+
+
+def getToolState(tool):
+  """Picklable state of a tool, where all ROOT objects are replaced by their ROOT-free equivalents,
+  so the tool can be built once and sent to other processes (e.g. multiprocessing or Dask workers)."""
+  return compileState(tool.__dict__)
+
+
+def setToolState(tool, state):
+  """Restore a tool from its picklable state."""
+  tool.__dict__.update(state)
 
 
 class TauIDSFTool:
+    __getstate__ = getToolState
+    __setstate__ = setToolState
     
     def __init__(self, year, id, wp='Medium', wp_vsele='VVLoose', dm=False, ptdm=True, emb=False, highpT=False,
-                 otherVSlepWP=False, path=datapath, verbose=False):
+                 otherVSlepWP=False, tabulate=False, gridstep=0.05, dminclusive=False, path=datapath, verbose=False):
         """Choose the IDs and WPs for SFs. For available tau IDs and WPs, check
         https://cms-nanoaod-integration.web.cern.ch/integration/master-102X/mc102X_doc.html#Tau
         Options:
           dm:           use decay mode-dependent SFs
           emb:          use SFs for embedded samples
           otherVSlepWP: extra uncertainty if you are using a different DeepTauVSe/mu WP than used in the measurement
+          tabulate:     sample the DM- and pT-dependent SFs on a grid in pT with step gridstep (in GeV),
+                        and evaluate them by linear interpolation
+          dminclusive:  with ptdm, also provide DM-inclusive SFs, averaged over the DM- and pT-dependent SFs with the DM
+                        fractions of the high-pT measurement, sampled on a grid in pT with step gridstep (in GeV)
         """
         assert year in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year)
         self.ID       = id
@@ -45,7 +100,7 @@ class TauIDSFTool:
               raise IOError("Scale factors not available for this combination of WPs! Allowed WPs for VSjet are [%s]. Allowed WPs for VSele are [%s]"%(', '.join(allowed_wp),', '.join(allowed_wp_vsele)))
             if emb: raise IOError("Scale factors for embedded samples not available in this format! Use either pT-binned or DM-binned SFs.")
             fname = os.path.join(path,"TauID_SF_Highpt_%s_VSjet%s_VSele%s_%s.root" %(id, wp, wp_vsele, scheme))
-            file = ensureTFile(fname,verbose=verbose)
+            file = ensurePayloadFile(fname,verbose=verbose)
             year_=year
             if year_.startswith('UL'): year_=year_[2:]
             self.func         = { }
@@ -54,9 +109,11 @@ class TauIDSFTool:
             self.func['syst_oneera']   = file.Get("DMinclusive_%s_syst_%s"%(year_,year_))
             file.Close()
             fname_extrap = os.path.join(path,"TauID_SF_HighptExtrap_%s_%s.root" %(id,scheme))
-            file_extrap = ensureTFile(fname_extrap,verbose=verbose)
+            file_extrap = ensurePayloadFile(fname_extrap,verbose=verbose)
             self.func['syst_extrap']   = file_extrap.Get("uncert_func_%sVSjet_%sVSe"%(wp,wp_vsele))
             file_extrap.Close()
+            self.extrapFunc   = CompiledTF1.fromTF1(self.func['syst_extrap']) # vectorized, without ROOT
+            self.buildHighPTPlan()
 
 
           elif ptdm: # DM-dependent SFs with pT-dependence fitted
@@ -68,7 +125,7 @@ class TauIDSFTool:
               raise IOError("Scale factors not available for this combination of WPs! Allowed WPs for VSjet are [%s]. Allowed WPs for VSele are [%s]"%(', '.join(allowed_wp),', '.join(allowed_wp_vsele)))
             if emb: raise IOError("Scale factors for embedded samples not available in this format! Use either pT-binned or DM-binned SFs.")
             fname = os.path.join(path,"TauID_SF_dm_%s_VSjet%s_VSele%s_%s.root" %(id, wp, wp_vsele, scheme))
-            file = ensureTFile(fname,verbose=verbose)
+            file = ensurePayloadFile(fname,verbose=verbose)
             year_=year
             if year_.startswith('UL'): year_=year_[2:]
             uncerts=['uncert0','uncert1','syst_alleras','syst_%s' % year_]
@@ -78,6 +135,36 @@ class TauIDSFTool:
             self.funcs_dm1  = extractTF1DMandPT(file,'DM1_%s_fit' % year_,uncerts=uncerts+['syst_dm1_%s' % year_])
             self.funcs_dm10 = extractTF1DMandPT(file,'DM10_%s_fit' % year_,uncerts=uncerts+['syst_dm10_%s' % year_])
             self.funcs_dm11 = extractTF1DMandPT(file,'DM11_%s_fit' % year_,uncerts=uncerts+['syst_dm11_%s' % year_])
+            self.funcs_dm = { 0: self.funcs_dm0, 1: self.funcs_dm1, 10: self.funcs_dm10, 11: self.funcs_dm11 }
+            file.Close()
+            self.funcs_incl = None
+            if dminclusive: # average SFs with the DM fractions of the W* -> tau nu selection
+              fname_fracts = os.path.join(path,"TauID_Highpt_DMFracts_%s_VSjet%s_VSele%s_%s.root"%(id,wp,wp_vsele,scheme))
+              file_fracts = ensurePayloadFile(fname_fracts,verbose=verbose)
+              self.dmFractions = [CompiledGraph.fromTGraph(file_fracts.Get("DMFrac_DM%d_%s"%(dm_,year_))) for dm_ in self.DMs]
+              file_fracts.Close()
+              ptmax = max(g.x.max() for g in self.dmFractions) # DM fractions are constant above
+              self.funcs_incl = { }
+              for unc in sorted(set(u for funcs in self.funcs_dm.values() for u in funcs)):
+                funcs = [self.funcs_dm[dm_].get(unc,self.funcs_dm[dm_]['nom']) for dm_ in self.DMs]
+                func  = WeightedSumTF1(funcs,self.dmFractions,20.,140.,name="DMinclusive_%s_%s"%(year_,unc))
+                self.funcs_incl[unc] = TabulatedTF1(func,20.,ptmax,gridstep)
+              if verbose:
+                print(">>> TauIDSFTool: Tabulated %d DM-inclusive functions in [20,%s] GeV with step %s GeV; maximum deviation %.3g"%(
+                  len(self.funcs_incl),ptmax,gridstep,max(f.maxdev for f in self.funcs_incl.values())))
+            else:
+              self.getDMInclusiveSFvsPT      = self.disabled
+              self.getDMInclusiveSFvsPTBatch = self.disabled
+            self.tabulationErrors = None
+            if tabulate: # replace functions by tabulated ones in the pT range [20,140] GeV
+              self.tabulationErrors = { }
+              for dm_, funcs in self.funcs_dm.items():
+                for unc in funcs:
+                  funcs[unc] = TabulatedTF1(funcs[unc],20.,140.,gridstep)
+                  self.tabulationErrors[(dm_,unc)] = funcs[unc].maxdev
+              if verbose:
+                print(">>> TauIDSFTool: Tabulated %d functions with step %s GeV; maximum deviation %.3g"%(
+                  len(self.tabulationErrors),gridstep,self.getTabulationError()))
 
             self.getSFvsPT  = self.disabled
             self.getSFvsDM  = self.disabled
@@ -89,9 +176,10 @@ class TauIDSFTool:
               fname = os.path.join(path,"TauID_SF_dm_%s_%s_EMB.root"%(id,year))
             else:
               fname = os.path.join(path,"TauID_SF_dm_%s_%s.root"%(id,year))
-            file = ensureTFile(fname,verbose=verbose)
+            file = ensurePayloadFile(fname,verbose=verbose)
             self.hist = extractTH1(file,wp)
             self.hist.SetDirectory(0)
+            self.compiledHist = CompiledTH1.fromTH1(self.hist) # for vectorized evaluation without ROOT
             file.Close()
             self.filename   = fname
             self.DMs        = [0,1,10] if 'oldDM' in id else [0,1,10,11]
@@ -109,27 +197,30 @@ class TauIDSFTool:
               fname = os.path.join(path,"TauID_SF_pt_%s_%s_EMB.root"%(id,year))
             else:
               fname = os.path.join(path,"TauID_SF_pt_%s_%s.root"%(id,year))
-            file = ensureTFile(fname,verbose=verbose)
+            file = ensurePayloadFile(fname,verbose=verbose)
             self.func         = { }
             self.func[None]   = file.Get("%s_cent"%(wp))
             self.func['Up']   = file.Get("%s_up"%(wp))
             self.func['Down'] = file.Get("%s_down"%(wp))
+            self.compiledFunc = dict((unc,CompiledTF1.fromTF1(f)) for unc, f in self.func.items()) # for vectorized evaluation without ROOT
             file.Close()
             self.filename   = fname
             self.getSFvsDM  = self.disabled
             self.getSFvsEta = self.disabled
             if otherVSlepWP:
               if emb:
-                self.extraUnc = lambda pt: (0.05 if pt<100 else 0.15)
+                self.extraUncs = (0.05,0.15) # below and above 100 GeV
               else:
-                self.extraUnc = lambda pt: (0.03 if pt<100 else 0.15)
+                self.extraUncs = (0.03,0.15)
+              self.extraUnc = self.getExtraUncVsPT
         elif id in ['antiMu3','antiEleMVA6','DeepTau2017v2p1VSmu','DeepTau2017v2p1VSe']:
             if emb:
               raise IOError("Scale factors for embedded samples not available for ID '%s'!"%id)
             fname = os.path.join(path,"TauID_SF_eta_%s_%s.root"%(id,year))
-            file = ensureTFile(fname,verbose=verbose)
+            file = ensurePayloadFile(fname,verbose=verbose)
             self.hist = extractTH1(file,wp)
             self.hist.SetDirectory(0)
+            self.compiledHist = CompiledTH1.fromTH1(self.hist) # for vectorized evaluation without ROOT
             file.Close()
             self.filename   = fname
             self.genmatches = [1,3] if any(s in id.lower() for s in ['ele','vse']) else [2,4]
@@ -138,6 +229,10 @@ class TauIDSFTool:
         else:
           raise IOError("Did not recognize tau ID '%s'!"%id)
     
+    def getExtraUncVsPT(self, pt):
+        """Extra uncertainty for a different DeepTauVSe/mu WP below and above 100 GeV."""
+        return self.extraUncs[0] if pt<100 else self.extraUncs[1]
+    
     def getSFvsPT(self, pt, genmatch=5, unc=None):
         """Get tau ID SF vs. tau pT."""
         if genmatch==5:
@@ -161,41 +256,121 @@ class TauIDSFTool:
           return 1.0, 1.0, 1.0
         return 1.0
 
-    def getHighPTSFvsPT(self, pt, genmatch=5, unc=None):
-        """Get High pT tau ID SF vs. tau pT."""
-        if genmatch==5:
-          x=ctypes.c_double(0.)
-          y=ctypes.c_double(0.)
-          # we only measured for 2 pT bins 100-200 and > 200 so return 1 of 2 values depending on whether pt is less than 200 or not
-          self.func[None].GetPoint(0 if pt<200 else 1, x,y)
-          sf=float(y.value)
+    @jaggedBatch
+    def getSFvsPTBatch(self, pt, genmatch=5, unc=None):
+        """Get tau ID SF vs. tau pT for arrays of taus.
+        Returns an array of SFs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        mask     = genmatch==5
+        def evaluate(unc):
+          sf = np.ones(pt.shape)
+          sf[mask] = self.compiledFunc[unc](pt[mask])
+          return sf
+        sf = evaluate(None)
+        if self.extraUnc:
+          extraUnc = np.where(pt<100,self.extraUncs[0],self.extraUncs[1])*mask
+          errDown  = np.sqrt( (sf-evaluate('Down'))**2 + (sf*extraUnc)**2 )
+          errUp    = np.sqrt( (sf-evaluate('Up'  ))**2 + (sf*extraUnc)**2 )
+          if unc=='All':
+            return sf-errDown, sf, sf+errUp
+          elif unc=='Up':
+            return sf+errUp
+          elif unc=='Down':
+            return np.where(errDown<sf,sf-errDown,0.0) # prevent negative SF
+          return sf
+        elif unc=='All':
+          return evaluate('Down'), sf, evaluate('Up')
+        return sf if unc==None else evaluate(unc)
 
-          if not unc: return sf
+    def buildHighPTPlan(self):
+        """Precompute the high-pT SFs of the two pT bins (100-200 and > 200 GeV),
+        and the shifts of all known uncertainties, which are resolved to integer handles."""
+        def errY(graph): return np.sqrt(0.5*(graph.eyl[:2]**2+graph.eyh[:2]**2))
+        graph = CompiledGraph.fromTGraph(self.func[None])
+        # we define the stat error as the statistical error summed in quadrature with the systematic error that is uncorrelated by era
+        # in principle these could be taken as seperate uncertainties but the effect of correlating the systematic part by pT bin will be negligible overall
+        self.highptSF      = graph.y[:2].copy()
+        self.highptStatErr = np.sqrt(errY(graph)**2+errY(CompiledGraph.fromTGraph(self.func['syst_oneera']))**2)
+        self.highptSystErr = errY(CompiledGraph.fromTGraph(self.func['syst_alleras']))
+        self.highptHandles = { None: 0 } # uncertainty name -> handle
+        self.highptPlan    = [ (0.0,0.0,False,False) ] # handle -> (shift bin 1, shift bin 2, extrap up, extrap down)
+        self.highptShifts  = np.zeros((1,2))
+        self.highptExtrap  = np.zeros((1,2),dtype=bool)
+        for unc in highptUncs+['stat_up','stat_down']:
+          self.getHighPTUncHandle(unc)
 
-          if 'stat_bin1' in unc and pt<200:
-           # we define the stat error as the statistical error summed in quadrature with the systematic error that is uncorrelated by era
-           # in principle these could be taken as seperate uncertainties but the effect of correlating the systematic part by pT bin will be negligible overall 
-           if 'up' in unc:  sf+=sqrt(self.func[None].GetErrorY(0)**2 + self.func['syst_oneera'].GetErrorY(0)**2)
-           if 'down' in unc:  sf-=sqrt(self.func[None].GetErrorY(0)**2 + self.func['syst_oneera'].GetErrorY(0)**2)
-          if 'stat_bin2' in unc and pt>=200:
-           # we define the stat error as the statistical error summed in quadrature with the systematic error that is uncorrelated by era
-           # in principle these could be taken as seperate uncertainties but the effect of correlating the systematic part by pT bin will be negligible overall 
-           if 'up' in unc:  sf+=sqrt(self.func[None].GetErrorY(1)**2 + self.func['syst_oneera'].GetErrorY(1)**2)
-           if 'down' in unc:  sf-=sqrt(self.func[None].GetErrorY(1)**2 + self.func['syst_oneera'].GetErrorY(1)**2)
+    def getHighPTUncHandle(self, unc):
+        """Resolve the name of a high-pT uncertainty to an integer handle,
+        which can be passed as unc to getHighPTSFvsPT and getHighPTSFvsPTBatch."""
+        if isinstance(unc,(int,np.integer)) and not isinstance(unc,bool):
+          if not 0<=unc<len(self.highptPlan):
+            raise ValueError("Unknown high-pT uncertainty handle %r!"%(unc))
+          return int(unc)
+        if not unc:
+          return 0
+        handle = self.highptHandles.get(unc)
+        if handle is not None:
+          return handle
+        with _lock: # parse new name, once even if called from several threads
+          handle = self.highptHandles.get(unc)
+          if handle is not None:
+            return handle
+          sign  = (1.0 if 'up' in unc else 0.0) - (1.0 if 'down' in unc else 0.0)
+          shift = np.zeros(2)
+          if 'stat_bin1' in unc:
+            shift[0] += sign*self.highptStatErr[0]
+          if 'stat_bin2' in unc:
+            shift[1] += sign*self.highptStatErr[1]
           if 'stat' in unc and 'bin' not in unc:
-           # we define the stat error as the statistical error summed in quadrature with the systematic error that is uncorrelated by era
-           # in principle these could be taken as seperate uncertainties but the effect of correlating the systematic part by pT bin will be negligible overall 
-           if 'up' in unc:  sf+=sqrt(self.func[None].GetErrorY(0 if pt<200 else 1)**2 + self.func['syst_oneera'].GetErrorY(0 if pt<200 else 1)**2)
-           if 'down' in unc:  sf-=sqrt(self.func[None].GetErrorY(0 if pt<200 else 1)**2 + self.func['syst_oneera'].GetErrorY(0 if pt<200 else 1)**2)
+            shift += sign*self.highptStatErr
           if 'syst' in unc:
-           if 'up' in unc:  sf+=self.func['syst_alleras'].GetErrorY(0 if pt<200 else 1)
-           if 'down' in unc:  sf-=self.func['syst_alleras'].GetErrorY(0 if pt<200 else 1)
-          if 'extrap' in unc:
-            if 'up' in unc:  sf*=self.func['syst_extrap'].Eval(pt)
-            if 'down' in unc:  sf*=(2.-self.func['syst_extrap'].Eval(pt))
+            shift += sign*self.highptSystErr
+          extrap = ('extrap' in unc and 'up' in unc, 'extrap' in unc and 'down' in unc)
+          self.highptShifts = np.vstack([self.highptShifts,shift])
+          self.highptExtrap = np.vstack([self.highptExtrap,extrap])
+          self.highptPlan.append((float(shift[0]),float(shift[1]))+extrap)
+          handle = len(self.highptPlan)-1
+          self.highptHandles[unc] = handle
+        return handle
 
+    def getHighPTSFvsPT(self, pt, genmatch=5, unc=None):
+        """Get High pT tau ID SF vs. tau pT."""
+        if genmatch==5:
+          # we only measured for 2 pT bins 100-200 and > 200 so return 1 of 2 values depending on whether pt is less than 200 or not
+          ibin = 0 if pt<200 else 1
+          sf   = float(self.highptSF[ibin])
+          if not unc: return sf
+          shift1, shift2, extrapUp, extrapDown = self.highptPlan[self.getHighPTUncHandle(unc)]
+          sf += shift2 if ibin else shift1
+          if extrapUp:   sf*=self.extrapFunc.Eval(pt)
+          if extrapDown: sf*=(2.-self.extrapFunc.Eval(pt))
           return sf
         return 1.0
+
+    @jaggedBatch
+    def getHighPTExtrapBatch(self, pt, genmatch=5):
+        """Get the up and down multipliers (f and 2-f) of the high-pT SF for the extrapolation
+        uncertainty for arrays of taus. Returns (up, down); multipliers of non-genuine taus are 1."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        up       = np.where(genmatch==5,self.extrapFunc(pt),1.0)
+        return up, 2.-up
+
+    @jaggedBatch
+    def getHighPTSFvsPTBatch(self, pt, genmatch=5, unc=None):
+        """Get High pT tau ID SF vs. tau pT for arrays of taus."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        ibin     = (pt>=200).astype(np.intp) # pT bins 100-200 and > 200 GeV
+        handle   = self.getHighPTUncHandle(unc)
+        sf       = (self.highptSF+self.highptShifts[handle])[ibin] if handle else self.highptSF[ibin]
+        extrapUp, extrapDown = self.highptExtrap[handle]
+        if extrapUp or extrapDown:
+          extrap = self.extrapFunc(pt)
+          if extrapUp:   sf = sf*extrap
+          if extrapDown: sf = sf*(2.-extrap)
+        return np.where(genmatch==5,sf,1.0)
     
     def getSFvsDM(self, pt, dm, genmatch=5, unc=None):
         """Get tau ID SF vs. tau DM."""
@@ -217,6 +392,24 @@ class TauIDSFTool:
           return 1.0, 1.0, 1.0
         return 1.0
    
+    @jaggedBatch
+    def getSFvsDMBatch(self, pt, dm, genmatch=5, unc=None):
+        """Get tau ID SF vs. tau DM for arrays of taus.
+        Returns an array of SFs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        dm       = np.broadcast_to(np.asarray(dm),pt.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        hist     = self.compiledHist
+        mask     = (genmatch==5) & np.isin(dm,self.DMs) & (pt>40)
+        bins     = hist.GetXaxis().findBins(dm[mask])
+        sf       = np.ones(pt.shape)
+        err      = np.zeros(pt.shape)
+        sf[mask]  = hist.contents[bins]
+        err[mask] = hist.errors[bins]
+        if self.extraUnc:
+          err[mask] = np.sqrt( err[mask]**2 + (sf[mask]*self.extraUnc)**2 )
+        return shiftBatch(sf,err,unc)
+   
     def getSFvsDMandPT(self, pt, dm, genmatch=5, unc=None):
         """Get tau ID SF vs. tau DM with pT dependence fitted"""
         if genmatch==5 and dm in self.DMs:
@@ -232,6 +425,70 @@ class TauIDSFTool:
           return sf
         else:
           return 1.0
+
+    def getDMInclusiveSFvsPT(self, pt, genmatch=5, unc=None):
+        """Get DM-inclusive tau ID SF vs. tau pT, averaged over the DM- and pT-dependent SFs with the DM fractions."""
+        if genmatch==5:
+          return self.funcs_incl[unc or 'nom'].Eval(pt)
+        return 1.0
+
+    @jaggedBatch
+    def getDMInclusiveSFvsPTBatch(self, pt, genmatch=5, unc=None):
+        """Get DM-inclusive tau ID SF vs. tau pT for arrays of taus.
+        Returns an array of SFs, or a dictionary of arrays for all variations if unc=='All'."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        mask     = (genmatch==5)
+        if unc=='All':
+          uncs = sorted(self.funcs_incl)
+        elif unc and unc not in self.funcs_incl:
+          raise KeyError("Unknown uncertainty %r for getDMInclusiveSFvsPTBatch!"%(unc))
+        else:
+          uncs = [ unc or 'nom' ]
+        sfs = { }
+        for u in uncs:
+          sf = np.ones(pt.shape)
+          sf[mask] = self.funcs_incl[u](pt[mask])
+          sfs[u] = sf
+        if unc=='All':
+          return sfs
+        return sfs[uncs[0]]
+
+    def getTabulationError(self):
+        """Get the maximum deviation of the tabulated DM- and pT-dependent SFs from the exact functions."""
+        if not self.tabulationErrors:
+          return 0.0
+        return max(self.tabulationErrors.values())
+
+    @jaggedBatch
+    def getSFvsDMandPTBatch(self, pt, dm, genmatch=5, unc=None):
+        """Get tau ID SF vs. tau DM with pT dependence fitted for arrays of taus.
+        Returns an array of SFs, or a dictionary of arrays for all variations if unc=='All'.
+        Variations that only exist for one DM (e.g. 'syst_dm0_2018_up') leave the other DMs at their nominal SF."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        dm       = np.broadcast_to(np.asarray(dm),pt.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        ptclamp  = np.clip(pt,20.,140.)
+        masks    = [ ]
+        for dm_ in self.DMs:
+          mask = (genmatch==5) & (dm==dm_)
+          if mask.any():
+            masks.append((mask,ptclamp[mask],self.funcs_dm[dm_]))
+        if unc=='All':
+          uncs = sorted(set(u for dm_ in self.DMs for u in self.funcs_dm[dm_]))
+        elif unc and not any(unc in self.funcs_dm[dm_] for dm_ in self.DMs):
+          raise KeyError("Unknown uncertainty %r for getSFvsDMandPTBatch!"%(unc))
+        else:
+          uncs = [ unc or 'nom' ]
+        sfs = { }
+        for u in uncs:
+          sf = np.ones(pt.shape)
+          for mask, ptmasked, funcs in masks:
+            sf[mask] = funcs.get(u,funcs['nom'])(ptmasked)
+          sfs[u] = sf
+        if unc=='All':
+          return sfs
+        return sfs[uncs[0]]
  
     def getSFvsEta(self, eta, genmatch, unc=None):
         """Get tau ID SF vs. tau eta."""
@@ -254,74 +511,182 @@ class TauIDSFTool:
           return 1.0, 1.0, 1.0
         return 1.0
     
+    @jaggedBatch
+    def getSFvsEtaBatch(self, eta, genmatch, unc=None):
+        """Get tau ID SF vs. tau eta for arrays of taus.
+        Returns an array of SFs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        eta      = np.abs(np.asarray(eta,dtype=np.float64))
+        genmatch = np.broadcast_to(np.asarray(genmatch),eta.shape)
+        hist     = self.compiledHist
+        mask     = np.isin(genmatch,self.genmatches)
+        bins     = hist.GetXaxis().findBins(eta[mask])
+        sf       = np.ones(eta.shape)
+        err      = np.zeros(eta.shape)
+        sf[mask]  = hist.contents[bins]
+        err[mask] = hist.errors[bins]
+        if self.extraUnc:
+          err[mask] = np.sqrt( err[mask]**2 + (sf[mask]*self.extraUnc)**2 )
+        return shiftBatch(sf,err,unc)
+    
     @staticmethod
     def disabled(*args,**kwargs):
         raise AttributeError("Disabled method.")
     
 
 class TauESTool:
-    def __init__(self, year, id='DeepTau2017v2p1VSjet', wp='Medium', wp_vsele='VVLoose', path=datapath, verbose=False):
-        """Choose the IDs and WPs for SFs."""
-        if "UL" in year:
+    __getstate__ = getToolState
+    __setstate__ = setToolState
+    
+    def __init__(self, year, id='DeepTau2017v2p1VSjet', wp='Medium', wp_vsele='VVLoose', path=datapath, verbose=False, tag=None):
+        """Choose the IDs and WPs for SFs.
+        Eras that are not in campaigns (e.g. Run 3) are looked up in the manifest of the data directory.
+        If there are several versions of the payload for an era, choose one with tag (e.g. 'Run3_Dec05')."""
+        run3 = year not in campaigns
+        if run3:
+          eras = getManifest(path,verbose=verbose).eras('tes')+getManifest(path).eras('tes_sf')
+          assert any(e in eras for e in eraAliases(year)), "You must choose a year from %s! Got %r."%(
+            ', '.join(campaigns+self.getRun3Eras(id,wp,wp_vsele,path=path)),year)
+          year_highpt = None
+        elif "UL" in year:
           print(">>> TauESTool: Warning! Using pre-UL (%r) TESs at high pT (for uncertainties only)..."%(year))
           year_highpt = '2016Legacy' if '2016' in year else '2017ReReco' if '2017' in year else '2018ReReco'
         else:
           year_highpt = year
-        assert year in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year)
-        assert year_highpt in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year_highpt)
+        assert run3 or year_highpt in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year_highpt)
         self.pt_low  = 34  # average pT in Z -> tautau measurement (incl. in DM)
         self.pt_high = 170 # average pT in W* -> taunu measurement (incl. in DM)
         self.DMs     = [0,1,10] if "oldDM" in id else [0,1,10,11]
         # the new scheme for deepTau v2p5 does not apply any shift in the nominal values of the TES and uses a 1.5% (2%) uncertainty for DM != (=) 11 for lowpt
         # for high pT the uncertainties are increased to 3% 
         self.Jul18_scheme=False
+        self.funcs_dm=None
         if id=='DeepTau2018v2p5VSjet': 
           allowed_wp=['Loose','Medium','Tight','VTight']
           allowed_wp_vsele=['VVLoose','Tight']
           if wp not in allowed_wp or wp_vsele not in allowed_wp_vsele:
             raise IOError("TES corrections not available for this combination of WPs! Allowed WPs for VSjet are [%s]. Allowed WPs for VSele are [%s]"%(', '.join(allowed_wp),', '.join(allowed_wp_vsele)))
           self.Jul18_scheme=True
-          fname_lowpt  = os.path.join(path,"TauES_dm_%s_%s_VSjet%s_VSele%s_Jul18.root"%(id,year, wp, wp_vsele))
+          if run3:
+            fname_lowpt = self.findRun3(year,id,wp,wp_vsele,path=path,verbose=verbose,tag=tag)
+            if fname_lowpt is None: # pT-dependent TES from functions
+              return
+          else:
+            fname_lowpt  = os.path.join(path,"TauES_dm_%s_%s_VSjet%s_VSele%s_Jul18.root"%(id,year, wp, wp_vsele))
+        elif run3:
+          raise IOError("TES corrections for %s not available for ID '%s'!"%(year,id))
         if not self.Jul18_scheme:
           fname_lowpt  = os.path.join(path,"TauES_dm_%s_%s.root"%(id,year))
           fname_highpt = os.path.join(path,"TauES_dm_%s_%s_ptgt100.root"%(id,year_highpt))
-          file_highpt  = ensureTFile(fname_highpt,verbose=verbose)
+          file_highpt  = ensurePayloadFile(fname_highpt,verbose=verbose)
           self.hist_highpt = extractTH1(file_highpt,'tes')
           self.hist_highpt.SetDirectory(0)
+          self.compiledHist_highpt = CompiledTH1.fromTH1(self.hist_highpt) # for vectorized evaluation without ROOT
           file_highpt.Close()
           self.filename = fname_lowpt
           self.filename_highpt = fname_highpt
-        file_lowpt   = ensureTFile(fname_lowpt, verbose=verbose)
+        file_lowpt   = ensurePayloadFile(fname_lowpt, verbose=verbose)
         self.hist_lowpt  = extractTH1(file_lowpt, 'tes')
         self.hist_lowpt.SetDirectory(0)
         file_lowpt.Close()
+        self.filename = fname_lowpt
+        
+        # LOOKUP TABLES indexed by DM: nominal TES, errors at low and high pT,
+        # and slope of the linear interpolation of the error between pt_low and pt_high
+        ndms = max(self.DMs)+1
+        self.valid_dm   = np.zeros(ndms,dtype=bool)
+        self.tes_dm     = np.ones(ndms)
+        self.errlow_dm  = np.zeros(ndms)
+        self.errhigh_dm = np.zeros(ndms)
+        self.slope_dm   = np.zeros(ndms)
+        for dm in self.DMs:
+          bin = self.hist_lowpt.GetXaxis().FindBin(dm)
+          self.valid_dm[dm]  = True
+          self.tes_dm[dm]    = self.hist_lowpt.GetBinContent(bin)
+          self.errlow_dm[dm] = self.hist_lowpt.GetBinError(bin)
+          if self.Jul18_scheme:
+            self.errhigh_dm[dm] = 0.03 # larger uncertainty for pT > 140 GeV
+          else:
+            bin_high = self.hist_highpt.GetXaxis().FindBin(dm)
+            self.errhigh_dm[dm] = self.hist_highpt.GetBinError(bin_high)
+            self.slope_dm[dm]   = (self.errhigh_dm[dm]-self.errlow_dm[dm])/(self.pt_high-self.pt_low)
+        self.table = { dm: (float(self.tes_dm[dm]),float(self.errlow_dm[dm]),float(self.errhigh_dm[dm]),float(self.slope_dm[dm]))
+                       for dm in self.DMs } # for fast scalar look up
  
+    def findRun3(self, year, id, wp, wp_vsele, path=datapath, verbose=False, tag=None):
+        """Find the TES payload for an era that is not in campaigns (e.g. Run 3) in the manifest of the data directory.
+        Return the file with a DM-binned 'tes' histogram, or else load DM- and pT-dependent functions
+        (e.g. 'DM0_2023C', 'DM0_2023C_up', ...) into funcs_dm and return None.
+        If several versions (tags) of the payload can be loaded, the tag has to be given."""
+        manifest = getManifest(path,verbose=verbose)
+        what     = "TES for %s, ID '%s' with VSjet WP %s and VSele WP %s"%(year,id,wp,wp_vsele)
+        fnames   = [f for f in manifest.find('tes',year,id=id,wp=wp,wp_vsele=wp_vsele) if self.hasHistogram(f,verbose=verbose)]
+        if fnames:
+          return selectTag(fnames,tag,what)
+        fnames   = manifest.find('tes_sf',year,id=id,wp=wp,wp_vsele=wp_vsele)
+        if fnames:
+          fname = selectTag(fnames,tag,what)
+          file  = ensurePayloadFile(fname,verbose=verbose)
+          funcs = { }
+          for dm in self.DMs:
+            funcs[dm] = tuple(file.Get("DM%d_%s%s"%(dm,year,s)) for s in ['_down','','_up'])
+          file.Close()
+          if not all(f for dm in funcs for f in funcs[dm]):
+            raise IOError("Did not find TES functions for %s in '%s'! Choose one of the eras [%s]"%(
+              year,fname,', '.join(self.getRun3Eras(id,wp,wp_vsele,path=path))))
+          self.funcs_dm = dict((dm,tuple(CompiledTF1.fromTF1(f) for f in funcs[dm])) for dm in funcs) # down, nom, up
+          self.filename = fname
+          return None
+        raise IOError("TES corrections for %s not available for ID '%s' with VSjet WP %s and VSele WP %s!"%(year,id,wp,wp_vsele))
+
+    @staticmethod
+    def hasHistogram(fname, verbose=False):
+        """Return True if a TES payload file has a DM-binned 'tes' histogram (and not e.g. a graph)."""
+        file = ensurePayloadFile(fname,verbose=verbose)
+        hist = file.Get('tes')
+        file.Close()
+        return isinstance(hist,CompiledTH1) or (hasattr(hist,'InheritsFrom') and hist.InheritsFrom('TH1'))
+
+    @staticmethod
+    def getRun3Eras(id='DeepTau2018v2p5VSjet', wp='Medium', wp_vsele='VVLoose', path=datapath):
+        """Return the eras that are not in campaigns, for which findRun3 can load the TES of an ID and WPs:
+        the eras of the files with a DM-binned 'tes' histogram, and the eras in the names of the functions
+        of the files with DM- and pT-dependent TES (e.g. '2023C' for 'DM0_2023C' in a file for '2023')."""
+        manifest = getManifest(path)
+        eras     = set()
+        for fname in manifest.find('tes',id=id,wp=wp,wp_vsele=wp_vsele):
+          if TauESTool.hasHistogram(fname):
+            eras.add(parseFilename(fname)['era'])
+        for fname in manifest.find('tes_sf',id=id,wp=wp,wp_vsele=wp_vsele):
+          era = parseFilename(fname)['era']
+          for name, _ in iterObjects(fname,backend=getBackend()):
+            match = re.match(r"^DM0_(%s\w*?)(?:_up|_down)?$"%(era),name) # function of a (sub-)era
+            if match:
+              eras.add(match.group(1))
+        return sorted(e for e in eras if e not in campaigns)
+    
     def getTES(self, pt, dm, genmatch=5, unc=None):
         """Get tau ES vs. tau DM."""
-        if genmatch==5 and dm in self.DMs:
+        if genmatch==5 and self.funcs_dm is not None and dm in self.funcs_dm:
+          funcs = self.funcs_dm[dm]
+          if unc=='All':
+            return funcs[0].Eval(pt), funcs[1].Eval(pt), funcs[2].Eval(pt)
+          return funcs[2 if unc=='Up' else 0 if unc=='Down' else 1].Eval(pt)
+        elif genmatch==5 and self.funcs_dm is None and dm in self.DMs:
+          tes, err_low, err_high, slope = self.table[dm]
           if self.Jul18_scheme:
             if pt<140.:
-              bin = self.hist_lowpt.GetXaxis().FindBin(dm)
-              tes = self.hist_lowpt.GetBinContent(bin)
-              err = self.hist_lowpt.GetBinError(bin)
+              err = err_low
             else:
               # no nominal correction and larger uncertainty for high pT 
-              err=0.03
-              tes=1.0
-          else:
-            bin = self.hist_lowpt.GetXaxis().FindBin(dm)
-            tes = self.hist_lowpt.GetBinContent(bin)
-            if unc!=None:
-              if pt>=self.pt_high: # high pT
-                bin_high = self.hist_highpt.GetXaxis().FindBin(dm)
-                err      = self.hist_highpt.GetBinError(bin_high)
-              elif pt>self.pt_low: # linearly interpolate between low and high pT
-                bin_high = self.hist_highpt.GetXaxis().FindBin(dm)
-                err_high = self.hist_highpt.GetBinError(bin_high)
-                err_low  = self.hist_lowpt.GetBinError(bin)
-                err      = err_low + (err_high-err_low)/(self.pt_high-self.pt_low)*(pt-self.pt_low)
-              else: # low pT
-                err      = self.hist_lowpt.GetBinError(bin)
+              err = err_high
+              tes = 1.0
+          elif unc!=None:
+            if pt>=self.pt_high: # high pT
+              err = err_high
+            elif pt>self.pt_low: # linearly interpolate between low and high pT
+              err = err_low + slope*(pt-self.pt_low)
+            else: # low pT
+              err = err_low
           if unc!=None:
             if unc=='Up':
               tes += err
@@ -335,6 +700,39 @@ class TauESTool:
           return 1.0, 1.0, 1.0
         return 1.0
     
+    @jaggedBatch
+    def getTESBatch(self, pt, dm, genmatch=5, unc=None):
+        """Get tau ES vs. tau DM for arrays of taus, using the precomputed lookup tables.
+        Returns an array of TESs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        dm       = np.broadcast_to(np.asarray(dm),pt.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        if self.funcs_dm is not None: # DM- and pT-dependent functions
+          tes = np.ones((3,)+pt.shape) # down, nom, up
+          for dm_, funcs in self.funcs_dm.items():
+            mask = (genmatch==5) & (dm==dm_)
+            for i, func in enumerate(funcs):
+              tes[i][mask] = func(pt[mask])
+          if unc=='All':
+            return tes[0], tes[1], tes[2]
+          return tes[2 if unc=='Up' else 0 if unc=='Down' else 1]
+        idm      = np.clip(dm,0,len(self.valid_dm)-1).astype(np.intp)
+        mask     = (genmatch==5) & (idm==dm) & self.valid_dm[idm]
+        idm      = np.where(mask,idm,0)
+        if self.Jul18_scheme:
+          # no nominal correction and larger uncertainty for high pT
+          lowpt = pt<140.
+          tes   = np.where(mask,np.where(lowpt,self.tes_dm[idm],1.0),1.0)
+          err   = np.where(mask,np.where(lowpt,self.errlow_dm[idm],self.errhigh_dm[idm]),0.0)
+        else:
+          tes   = np.where(mask,self.tes_dm[idm],1.0)
+          if unc==None:
+            return tes
+          # error at low pT, linearly interpolated between pt_low and pt_high, and constant at high pT
+          ptclamp = np.clip(pt,self.pt_low,self.pt_high)
+          err     = np.where(mask,self.errlow_dm[idm]+self.slope_dm[idm]*(ptclamp-self.pt_low),0.0)
+        return shiftBatch(tes,err,unc)
+    
     def getTES_highpt(self, dm, genmatch=5, unc=None):
         """Get tau ES vs. tau DM for pt > 100 GeV"""
         if genmatch==5 and dm in self.DMs:
@@ -353,17 +751,40 @@ class TauESTool:
           return 1.0, 1.0, 1.0
         return 1.0
     
+    @jaggedBatch
+    def getTES_highptBatch(self, dm, genmatch=5, unc=None):
+        """Get tau ES vs. tau DM for pt > 100 GeV for arrays of taus.
+        Returns an array of TESs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        dm       = np.asarray(dm)
+        genmatch = np.broadcast_to(np.asarray(genmatch),dm.shape)
+        hist     = self.compiledHist_highpt
+        mask     = (genmatch==5) & np.isin(dm,self.DMs)
+        bins     = hist.GetXaxis().findBins(dm[mask])
+        tes      = np.ones(dm.shape)
+        err      = np.zeros(dm.shape)
+        tes[mask] = hist.contents[bins]
+        err[mask] = hist.errors[bins]
+        return shiftBatch(tes,err,unc)
+    
 
 class TauFESTool:
+    __getstate__ = getToolState
+    __setstate__ = setToolState
     
-    def __init__(self, year, id='DeepTau2017v2p1VSe', path=datapath, verbose=False):
-        """Choose the IDs and WPs for SFs."""
+    def __init__(self, year, id='DeepTau2017v2p1VSe', path=datapath, verbose=False, wp='VVLoose', tag=None):
+        """Choose the IDs and WPs for SFs.
+        Eras that are not in campaigns (e.g. Run 3) are looked up in the manifest of the data directory,
+        and have FESs for DMs 0, 1, 10 and 11 per WP vs. electrons.
+        If there are several versions of the payload for an era, choose one with tag."""
+        if year not in campaigns:
+          self.loadRun3(year,id,wp,path=path,verbose=verbose,tag=tag)
+          return
         if "UL" in year:
           print(">>> TauFESTool: Warning! Using pre-UL (%r) energy scales for e -> tau fakes..."%(year))
           year = '2016Legacy' if '2016' in year else '2017ReReco' if '2017' in year else '2018ReReco'
         assert year in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year)
         fname = os.path.join(path,"TauFES_eta-dm_%s_%s.root"%(id,year))
-        file  = ensureTFile(fname,verbose=verbose)
+        file  = ensurePayloadFile(fname,verbose=verbose)
         graph = file.Get('fes')
         FESs  = { 'barrel':  { }, 'endcap': { } }
         DMs   = [0,1]
@@ -381,6 +802,35 @@ class TauFESTool:
         self.DMs        = [0,1]
         self.genmatches = [1,3]
     
+    def loadRun3(self, year, id, wp, path=datapath, verbose=False, tag=None):
+        """Load the FES for an era that is not in campaigns from the graphs (e.g. 'VVLoose_0') in the file found in the manifest,
+        which have one point for the barrel and one for the endcap."""
+        manifest = getManifest(path,verbose=verbose)
+        fnames   = manifest.find('fes',year,id=id)
+        if not fnames:
+          eras = manifest.eras('fes')
+          assert any(e in eras for e in eraAliases(year)), "You must choose a year from %s! Got %r."%(
+            ', '.join(campaigns+[e for e in eras if e not in campaigns]),year)
+          raise IOError("FES not available for ID '%s' in %s!"%(id,year))
+        fname = selectTag(fnames,tag,"FES for %s and ID '%s'"%(year,id))
+        file = ensurePayloadFile(fname,verbose=verbose)
+        FESs = { 'barrel':  { }, 'endcap': { } }
+        DMs  = [0,1,10,11]
+        for dm in DMs:
+          graph = file.Get("%s_%d"%(wp,dm))
+          if not graph:
+            raise IOError("FES not available for WP '%s' and DM %d in '%s'!"%(wp,dm,fname))
+          for i, region in enumerate(['barrel','endcap']):
+            y    = float(graph.GetY()[i])
+            yup  = float(graph.GetErrorYhigh(i))
+            ylow = float(graph.GetErrorYlow(i))
+            FESs[region][dm] = (max(0,y-ylow),y,y+yup) # prevent negative FES
+        file.Close()
+        self.filename   = fname
+        self.FESs       = FESs
+        self.DMs        = DMs
+        self.genmatches = [1,3]
+    
     def getFES(self, eta, dm, genmatch=1, unc=None):
         """Get electron -> tau FES vs. tau DM."""
         if dm in self.DMs and genmatch in self.genmatches:
@@ -397,3 +847,79 @@ class TauFESTool:
           return 1.0, 1.0, 1.0
         return 1.0
     
+    
+    @jaggedBatch
+    def getFESBatch(self, eta, dm, genmatch=1, unc=None):
+        """Get electron -> tau FES vs. tau DM for arrays of taus.
+        Returns an array of FESs, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        eta      = np.asarray(eta,dtype=np.float64)
+        dm       = np.broadcast_to(np.asarray(dm),eta.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),eta.shape)
+        table    = np.array([[self.FESs[region][dm_] for dm_ in self.DMs] for region in ['barrel','endcap']]) # region x DM x (down, nom, up)
+        mask     = np.isin(dm,self.DMs) & np.isin(genmatch,self.genmatches)
+        iregion  = (np.abs(eta[mask])>=1.5).astype(np.intp)
+        idm      = np.searchsorted(self.DMs,dm[mask])
+        fes      = np.ones(eta.shape+(3,))
+        fes[mask] = table[iregion,idm]
+        if unc=='Up':
+          return fes[...,2]
+        elif unc=='Down':
+          return fes[...,0]
+        elif unc=='All':
+          return fes[...,0], fes[...,1], fes[...,2]
+        return fes[...,1]
+    
+
+class JetToTauFakeRateTool:
+    __getstate__ = getToolState
+    __setstate__ = setToolState
+    
+    def __init__(self, year, id='DeepTau2018v2p5VSjet', wp='Medium', path=datapath, verbose=False):
+        """Choose the ID and WP for the jet -> tau fake rates, which are measured vs. pT
+        in the barrel (|eta|<1.5) and endcap for the UL campaigns."""
+        assert year in campaigns, "You must choose a year from %s! Got %r."%(', '.join(campaigns),year)
+        allowed_wp = ['Loose','Medium','Tight']
+        if id!='DeepTau2018v2p5VSjet' or not year.startswith('UL'):
+          raise IOError("Jet -> tau fake rates not available for ID '%s' in %s!"%(id,year))
+        if wp not in allowed_wp:
+          raise IOError("Jet -> tau fake rates not available for WP '%s'! Allowed WPs are [%s]"%(wp,', '.join(allowed_wp)))
+        fname = os.path.join(path,"JetToTauFakeRates_%s_%s.root"%(id.replace('VSjet',''),year))
+        file  = ensurePayloadFile(fname,verbose=verbose)
+        self.func = { }
+        for region in ['barrel','endcap']:
+          name = "wp%s_%s"%(wp,region.capitalize())
+          self.func[region] = {
+            None:   CompiledTF1.fromTF1(file.Get(name)),
+            'Up':   CompiledTF1.fromTF1(file.Get(name+"_Up")),
+            'Down': CompiledTF1.fromTF1(file.Get(name+"_Down")),
+          }
+        file.Close()
+        self.filename   = fname
+        self.genmatches = [0,6] # jet or no match (0 in nanoAOD)
+    
+    def getFakeRate(self, pt, eta, genmatch=6, unc=None):
+        """Get jet -> tau fake rate vs. tau pT and eta."""
+        if genmatch in self.genmatches:
+          funcs = self.func['barrel' if abs(eta)<1.5 else 'endcap']
+          if unc=='All':
+            return funcs['Down'].Eval(pt), funcs[None].Eval(pt), funcs['Up'].Eval(pt)
+          return funcs[unc if unc in ['Up','Down'] else None].Eval(pt)
+        elif unc=='All':
+          return 1.0, 1.0, 1.0
+        return 1.0
+    
+    @jaggedBatch
+    def getFakeRateBatch(self, pt, eta, genmatch=6, unc=None):
+        """Get jet -> tau fake rate vs. tau pT and eta for arrays of taus.
+        Returns an array of fake rates, or a tuple of arrays (down, nominal, up) if unc=='All'."""
+        pt       = np.asarray(pt,dtype=np.float64)
+        eta      = np.broadcast_to(np.asarray(eta,dtype=np.float64),pt.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        mask     = np.isin(genmatch,self.genmatches)
+        barrel   = np.abs(eta)<1.5
+        def evaluate(unc):
+          funcs  = self.func['barrel'], self.func['endcap']
+          return np.where(mask,np.where(barrel,funcs[0][unc](pt),funcs[1][unc](pt)),1.0)
+        if unc=='All':
+          return evaluate('Down'), evaluate(None), evaluate('Up')
+        return evaluate(unc if unc in ['Up','Down'] else None)
@@ -0,0 +1,355 @@
+# Description: ROOT-free representations of the TF1, TH1 and TGraph objects used for the tau SFs
+from __future__ import print_function
+import os
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.formula import compileFormula
+else:
+  from formula import compileFormula
+
+
+class CompiledTF1:
+    """Pure-Python replacement of a ROOT TF1, built from its formula and parameters.
+    Mimics the parts of the TF1 interface used by the tools (Eval, GetParameter, ...),
+    and can be called with an array of x values for vectorized evaluation."""
+
+    def __init__(self, formula, params=(), name="", xmin=None, xmax=None):
+        self.name    = name
+        self.formula = formula
+        self.params  = tuple(float(p) for p in params)
+        self.xmin    = xmin
+        self.xmax    = xmax
+        self._func, npars = compileFormula(formula)
+        if npars>len(self.params):
+          raise ValueError("Formula %r of function '%s' needs %d parameters, got %d!"%(formula,name,npars,len(self.params)))
+
+    @classmethod
+    def fromTF1(cls, func):
+        """Compile a ROOT TF1."""
+        if isinstance(func,CompiledTF1):
+          return func
+        formula = str(func.GetExpFormula())
+        params  = [func.GetParameter(i) for i in range(func.GetNpar())]
+        return cls(formula,params,name=func.GetName(),xmin=func.GetXmin(),xmax=func.GetXmax())
+
+    def __repr__(self):
+        return "<%s(%r,%r) '%s'>"%(self.__class__.__name__,self.formula,self.params,self.name)
+
+    def __getstate__(self):
+        """Picklable state without the compiled function, which is recompiled when unpickled."""
+        state = self.__dict__.copy()
+        del state['_func']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._func = compileFormula(self.formula)[0]
+
+    def Eval(self, x):
+        """Evaluate for a single x value, like TF1.Eval."""
+        return float(self._func(float(x),self.params))
+
+    def GetName(self):
+        return self.name
+
+    def GetExpFormula(self):
+        return self.formula
+
+    def GetNpar(self):
+        return len(self.params)
+
+    def GetParameter(self, i):
+        return self.params[i]
+
+    def GetXmin(self):
+        return self.xmin
+
+    def GetXmax(self):
+        return self.xmax
+
+    def __call__(self, x):
+        """Evaluate for an array of x values."""
+        x = np.asarray(x,dtype=np.float64)
+        y = self._func(x,self.params)
+        return np.array(np.broadcast_to(y,x.shape),dtype=np.float64)
+
+
+class TabulatedTF1:
+    """Function sampled on a uniform grid in [xmin, xmax], and evaluated by linear interpolation
+    in constant time. Values outside the grid are clamped to the range. The maximum deviation
+    from the exact function is evaluated at the midpoints between grid points, and stored as maxdev."""
+
+    def __init__(self, func, xmin, xmax, step=0.1):
+        self.name    = func.GetName()
+        self.func    = func
+        self.xmin    = float(xmin)
+        self.npoints = max(2,int(round((xmax-xmin)/step))+1)
+        self.step    = (float(xmax)-self.xmin)/(self.npoints-1)
+        self.xmax    = self.xmin+self.step*(self.npoints-1)
+        exact        = func if callable(func) else CompiledTF1.fromTF1(func)
+        xgrid        = np.linspace(self.xmin,self.xmax,self.npoints)
+        self.ygrid   = np.ascontiguousarray(exact(xgrid),dtype=np.float64)
+        self.dygrid  = np.append(np.diff(self.ygrid),0.0) # differences to the next grid point
+        self.yvalues = self.ygrid.tolist() # for fast scalar look up
+        xmid         = 0.5*(xgrid[1:]+xgrid[:-1])
+        self.maxdev  = float(np.max(np.abs(self(xmid)-exact(xmid))))
+
+    def __repr__(self):
+        return "<%s(%d points in [%s,%s], max. dev. %.2g) '%s'>"%(
+          self.__class__.__name__,self.npoints,self.xmin,self.xmax,self.maxdev,self.name)
+
+    def __getstate__(self):
+        """Picklable state without the derived grids, and with the original function compiled if it is a ROOT TF1."""
+        state = self.__dict__.copy()
+        del state['dygrid'], state['yvalues']
+        if hasattr(self.func,'InheritsFrom'):
+          state['func'] = CompiledTF1.fromTF1(self.func)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.dygrid  = np.append(np.diff(self.ygrid),0.0)
+        self.yvalues = self.ygrid.tolist()
+
+    def GetName(self):
+        return self.name
+
+    def Eval(self, x):
+        """Interpolate for a single x value."""
+        u = (min(max(x,self.xmin),self.xmax)-self.xmin)/self.step
+        i = min(int(u),self.npoints-2)
+        f = u-i
+        return self.yvalues[i]*(1.-f)+self.yvalues[i+1]*f
+
+    def __call__(self, x):
+        """Interpolate for an array of x values."""
+        u = (np.clip(np.asarray(x,dtype=np.float64),self.xmin,self.xmax)-self.xmin)/self.step
+        i = np.minimum(u.astype(np.intp),self.npoints-2)
+        return self.ygrid[i]+self.dygrid[i]*(u-i)
+
+
+class CompiledAxis:
+    """Minimal replacement of a ROOT TAxis with (variable) bin edges."""
+
+    def __init__(self, edges):
+        self.edges = edges
+
+    def GetNbins(self):
+        return len(self.edges)-1
+
+    def GetBinLowEdge(self, bin):
+        return float(self.edges[bin-1])
+
+    def GetBinUpEdge(self, bin):
+        return float(self.edges[bin])
+
+    def FindBin(self, x):
+        """Find bin like TAxis.FindBin: 0 is the underflow, nbins+1 the overflow bin."""
+        return int(np.searchsorted(self.edges,x,side='right'))
+
+    def findBins(self, x):
+        """Vectorized FindBin for an array of x values."""
+        return np.searchsorted(self.edges,np.asarray(x,dtype=np.float64),side='right')
+
+
+class CompiledTH1:
+    """Pure-Python replacement of a 1D ROOT histogram, built from its bin edges, and the
+    bin contents and errors including the under- and overflow bins."""
+
+    def __init__(self, edges, contents, errors, name=""):
+        self.name     = name
+        self.edges    = np.asarray(edges,dtype=np.float64)
+        self.contents = np.asarray(contents,dtype=np.float64)
+        self.errors   = np.asarray(errors,dtype=np.float64)
+        self.xaxis    = CompiledAxis(self.edges)
+        if not (len(self.contents)==len(self.errors)==len(self.edges)+1):
+          raise ValueError("Histogram '%s' needs nbins+2 contents and errors for %d bin edges!"%(name,len(self.edges)))
+
+    @classmethod
+    def fromTH1(cls, hist):
+        """Convert a ROOT TH1."""
+        if isinstance(hist,CompiledTH1):
+          return hist
+        axis     = hist.GetXaxis()
+        nbins    = hist.GetNbinsX()
+        edges    = [axis.GetBinLowEdge(i) for i in range(1,nbins+2)]
+        contents = [hist.GetBinContent(i) for i in range(nbins+2)]
+        errors   = [hist.GetBinError(i) for i in range(nbins+2)]
+        return cls(edges,contents,errors,name=hist.GetName())
+
+    def __repr__(self):
+        return "<%s(%d bins) '%s'>"%(self.__class__.__name__,self.GetNbinsX(),self.name)
+
+    def GetName(self):
+        return self.name
+
+    def GetXaxis(self):
+        return self.xaxis
+
+    def GetNbinsX(self):
+        return len(self.edges)-1
+
+    def FindBin(self, x):
+        return self.xaxis.FindBin(x)
+
+    def GetBinContent(self, bin):
+        return float(self.contents[bin])
+
+    def GetBinError(self, bin):
+        return float(self.errors[bin])
+
+    def SetDirectory(self, dir):
+        pass # not attached to any file
+
+
+class CompiledGraph:
+    """Pure-Python replacement of a ROOT TGraph(AsymmErrors), built from its points and errors."""
+
+    def __init__(self, x, y, exl=None, exh=None, eyl=None, eyh=None, name=""):
+        self.name = name
+        self.x    = np.asarray(x,dtype=np.float64)
+        self.y    = np.asarray(y,dtype=np.float64)
+        zeros     = np.zeros(len(self.x))
+        self.exl  = zeros if exl is None else np.asarray(exl,dtype=np.float64)
+        self.exh  = zeros if exh is None else np.asarray(exh,dtype=np.float64)
+        self.eyl  = zeros if eyl is None else np.asarray(eyl,dtype=np.float64)
+        self.eyh  = zeros if eyh is None else np.asarray(eyh,dtype=np.float64)
+        if not all(len(a)==len(self.x) for a in [self.y,self.exl,self.exh,self.eyl,self.eyh]):
+          raise ValueError("Graph '%s' needs arrays of equal length!"%(name))
+
+    @classmethod
+    def fromTGraph(cls, graph):
+        """Convert a ROOT TGraph, TGraphErrors or TGraphAsymmErrors."""
+        if isinstance(graph,CompiledGraph):
+          return graph
+        npoints = graph.GetN()
+        x   = [graph.GetX()[i] for i in range(npoints)]
+        y   = [graph.GetY()[i] for i in range(npoints)]
+        exl = [graph.GetErrorXlow(i) for i in range(npoints)]
+        exh = [graph.GetErrorXhigh(i) for i in range(npoints)]
+        eyl = [graph.GetErrorYlow(i) for i in range(npoints)]
+        eyh = [graph.GetErrorYhigh(i) for i in range(npoints)]
+        return cls(x,y,exl,exh,eyl,eyh,name=graph.GetName())
+
+    def __repr__(self):
+        return "<%s(%d points) '%s'>"%(self.__class__.__name__,self.GetN(),self.name)
+
+    def GetName(self):
+        return self.name
+
+    def GetN(self):
+        return len(self.x)
+
+    def GetX(self):
+        return self.x
+
+    def GetY(self):
+        return self.y
+
+    def GetPoint(self, i, x, y):
+        """Set ctypes.c_double x and y to the coordinates of point i, like TGraph.GetPoint."""
+        if i<0 or i>=len(self.x):
+          return -1
+        x.value = float(self.x[i])
+        y.value = float(self.y[i])
+        return i
+
+    def GetErrorXlow(self, i):
+        return float(self.exl[i])
+
+    def GetErrorXhigh(self, i):
+        return float(self.exh[i])
+
+    def GetErrorYlow(self, i):
+        return float(self.eyl[i])
+
+    def GetErrorYhigh(self, i):
+        return float(self.eyh[i])
+
+    def GetErrorY(self, i):
+        """Average error like TGraphAsymmErrors.GetErrorY."""
+        return float(np.sqrt(0.5*(self.eyl[i]**2+self.eyh[i]**2)))
+
+    def Eval(self, x):
+        """Linearly interpolate between points, like TGraph.Eval."""
+        return float(self(x))
+
+    def __call__(self, x):
+        """Linearly interpolate (and extrapolate beyond the first and last point) for an array of x values."""
+        x = np.asarray(x,dtype=np.float64)
+        if len(self.x)==1:
+          return np.full(x.shape,self.y[0])
+        order  = np.argsort(self.x,kind='stable')
+        xs, ys = self.x[order], self.y[order]
+        i      = np.clip(np.searchsorted(xs,x,side='right')-1,0,len(xs)-2)
+        x0, x1 = xs[i], xs[i+1]
+        y0, y1 = ys[i], ys[i+1]
+        with np.errstate(divide='ignore',invalid='ignore'):
+          slope = np.where(x1!=x0,(y1-y0)/(x1-x0),0.)
+        return y0+slope*(x-x0)
+
+
+class WeightedSumTF1:
+    """Sum of functions weighted by graphs, e.g. DM-dependent SFs weighted by the pT-dependent DM fractions.
+    The weights are clipped at 0, and normalized to sum to 1 at each x. The functions are evaluated with x
+    clamped to [xmin, xmax], and the graphs with x clamped to the range of their points, so neither is extrapolated."""
+
+    def __init__(self, funcs, weights, xmin=None, xmax=None, name=""):
+        if len(funcs)!=len(weights):
+          raise ValueError("Need one weight per function for '%s', got %d functions and %d weights!"%(name,len(funcs),len(weights)))
+        self.name    = name
+        self.funcs   = list(funcs)
+        self.weights = [CompiledGraph.fromTGraph(w) for w in weights]
+        self.xmin    = xmin
+        self.xmax    = xmax
+
+    def __repr__(self):
+        return "<%s(%d functions) '%s'>"%(self.__class__.__name__,len(self.funcs),self.name)
+
+    def GetName(self):
+        return self.name
+
+    def getWeights(self, x):
+        """Return the normalized weights for an array of x values, with one row per function."""
+        x       = np.asarray(x,dtype=np.float64)
+        weights = np.array([np.maximum(w(np.clip(x,w.x.min(),w.x.max())),0.) for w in self.weights])
+        return weights/weights.sum(axis=0)
+
+    def Eval(self, x):
+        """Evaluate for a single x value."""
+        return float(self(np.array([x]))[0])
+
+    def __call__(self, x):
+        """Evaluate for an array of x values."""
+        x     = np.asarray(x,dtype=np.float64)
+        xfunc = np.clip(x,self.xmin if self.xmin is not None else -np.inf,self.xmax if self.xmax is not None else np.inf)
+        return (self.getWeights(x)*np.array([f(xfunc) for f in self.funcs])).sum(axis=0)
+
+
+def compileObject(obj):
+    """Convert a ROOT TF1, TH1 or TGraph into its ROOT-free equivalent.
+    Returns None for any other (unsupported) class."""
+    if isinstance(obj,(CompiledTF1,CompiledTH1,CompiledGraph)):
+      return obj
+    if obj.InheritsFrom('TF1'):
+      return CompiledTF1.fromTF1(obj)
+    elif obj.InheritsFrom('TH1') and obj.GetDimension()==1:
+      return CompiledTH1.fromTH1(obj)
+    elif obj.InheritsFrom('TGraph'):
+      return CompiledGraph.fromTGraph(obj)
+    return None
+
+
+def compileState(state):
+    """Replace all ROOT objects (TF1, TH1, TGraph) in a (nested) dictionary, list or tuple,
+    e.g. the attributes of a tool, by their ROOT-free equivalents, so that it can be pickled."""
+    if isinstance(state,dict):
+      return type(state)((key,compileState(value)) for key, value in state.items())
+    elif isinstance(state,(list,tuple)):
+      return type(state)(compileState(value) for value in state)
+    elif hasattr(state,'InheritsFrom'): # ROOT TObject
+      obj = compileObject(state)
+      if obj is None:
+        raise TypeError("Cannot convert ROOT object '%s' of class %s for pickling!"%(state.GetName(),state.ClassName()))
+      return obj
+    return state
@@ -0,0 +1,117 @@
+# Description: Evaluate all tau corrections (ID SFs, anti-lepton SFs, TES, FES) for columnar arrays of taus at once
+from __future__ import print_function
+import os
+from collections import OrderedDict
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, datapath, highptUncs
+  from TauPOG.TauIDSFs.registry import getTool
+  from TauPOG.TauIDSFs.jagged import jaggedBatch
+else:
+  from TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, datapath, highptUncs
+  from registry import getTool
+  from jagged import jaggedBatch
+
+
+class TauCorrectionTool:
+
+    def __init__(self, year, id='DeepTau2018v2p5VSjet', wp='Medium', wp_vsele='VVLoose', highpT=True,
+                 id_vsele='DeepTau2017v2p1VSe', wp_antiele='VVLoose', id_vsmu='DeepTau2017v2p1VSmu', wp_antimu='Tight',
+                 tes=True, fes=True, path=datapath, verbose=False):
+        """Combine the tools for all tau corrections for a given year, ID and WPs.
+        The tools are shared through the process-wide registry.
+        Set an ID to None (or highpT, tes, fes to False) to leave out a correction.
+        Options:
+          id, wp, wp_vsele:     tau ID vs. jet for DM- and pT-dependent SFs (getSFvsDMandPT)
+          highpT:               also get the high-pT SFs (getHighPTSFvsPT) for this ID
+          id_vsele, wp_antiele: anti-electron discriminator for eta-dependent e -> tau fake SFs
+          id_vsmu,  wp_antimu:  anti-muon discriminator for eta-dependent mu -> tau fake SFs
+          tes, fes:             tau energy scale and e -> tau fake energy scale
+        """
+        self.year     = year
+        self.sftool   = None
+        self.hptool   = None
+        self.eletool  = None
+        self.mutool   = None
+        self.testool  = None
+        self.festool  = None
+        if id:
+          self.sftool  = getTool(TauIDSFTool,year,id,wp,wp_vsele=wp_vsele,ptdm=True,path=path,verbose=verbose)
+          if highpT:
+            self.hptool = getTool(TauIDSFTool,year,id,wp,wp_vsele=wp_vsele,ptdm=False,highpT=True,path=path,verbose=verbose)
+          if tes:
+            if id=='DeepTau2018v2p5VSjet':
+              self.testool = getTool(TauESTool,year,id,wp,wp_vsele=wp_vsele,path=path,verbose=verbose)
+            else:
+              self.testool = getTool(TauESTool,year,id,path=path,verbose=verbose)
+        if id_vsele:
+          self.eletool = getTool(TauIDSFTool,year,id_vsele,wp_antiele,path=path,verbose=verbose)
+        if id_vsmu:
+          self.mutool  = getTool(TauIDSFTool,year,id_vsmu,wp_antimu,path=path,verbose=verbose)
+        if fes:
+          self.festool = getTool(TauFESTool,year,path=path,verbose=verbose)
+
+    @jaggedBatch
+    def getCorrections(self, pt, eta, dm, genmatch, unc=None):
+        """Get all corrections for arrays of taus in one pass.
+        The taus are split once by genmatch (genuine taus, e -> tau and mu -> tau fakes),
+        and each tool only evaluates its own subset.
+        Returns an ordered dictionary of arrays (struct of arrays) with keys
+          'sf_vsjet', 'sf_vsjet_highpt', 'sf_vsele', 'sf_vsmu', 'tes', 'fes',
+        and if unc=='All', also all variations, e.g. 'sf_vsjet_syst_alleras_up', 'sf_vsjet_highpt_extrap_down',
+        'sf_vsele_up', 'tes_down' or 'fes_up'. Corrections that do not apply to a tau are 1.
+        Jagged arrays of taus per event give jagged arrays with the same layout."""
+        if unc not in [None,'All']:
+          raise ValueError("Uncertainty should be None or 'All', got %r!"%(unc))
+        pt       = np.asarray(pt,dtype=np.float64)
+        eta      = np.broadcast_to(np.asarray(eta,dtype=np.float64),pt.shape)
+        dm       = np.broadcast_to(np.asarray(dm),pt.shape)
+        genmatch = np.broadcast_to(np.asarray(genmatch),pt.shape)
+        ones     = np.ones(pt.shape)
+        out      = OrderedDict()
+
+        # SINGLE DISPATCH BY GENMATCH
+        taus  = np.nonzero(genmatch==5)[0]
+        eles  = np.nonzero((genmatch==1) | (genmatch==3))[0]
+        muons = np.nonzero((genmatch==2) | (genmatch==4))[0]
+
+        def fill(name, index, values):
+          """Scatter values of a subset of taus into a full array."""
+          if isinstance(values,dict):
+            for key in sorted(values,key=lambda k: k!='nom'): # nominal first
+              fill(name if key=='nom' else "%s_%s"%(name,key),index,values[key])
+          elif isinstance(values,tuple): # down, nominal, up
+            for key, value in zip(['down',None,'up'],values):
+              fill("%s_%s"%(name,key) if key else name,index,value)
+          else:
+            array = ones.copy()
+            array[index] = values
+            out[name] = array
+
+        # GENUINE TAUS
+        if self.sftool:
+          fill('sf_vsjet',taus,self.sftool.getSFvsDMandPTBatch(pt[taus],dm[taus],5,unc=unc))
+        if self.hptool:
+          fill('sf_vsjet_highpt',taus,self.hptool.getHighPTSFvsPTBatch(pt[taus],5))
+          if unc=='All':
+            extrap = self.hptool.getHighPTExtrapBatch(pt[taus]) # up, down multipliers
+            for u in highptUncs:
+              if u.startswith('extrap'):
+                sf = out['sf_vsjet_highpt'][taus]*extrap[0 if u.endswith('up') else 1]
+              else:
+                sf = self.hptool.getHighPTSFvsPTBatch(pt[taus],5,unc=u)
+              fill('sf_vsjet_highpt_%s'%(u),taus,sf)
+        if self.testool:
+          fill('tes',taus,self.testool.getTESBatch(pt[taus],dm[taus],5,unc=unc))
+
+        # LEPTON -> TAU FAKES
+        if self.eletool:
+          fill('sf_vsele',eles,self.eletool.getSFvsEtaBatch(eta[eles],1,unc=unc))
+        if self.mutool:
+          fill('sf_vsmu',muons,self.mutool.getSFvsEtaBatch(eta[muons],2,unc=unc))
+        if self.festool:
+          fill('fes',eles,self.festool.getFESBatch(eta[eles],dm[eles],1,unc=unc))
+
+        return out
+
+    __call__ = getCorrections
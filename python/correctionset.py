@@ -0,0 +1,415 @@
+# Description: Convert the tau SF tools into correctionlib (schema v2) corrections, write them to JSON,
+#              and evaluate the tools through correctionlib's compiled evaluator instead
+from __future__ import print_function
+import os, json, gzip
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool, shiftBatch
+  from TauPOG.TauIDSFs.formula import tokenize
+  from TauPOG.TauIDSFs.jagged import jaggedBatch
+else:
+  from TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool, shiftBatch
+  from formula import tokenize
+  from jagged import jaggedBatch
+_functions = { # TFormula function name -> correctionlib function name
+  'TMath::Power': 'pow', 'TMath::Min': 'min', 'TMath::Max': 'max', 'TMath::Exp': 'exp', 'TMath::Log': 'log',
+  'TMath::Log10': 'log10', 'TMath::Sqrt': 'sqrt', 'TMath::Abs': 'abs', 'fabs': 'abs',
+}
+_inputs = { # input name -> (type, description)
+  'pt':       ('real',   "Reconstructed tau pT [GeV]"),
+  'eta':      ('real',   "Reconstructed tau eta"),
+  'dm':       ('int',    "Reconstructed tau decay mode"),
+  'genmatch': ('int',    "Generator match: 0 or 6 = jet, 1 or 3 = electron, 2 or 4 = muon, 5 = real tau"),
+}
+_updown = { None: 'nom', 'Up': 'up', 'Down': 'down' } # tool uncertainty -> syst of correction
+
+
+def getMode(tool):
+  """Return the mode of a tool, which determines the getter that is converted:
+  'pt', 'dm', 'ptdm', 'highpT', 'eta', 'tes', 'fes' or 'fakerate'."""
+  if isinstance(tool,TauIDSFTool):
+    if hasattr(tool,'funcs_dm'):
+      return 'ptdm'
+    elif hasattr(tool,'highptSF'):
+      return 'highpT'
+    elif hasattr(tool,'compiledFunc'):
+      return 'pt'
+    elif hasattr(tool,'genmatches'):
+      return 'eta'
+    return 'dm'
+  elif isinstance(tool,TauESTool):
+    return 'tes'
+  elif isinstance(tool,TauFESTool):
+    return 'fes'
+  elif isinstance(tool,JetToTauFakeRateTool):
+    return 'fakerate'
+  raise TypeError("Cannot convert %r to a correction!"%(tool))
+
+
+def getGetters(tool):
+  """Return the getters of a tool that are converted to corrections, as a list of
+  (getter, arguments, default genmatch, systematic variations), where the variations map
+  the uncertainty of the getter (None for nominal) to the value of the 'syst' input of the correction."""
+  mode = getMode(tool)
+  if mode=='ptdm':
+    uncs = sorted(set(u for dm in tool.DMs for u in tool.funcs_dm[dm] if u!='nom'))
+    return [('getSFvsDMandPT',['pt','dm','genmatch'],5,dict([(None,'nom')]+[(u,u) for u in uncs]))]
+  elif mode=='highpT':
+    uncs = sorted((u for u in tool.highptHandles if u),key=lambda u: tool.highptHandles[u])
+    return [('getHighPTSFvsPT',['pt','genmatch'],5,dict([(None,'nom')]+[(u,u) for u in uncs]))]
+  elif mode=='pt':
+    return [('getSFvsPT',['pt','genmatch'],5,_updown)]
+  elif mode=='dm':
+    return [('getSFvsDM',['pt','dm','genmatch'],5,_updown)]
+  elif mode=='eta':
+    return [('getSFvsEta',['eta','genmatch'],None,_updown)]
+  elif mode=='tes':
+    getters = [('getTES',['pt','dm','genmatch'],5,_updown)]
+    if hasattr(tool,'compiledHist_highpt'):
+      getters.append(('getTES_highpt',['dm','genmatch'],5,_updown))
+    return getters
+  elif mode=='fes':
+    return [('getFES',['eta','dm','genmatch'],1,_updown)]
+  return [('getFakeRate',['pt','eta','genmatch'],6,_updown)]
+
+
+def getExpression(func, inline=False):
+  """Translate the formula of a (compiled) TF1 into a correctionlib expression with parameters [0], [1], ...,
+  or with the parameters inlined as exact (round-trip) numbers, so several functions can be combined."""
+  func   = getattr(func,'func',func) # exact function of a TabulatedTF1
+  tokens = [ ]
+  for type, value in tokenize(str(func.GetExpFormula())):
+    if type=='param':
+      tokens.append("(%r)"%(float(func.GetParameter(value))) if inline else "[%d]"%(value))
+    else:
+      tokens.append(_functions.get(value,value) if type=='name' else value)
+  return ''.join(tokens)
+
+
+def formulaNode(expression, input='pt', func=None):
+  """Formula node of an expression in x, which is the value of the input.
+  Pass the function to add its parameters."""
+  node = { 'nodetype': 'formula', 'expression': expression, 'parser': 'TFormula', 'variables': [input] }
+  if func is not None:
+    func = getattr(func,'func',func)
+    node['parameters'] = [float(func.GetParameter(i)) for i in range(func.GetNpar())]
+  return node
+
+
+def funcNode(func, input='pt'):
+  """Formula node of a (compiled) TF1."""
+  return formulaNode(getExpression(func),input,func=func)
+
+
+def categoryNode(input, values, default=None):
+  """Category node mapping integer or string keys to values (numbers or nodes)."""
+  node = { 'nodetype': 'category', 'input': input, 'content': [{ 'key': k, 'value': v } for k, v in values] }
+  if default is not None:
+    node['default'] = default
+  return node
+
+
+def binningNode(input, edges, values, flow='clamp'):
+  """Binning node of an input with bins [low, high), where the edges can be 'inf' or '-inf'."""
+  edges = [e if isinstance(e,str) else float(e) for e in edges]
+  return { 'nodetype': 'binning', 'input': input, 'edges': edges, 'content': list(values), 'flow': flow }
+
+
+def transformNode(input, expression, content):
+  """Transform node, which replaces the value of an input by a formula of it (e.g. 'abs(x)') for its content."""
+  return { 'nodetype': 'transform', 'input': input, 'rule': formulaNode(expression,input), 'content': content }
+
+
+def shiftValues(sf, err, unc, extraUnc=None):
+  """Shifted values of arrays of SFs with errors (e.g. histogram bins), like the vectorized getters."""
+  sf  = np.asarray(sf,dtype=np.float64)
+  err = np.asarray(err,dtype=np.float64)
+  if extraUnc:
+    err = np.sqrt( err**2 + (sf*extraUnc)**2 )
+  return [float(v) for v in shiftBatch(sf,err,unc)]
+
+
+def getCorrections(tool, name, description=""):
+  """Convert the getters of a tool into correctionlib (schema v2) corrections, returned as a list of dictionaries.
+  The inputs of each correction are the arguments of the getter (e.g. pt, dm, genmatch) and a string 'syst',
+  which is 'nom', 'up' or 'down', or for the DM- and pT-dependent and high-pT SFs, the name of the uncertainty
+  (e.g. 'syst_alleras_up' or 'stat_bin1_down'); unknown variations of the DM- and pT-dependent SFs give the nominal.
+  Corrections that do not apply to a tau are 1. A tool with several getters (e.g. getTES and getTES_highpt)
+  gives one correction per getter, where the name of the latter gets the suffix of the getter (e.g. '_highpt')."""
+  mode        = getMode(tool)
+  corrections = [ ]
+  for getter, args, default, systs in getGetters(tool):
+    data   = globals()['_%sData'%(mode)](tool,getter,systs)
+    inputs = [{ 'name': a, 'type': _inputs[a][0], 'description': _inputs[a][1] } for a in args]
+    inputs.append({ 'name': 'syst', 'type': 'string', 'description': "Systematic variation: %s"%(', '.join(systs.values())) })
+    suffix = "_"+getter.split('_',1)[1] if '_' in getter else "" # e.g. '_highpt' for getTES_highpt
+    corrections.append({
+      'name':        name+suffix,
+      'description': "%s (%s)"%(description or name,getter),
+      'version':     1,
+      'inputs':      inputs,
+      'output':      { 'name': 'tes' if mode=='tes' else 'fes' if mode=='fes' else 'fakerate' if mode=='fakerate' else 'sf',
+                       'type': 'real' },
+      'data':        data,
+    })
+  return corrections
+
+
+def _ptData(tool, getter, systs):
+  """pT-dependent SFs, with the extra uncertainty (below and above 100 GeV) added in quadrature."""
+  funcs = tool.compiledFunc
+  if tool.extraUnc:
+    sf   = "(%s)"%(getExpression(funcs[None],inline=True))
+    err  = "((x<100)*%r+(x>=100)*%r)"%(float(tool.extraUncs[0]),float(tool.extraUncs[1]))
+    errs = dict((u,"sqrt((%s-(%s))^2+(%s*%s)^2)"%(sf,getExpression(funcs[u],inline=True),sf,err)) for u in ['Up','Down'])
+    nodes = [
+      ('nom',  funcNode(funcs[None])),
+      ('up',   formulaNode("%s+%s"%(sf,errs['Up']))),
+      ('down', formulaNode("(%s<%s)*(%s-%s)"%(errs['Down'],sf,sf,errs['Down']))), # prevent negative SF
+    ]
+  else:
+    nodes = [(systs[u],funcNode(funcs[u])) for u in [None,'Up','Down']]
+  return categoryNode('genmatch',[(5,categoryNode('syst',nodes))],default=1.0)
+
+
+def _dmData(tool, getter, systs):
+  """DM-dependent SFs for pT > 40 GeV."""
+  hist  = tool.compiledHist
+  bins  = hist.GetXaxis().findBins(tool.DMs)
+  nodes = [ ]
+  for dm, sf, err in zip(tool.DMs,hist.contents[bins],hist.errors[bins]):
+    values = [(s,shiftValues([sf],[err],u,tool.extraUnc)[0]) for u, s in systs.items()]
+    nodes.append((dm,categoryNode('syst',[(s,formulaNode("(x>40)*%r+(x<=40)"%(v))) for s, v in values])))
+  return categoryNode('genmatch',[(5,categoryNode('dm',nodes,default=1.0))],default=1.0)
+
+
+def _ptdmData(tool, getter, systs):
+  """DM- and pT-dependent SFs, where pT is clamped to [20,140] GeV. Tabulated functions are exported exactly."""
+  nodes = [ ]
+  for dm in tool.DMs:
+    funcs  = tool.funcs_dm[dm]
+    values = [(s,funcNode(funcs[u or 'nom'])) for u, s in systs.items() if (u or 'nom') in funcs]
+    nodes.append((dm,categoryNode('syst',values,default=funcNode(funcs['nom']))))
+  content = categoryNode('genmatch',[(5,categoryNode('dm',nodes,default=1.0))],default=1.0)
+  return transformNode('pt',"min(max(x,20.),140.)",content)
+
+
+def _highpTData(tool, getter, systs):
+  """High-pT SFs in two pT bins (< 200 and >= 200 GeV), where the extrapolation uncertainty scales
+  the SF by the extrapolation function f (up) or 2-f (down)."""
+  extrap = "(%s)"%(getExpression(tool.extrapFunc,inline=True))
+  nodes  = [ ]
+  for unc, syst in systs.items():
+    handle = tool.getHighPTUncHandle(unc)
+    sfs    = (tool.highptSF+tool.highptShifts[handle]) if handle else tool.highptSF
+    extrapUp, extrapDown = tool.highptExtrap[handle]
+    if extrapUp:
+      values = [formulaNode("%r*%s"%(float(sf),extrap)) for sf in sfs]
+    elif extrapDown:
+      values = [formulaNode("%r*(2.-%s)"%(float(sf),extrap)) for sf in sfs]
+    else:
+      values = [float(sf) for sf in sfs]
+    nodes.append((syst,binningNode('pt',[100.,200.,'inf'],values)))
+  return categoryNode('genmatch',[(5,categoryNode('syst',nodes))],default=1.0)
+
+
+def _etaData(tool, getter, systs):
+  """Eta-dependent SFs in bins of |eta|, including the underflow and overflow bins of the histogram."""
+  hist  = tool.compiledHist
+  edges = ['-inf']+list(hist.edges)+['inf']
+  nodes = [(s,binningNode('eta',edges,shiftValues(hist.contents,hist.errors,u,tool.extraUnc),flow='error'))
+           for u, s in systs.items()]
+  content = categoryNode('syst',nodes)
+  return categoryNode('genmatch',[(g,transformNode('eta',"abs(x)",content)) for g in tool.genmatches],default=1.0)
+
+
+def _tesData(tool, getter, systs):
+  """DM-dependent TES, with the uncertainty linearly interpolated in pT between pt_low and pt_high,
+  or in the Jul18 scheme, without correction and with a larger uncertainty for pT >= 140 GeV.
+  The DM- and pT-dependent TES of Run 3 are given by functions, and the TES for pT > 100 GeV by a DM-binned histogram."""
+  nodes = [ ]
+  if getter=='getTES_highpt':
+    hist = tool.compiledHist_highpt
+    bins = hist.GetXaxis().findBins(tool.DMs)
+    for dm, tes, err in zip(tool.DMs,hist.contents[bins],hist.errors[bins]):
+      nodes.append((dm,categoryNode('syst',[(s,shiftValues([tes],[err],u)[0]) for u, s in systs.items()])))
+  elif tool.funcs_dm is not None: # down, nom, up
+    for dm, funcs in sorted(tool.funcs_dm.items()):
+      nodes.append((dm,categoryNode('syst',[(s,funcNode(funcs[2 if u=='Up' else 0 if u=='Down' else 1])) for u, s in systs.items()])))
+  elif tool.Jul18_scheme:
+    for dm in tool.DMs:
+      tes, err = [tool.tes_dm[dm],1.0], [tool.errlow_dm[dm],tool.errhigh_dm[dm]] # below and above 140 GeV
+      nodes.append((dm,categoryNode('syst',[(s,binningNode('pt',[0.,140.,'inf'],shiftValues(tes,err,u))) for u, s in systs.items()])))
+  else:
+    for dm in tool.DMs:
+      tes = float(tool.tes_dm[dm])
+      err = "(%r+%r*(min(max(x,%r),%r)-%r))"%(float(tool.errlow_dm[dm]),float(tool.slope_dm[dm]),
+                                               float(tool.pt_low),float(tool.pt_high),float(tool.pt_low))
+      nodes.append((dm,categoryNode('syst',[
+        ('nom',  tes),
+        ('up',   formulaNode("%r+%s"%(tes,err))),
+        ('down', formulaNode("(%s<%r)*(%r-%s)"%(err,tes,tes,err))), # prevent negative TES
+      ])))
+  return categoryNode('genmatch',[(5,categoryNode('dm',nodes,default=1.0))],default=1.0)
+
+
+def _fesData(tool, getter, systs):
+  """Electron -> tau FES in the barrel (|eta| < 1.5) and endcap per DM."""
+  index = { None: 1, 'Up': 2, 'Down': 0 } # (down, nom, up)
+  nodes = [(dm,categoryNode('syst',[(s,binningNode('eta',['-inf',1.5,'inf'],[float(tool.FESs[r][dm][index[u]]) for r in ['barrel','endcap']],flow='error'))
+                                    for u, s in systs.items()])) for dm in tool.DMs]
+  content = transformNode('eta',"abs(x)",categoryNode('dm',nodes,default=1.0))
+  return categoryNode('genmatch',[(g,content) for g in tool.genmatches],default=1.0)
+
+
+def _fakerateData(tool, getter, systs):
+  """Jet -> tau fake rates vs. pT in the barrel (|eta| < 1.5) and endcap."""
+  nodes = [(s,binningNode('eta',['-inf',1.5,'inf'],[funcNode(tool.func[r][u]) for r in ['barrel','endcap']],flow='error'))
+           for u, s in systs.items()]
+  content = transformNode('eta',"abs(x)",categoryNode('syst',nodes))
+  return categoryNode('genmatch',[(g,content) for g in tool.genmatches],default=1.0)
+
+
+def correctionSet(corrections, description=""):
+  """Wrap a list of corrections into a correctionlib (schema v2) correction set."""
+  return { 'schema_version': 2, 'description': description, 'corrections': list(corrections) }
+
+
+def writeCorrectionSet(cset, filename, verbose=False):
+  """Write a correction set to a JSON file, which is compressed with gzip if the file name ends with '.gz'."""
+  if filename.endswith('.gz'):
+    with gzip.open(filename,'wt') as file:
+      json.dump(cset,file)
+  else:
+    with open(filename,'w') as file:
+      json.dump(cset,file,indent=1)
+  if verbose:
+    print(">>> writeCorrectionSet: Wrote %d corrections to '%s'"%(len(cset['corrections']),filename))
+  return filename
+
+
+def compileCorrectionSet(cset):
+  """Compile a correction set (dictionary, JSON string or file name) with correctionlib."""
+  try:
+    import correctionlib
+  except ImportError:
+    raise ImportError("Evaluating through correctionlib requires correctionlib! Install it with 'pip install correctionlib'.")
+  if isinstance(cset,dict):
+    return correctionlib.CorrectionSet.from_string(json.dumps(cset))
+  elif cset.lstrip().startswith('{'):
+    return correctionlib.CorrectionSet.from_string(cset)
+  return correctionlib.CorrectionSet.from_file(cset)
+
+
+def getValidationInputs(nvals=10000, seed=123):
+  """Random tau properties for the validation, including the bin edges and thresholds of all corrections."""
+  rng = np.random.RandomState(seed)
+  pts = [20.,34.,40.,100.,140.,170.,200.,500.,690.,1000.]
+  return {
+    'pt':       np.concatenate([pts,rng.uniform(10,1200,nvals-len(pts))]),
+    'eta':      np.concatenate([[-1.5,1.5,0.,2.3,-2.3,2.5],rng.uniform(-2.6,2.6,nvals-6)]),
+    'dm':       rng.choice([0,1,2,5,6,10,11],nvals),
+    'genmatch': rng.choice([0,1,2,3,4,5,6],nvals),
+  }
+
+
+class CorrectionlibTool:
+
+    def __init__(self, tool, name='tau', validate=True, tolerance=1e-12, verbose=False):
+        """Evaluate a tool through correctionlib: the getters of the tool (e.g. getSFvsDMandPT and
+        getSFvsDMandPTBatch) are replaced by ones with the same arguments that evaluate its corrections
+        with correctionlib's compiled evaluator, which is vectorized over NumPy arrays.
+        Other attributes are taken from the tool. Requires correctionlib.
+        Options:
+          validate:  compare the corrections to the getters of the tool for random taus,
+                     and raise a ValueError if they differ by more than the tolerance
+        """
+        self.tool        = tool
+        self.name        = name
+        self.tolerance   = tolerance
+        self.corrections = getCorrections(tool,name)
+        self.cset        = compileCorrectionSet(correctionSet(self.corrections))
+        self.getters     = getGetters(tool)
+        for (getter, args, default, systs), correction in zip(self.getters,self.corrections):
+          self.addGetter(getter,self.cset[correction['name']],args,default,systs)
+        if validate:
+          deviations = self.validate()
+          if verbose:
+            for (getter, unc), dev in deviations.items():
+              print(">>> CorrectionlibTool: %s, unc=%r: maximum deviation %.3g"%(getter,unc,dev))
+
+    def __getstate__(self):
+        """Picklable state without the compiled correction set, which is rebuilt when unpickled."""
+        return { 'tool': self.tool, 'name': self.name, 'tolerance': self.tolerance }
+
+    def __setstate__(self, state):
+        self.__init__(state['tool'],state['name'],validate=False,tolerance=state['tolerance'])
+
+    def __getattr__(self, attr):
+        if attr=='tool': # not yet set
+          raise AttributeError(attr)
+        return getattr(self.tool,attr)
+
+    def addGetter(self, getter, correction, names, default, systs):
+        """Add a scalar and vectorized getter that evaluate a correction with the given arguments."""
+        mode = getMode(self.tool)
+        def getSyst(unc):
+          if isinstance(unc,(int,np.integer)) and not isinstance(unc,bool) and mode=='highpT': # handle
+            unc = next((u for u, h in self.tool.highptHandles.items() if h==unc),unc)
+          if unc not in systs:
+            raise KeyError("Unknown uncertainty %r for %s!"%(unc,getter))
+          return systs[unc]
+        def getArgs(args, kwargs):
+          args = list(args)
+          unc  = kwargs.pop('unc',None)
+          if len(args)==len(names)+1: # uncertainty as positional argument
+            unc = args.pop()
+          elif len(args)>len(names)+1:
+            raise TypeError("%s() takes at most %d arguments, got %d!"%(getter,len(names)+1,len(args)))
+          for name in names[len(args):]:
+            if name in kwargs:
+              args.append(kwargs.pop(name))
+            elif name=='genmatch' and default is not None:
+              args.append(default)
+            else:
+              raise TypeError("%s() missing argument %r!"%(getter,name))
+          return args, unc
+        def scalar(*args, **kwargs):
+          args, unc = getArgs(args,kwargs)
+          if unc=='All' and mode!='ptdm':
+            return tuple(correction.evaluate(*(args+[systs[u]])) for u in ['Down',None,'Up'])
+          return correction.evaluate(*(args+[getSyst(unc)]))
+        def batch(*args, **kwargs):
+          args, unc = getArgs(args,kwargs)
+          arrays = [np.asarray(a,dtype=np.float64 if _inputs[n][0]=='real' else np.int64) for n, a in zip(names,args)]
+          shape  = np.broadcast(*arrays).shape
+          arrays = [np.broadcast_to(a,shape) for a in arrays]
+          if unc=='All':
+            if mode=='ptdm':
+              return dict((s,correction.evaluate(*(arrays+[s]))) for s in sorted(systs.values()))
+            return tuple(correction.evaluate(*(arrays+[systs[u]])) for u in ['Down',None,'Up'])
+          return correction.evaluate(*(arrays+[getSyst(unc)]))
+        scalar.__name__, batch.__name__ = getter, getter+'Batch'
+        self.__dict__[getter] = scalar
+        self.__dict__[getter+'Batch'] = jaggedBatch(batch)
+
+    def validate(self, nvals=10000, seed=123):
+        """Compare the corrections evaluated with correctionlib to the vectorized getters of the tool for random taus.
+        Return the maximum absolute deviation for each getter and uncertainty; raise a ValueError if it exceeds
+        the tolerance (plus the maximum deviation of tabulated functions from the exact ones).
+        Note that correctionlib may round numbers in JSON to one unit in the last place (~1e-16)."""
+        inputs     = getValidationInputs(nvals,seed)
+        tolerance  = self.tolerance
+        if getattr(self.tool,'tabulationErrors',None):
+          tolerance += self.tool.getTabulationError()
+        deviations = { }
+        for getter, args, default, systs in self.getters:
+          values = [inputs[a] for a in args]
+          for unc in systs:
+            expect = getattr(self.tool,getter+'Batch')(*values,unc=unc)
+            result = getattr(self,getter+'Batch')(*values,unc=unc)
+            deviations[(getter,unc)] = dev = float(np.max(np.abs(result-expect))) if len(expect) else 0.0
+            if not dev<=tolerance:
+              raise ValueError("Correction for %s with unc=%r deviates by up to %.3g from the tool!"%(getter,unc,dev))
+        return deviations
+
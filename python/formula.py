@@ -0,0 +1,167 @@
+# Description: Translate ROOT TFormula expressions into vectorized NumPy functions
+from __future__ import print_function
+import re
+import numpy as np
+
+_tokenrexp = re.compile(r"""
+   (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  |(?P<param>\[\s*p?(\d+)\s*\])
+  |(?P<name>[A-Za-z_][A-Za-z_0-9]*(?:::[A-Za-z_][A-Za-z_0-9]*)?)
+  |(?P<op>&&|\|\||<=|>=|==|!=|[-+*/^(),<>!])
+  |(?P<space>\s+)
+""",re.VERBOSE)
+
+_functions = { # TFormula function name -> (NumPy function, number of arguments)
+  'pow':   ('_np.power',   2), 'TMath::Power': ('_np.power', 2),
+  'min':   ('_np.minimum', 2), 'TMath::Min':   ('_np.minimum', 2),
+  'max':   ('_np.maximum', 2), 'TMath::Max':   ('_np.maximum', 2),
+  'exp':   ('_np.exp',     1), 'TMath::Exp':   ('_np.exp',   1),
+  'log':   ('_np.log',     1), 'TMath::Log':   ('_np.log',   1),
+  'log10': ('_np.log10',   1), 'TMath::Log10': ('_np.log10', 1),
+  'sqrt':  ('_np.sqrt',    1), 'TMath::Sqrt':  ('_np.sqrt',  1),
+  'abs':   ('_np.abs',     1), 'fabs':         ('_np.abs',   1), 'TMath::Abs': ('_np.abs', 1),
+  'sin':   ('_np.sin',     1), 'cos':          ('_np.cos',   1), 'tan':        ('_np.tan', 1),
+  'atan':  ('_np.arctan',  1), 'tanh':         ('_np.tanh',  1),
+}
+_comparisons = ['<','<=','>','>=','==','!=']
+_compiled    = { } # formula -> (function, number of parameters), reused for identical formulas
+
+
+def tokenize(formula):
+  """Split a TFormula expression into (type, value) tokens."""
+  tokens = [ ]
+  pos    = 0
+  while pos<len(formula):
+    match = _tokenrexp.match(formula,pos)
+    if not match:
+      raise ValueError("Cannot parse formula %r at position %d!"%(formula,pos))
+    pos = match.end()
+    if match.lastgroup=='space':
+      continue
+    elif match.lastgroup=='param':
+      tokens.append(('param',int(match.group(3))))
+    else:
+      tokens.append((match.lastgroup,match.group(match.lastgroup)))
+  return tokens
+
+
+class _Parser:
+  """Recursive-descent parser of TFormula expressions following C operator precedence,
+  emitting fully parenthesized Python code that evaluates with NumPy."""
+
+  def __init__(self, formula):
+    self.formula = formula
+    self.tokens  = tokenize(formula)
+    self.pos     = 0
+    self.npars   = 0
+
+  def peek(self):
+    return self.tokens[self.pos] if self.pos<len(self.tokens) else (None,None)
+
+  def next(self):
+    token = self.peek()
+    self.pos += 1
+    return token
+
+  def expect(self, value):
+    type, token = self.next()
+    if token!=value:
+      raise ValueError("Expected %r in formula %r, got %r!"%(value,self.formula,token))
+
+  def parse(self):
+    code = self.logical_or()
+    if self.pos<len(self.tokens):
+      raise ValueError("Unexpected token %r in formula %r!"%(self.peek()[1],self.formula))
+    return code
+
+  def logical_or(self):
+    code = self.logical_and()
+    while self.peek()==('op','||'):
+      self.next()
+      code = "(_np.logical_or(%s,%s)*1.0)"%(code,self.logical_and())
+    return code
+
+  def logical_and(self):
+    code = self.comparison()
+    while self.peek()==('op','&&'):
+      self.next()
+      code = "(_np.logical_and(%s,%s)*1.0)"%(code,self.comparison())
+    return code
+
+  def comparison(self):
+    code = self.additive()
+    while self.peek()[0]=='op' and self.peek()[1] in _comparisons:
+      op   = self.next()[1]
+      code = "((%s%s%s)*1.0)"%(code,op,self.additive())
+    return code
+
+  def additive(self):
+    code = self.multiplicative()
+    while self.peek()[0]=='op' and self.peek()[1] in ['+','-']:
+      op   = self.next()[1]
+      code = "(%s%s%s)"%(code,op,self.multiplicative())
+    return code
+
+  def multiplicative(self):
+    code = self.unary()
+    while self.peek()[0]=='op' and self.peek()[1] in ['*','/']:
+      op   = self.next()[1]
+      code = "(%s%s%s)"%(code,op,self.unary())
+    return code
+
+  def unary(self):
+    type, token = self.peek()
+    if type=='op' and token in ['-','+']:
+      self.next()
+      return "(%s%s)"%(token,self.unary())
+    elif type=='op' and token=='!':
+      self.next()
+      return "(_np.logical_not(%s)*1.0)"%(self.unary())
+    return self.power()
+
+  def power(self):
+    code = self.primary()
+    if self.peek()==('op','^'):
+      self.next()
+      code = "_np.power(%s,%s)"%(code,self.unary()) # right-associative
+    return code
+
+  def primary(self):
+    type, token = self.next()
+    if type=='number':
+      return repr(float(token))
+    elif type=='param':
+      self.npars = max(self.npars,token+1)
+      return "p[%d]"%(token)
+    elif type=='name':
+      if token=='x':
+        return 'x'
+      elif token in _functions:
+        func, nargs = _functions[token]
+        self.expect('(')
+        args = [ self.logical_or() ]
+        while self.peek()==('op',','):
+          self.next()
+          args.append(self.logical_or())
+        self.expect(')')
+        if len(args)!=nargs:
+          raise ValueError("Function %r takes %d arguments in formula %r!"%(token,nargs,self.formula))
+        return "%s(%s)"%(func,','.join(args))
+      raise ValueError("Unsupported name %r in formula %r!"%(token,self.formula))
+    elif (type,token)==('op','('):
+      code = self.logical_or()
+      self.expect(')')
+      return code
+    raise ValueError("Unexpected token %r in formula %r!"%(token,self.formula))
+
+
+def compileFormula(formula):
+  """Compile a TFormula expression in x and parameters [p0], [p1], ... (or [0], [1], ...)
+  into a function f(x,p) that is evaluated with NumPy. Returns the function and the number of parameters."""
+  if formula not in _compiled:
+    parser = _Parser(formula)
+    code   = parser.parse()
+    func   = eval(compile("lambda x, p=(): %s"%(code),"<TFormula %r>"%(formula),'eval'),{'_np': np})
+    _compiled[formula] = (func,parser.npars)
+  return _compiled[formula]
+
@@ -1,6 +1,37 @@
 from __future__ import print_function
 import os
-from ROOT import TFile, TH1
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+    from TauPOG.TauIDSFs.compiled import CompiledTF1
+    from TauPOG.TauIDSFs.payloadcache import getPayloadCache
+    from TauPOG.TauIDSFs.uprootfile import UprootFile
+else:
+    from compiled import CompiledTF1
+    from payloadcache import getPayloadCache
+    from uprootfile import UprootFile
+backends = ['ROOT', 'uproot']
+_backend = os.environ.get('TAUIDSFs_BACKEND', None)
+
+
+def getBackend():
+    """Return the backend to read ROOT files with: 'ROOT' if it can be imported, else 'uproot'.
+    ROOT is only imported here, the first time a ROOT file has to be opened.
+    The choice can be forced with setBackend, or the TAUIDSFs_BACKEND environment variable."""
+    global _backend
+    if _backend is None:
+        try:
+            import ROOT
+            _backend = 'ROOT'
+        except ImportError:
+            _backend = 'uproot'
+    return _backend
+
+
+def setBackend(backend):
+    """Set the backend to read ROOT files with."""
+    global _backend
+    if backend not in backends:
+        raise ValueError("Unknown backend %r! Choose from %s." % (backend, ', '.join(backends)))
+    _backend = backend
 
 
 def ensureTFile(filename, option='READ', verbose=False):
@@ -9,12 +40,31 @@ def ensureTFile(filename, option='READ', verbose=False):
         raise IOError("File in path '%s' does not exist!" % (filename))
     if verbose:
         print("Opening '%s'..." % (filename))
+    from ROOT import TFile
     file = TFile.Open(filename, option)
     if not file or file.IsZombie():
         raise IOError("Could not open file by name '%s'" % (filename))
     return file
 
 
+def ensurePayloadFile(filename, verbose=False):
+    """Open a file with SF payloads: Use a TFile-like view of the memory-mapped payload cache
+    in the same directory if it contains an up-to-date copy of the file, else open the file
+    with the backend returned by getBackend."""
+    cache = getPayloadCache(os.path.dirname(filename))
+    if cache and cache.contains(filename):
+        if verbose:
+            print("Opening '%s' from payload cache '%s'..." % (filename, cache.filename))
+        return cache.open(filename)
+    if getBackend() == 'uproot':
+        if not os.path.isfile(filename):
+            raise IOError("File in path '%s' does not exist!" % (filename))
+        if verbose:
+            print("Opening '%s' with uproot..." % (filename))
+        return UprootFile(filename)
+    return ensureTFile(filename, 'READ', verbose=verbose)
+
+
 def ensureFile(*paths, **kwargs):
     """Ensure file exists."""
     filepath = os.path.join(*paths)
@@ -32,29 +82,50 @@ def extractTH1(file, histname, setdir=True):
     """Get histogram by name from a given file."""
     close = False
     if isinstance(file, str):
-        file = ensureTFile(file, 'READ')
+        file = ensurePayloadFile(file)
         close = True
     if not file or file.IsZombie():
         raise IOError("Could not open file for histogram '%s'!" % (histname))
     hist = file.Get(histname)
     if not hist:
         raise IOError("Did not find histogram '%s' in file '%s'!" % (histname, file.GetName()))
-    if setdir and isinstance(hist, TH1):
+    if setdir and hasattr(hist, 'SetDirectory'):
         hist.SetDirectory(0)
         if close:
             file.Close()
     return hist
 
+def extractTF1(file, funcname, compile=True):
+    """Get function by name from a given file, and compile it into a ROOT-free CompiledTF1."""
+    close = False
+    if isinstance(file, str):
+        file = ensurePayloadFile(file)
+        close = True
+    if not file or file.IsZombie():
+        raise IOError("Could not open file for function '%s'!" % (funcname))
+    func = file.Get(funcname)
+    if not func:
+        raise IOError("Did not find function '%s' in file '%s'!" % (funcname, file.GetName()))
+    if compile:
+        func = CompiledTF1.fromTF1(func)
+    if close: file.Close()
+    return func
+
+
 def extractTF1DMandPT(file, funcname, uncerts=[]):
-    """Get function by name from a given file."""
+    """Get function by name from a given file, together with its up/down variations.
+    The functions are compiled into ROOT-free CompiledTF1 objects, so the file can be closed afterwards.
+    Variations that are not found in the file are left out of the returned dictionary."""
     close = False
     if isinstance(file, str):
-        file = ensureTFile(file, 'READ')
+        file = ensurePayloadFile(file)
         close = True
     if not file or file.IsZombie():
         raise IOError("Could not open file for function '%s'!" % (funcname))
     func = file.Get(funcname)
-    funcs = {'nom': func}
+    if not func:
+        raise IOError("Did not find function '%s' in file '%s'!" % (funcname, file.GetName()))
+    funcs = {'nom': CompiledTF1.fromTF1(func)}
     if len(uncerts) >0: 
       for u in uncerts:
         for x in ['up','down']: 
@@ -62,9 +133,9 @@ def extractTF1DMandPT(file, funcname, uncerts=[]):
           elif 'TES' in u:
             syst_funcname = funcname.replace('fit', '%s%s_fit' % (u,x.capitalize()))
           else:           syst_funcname = funcname.replace('fit','fit_%s_%s' % (u,x))
-          funcs['%s_%s' %(u,x)] = file.Get(syst_funcname) 
-    if not func:
-        raise IOError("Did not find function '%s' in file '%s'!" % (funcname, file.GetName()))
+          syst_func = file.Get(syst_funcname)
+          if syst_func:
+            funcs['%s_%s' %(u,x)] = CompiledTF1.fromTF1(syst_func)
     if close: file.Close()
     return funcs
 
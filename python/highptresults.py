@@ -0,0 +1,124 @@
+# Description: Single-pass parser of the results of the combined fits of the high-pT tau ID SFs (W* -> tau nu)
+#              in data/HighPT_tauIdSF_4eras_*.txt and the DM fractions in data/HighPT_fractions_4eras_*.txt,
+#              into columnar records, cached by the hash of the file contents
+from __future__ import print_function
+import os, re
+import hashlib
+from glob import glob
+from collections import OrderedDict
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  datapath = os.path.join(os.environ.get('CMSSW_BASE',""),"src/TauPOG/TauIDSFs/data")
+else:
+  datapath = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../data")
+kinds     = { 'tauIdSF': 'sf', 'fractions': 'fractions' } # file name -> kind of results
+keys      = ['tagger','wp_vsmu','wp_vsele','wp','era','ptbin','ptmin','ptmax','ptmean','ptrms']
+columns   = { 'sf': ['value','sys','sys_era','stat'], 'fractions': ['dm0','dm1','dm10','dm11'] }
+eras      = { '16APV': '2016_preVFP', '16': '2016_postVFP', '17': '2017', '18': '2018' } # suffix of POI -> era
+_dms      = { '1prong': 'dm0', '1prongpi0': 'dm1', '3prong': 'dm10', '3prongpi0': 'dm11' }
+_cache    = { } # (SHA-1 of file contents, tagger) -> columns, shared within a process
+_fileexp  = re.compile(r"HighPT_(tauIdSF|fractions)_\w+?_(\w+)\.txt$") # e.g. HighPT_tauIdSF_4eras_DeepTau2018v2p5VSjet.txt
+_wpsexp   = re.compile(r"^\++ *(\w+)VSmu (\w+)VSe discriminants") # e.g. '+++++ TightVSmu VVLooseVSe discriminants +++++'
+_vsjetexp = re.compile(r"^(\w+)VSjet\s*$") # e.g. 'MediumVSjet'
+_poiexp   = re.compile(r"^r_([a-z]+)_(\w+)\s*=(.*)$") # e.g. 'r_lowpt_16APV = ...'
+_errexp   = re.compile(r"\+/-\s*([-+]?\d*\.?\d+)\(([\w.]+)\)") # e.g. '+/- 0.121(sys)'
+_ptbinexp = re.compile(r"tau pT\s*(?:=\s*\[(\d+),(\d+)\]|>\s*(\d+))\s*GeV\s*->\s*mean\s*=\s*(\d+)\s*GeV,\s*RMS\s*=\s*(\d+)\s*GeV\s*\((\w+)\)")
+_formexp  = re.compile(r"^Format\s*:\s*\w+\s*=\s*(.*)$") # e.g. 'Format : ptbin_era = 1prong, 1prongpi0, ...'
+
+
+def getEra(suffix):
+  """Return the era of the suffix of a POI, e.g. '16APV' -> '2016_preVFP', '17' -> '2017', '22EE' -> '2022_postEE'."""
+  if suffix in eras:
+    return eras[suffix]
+  match = re.match(r"^(\d\d)(EE)?$",suffix)
+  if match:
+    return "20"+match.group(1)+("_postEE" if match.group(2) else "")
+  return None
+
+
+def parseHighPTResults(filename, verbose=False):
+  """Parse a file with the results of the high-pT fits in a single pass, and return an ordered dictionary of columns
+  with one row per POI (era and pT bin) and WPs: the keys, and 'value', 'sys', 'sys_era' and 'stat' for the SFs,
+  or 'dm0', 'dm1', 'dm10' and 'dm11' for the (unnormalized) DM fractions. The WPs are given without the
+  'VSmu', 'VSe' or 'VSjet' suffix, and the pT range, mean and RMS of each pT bin are parsed from the header (else NaN).
+  The columns are cached by the SHA-1 hash of the file contents, so the same file is only parsed once per process.
+  Do not modify the returned arrays."""
+  match  = _fileexp.search(os.path.basename(filename))
+  if not match:
+    raise ValueError("Cannot parse kind of results and tagger from file name '%s'!"%(filename))
+  kind, tagger = kinds[match.group(1)], match.group(2)
+  with open(filename,'rb') as file:
+    data = file.read()
+  digest = hashlib.sha1(data).hexdigest()
+  if (digest,tagger) in _cache:
+    return _cache[(digest,tagger)]
+  if verbose:
+    print(">>> parseHighPTResults: Parsing '%s'..."%(filename))
+  rows   = OrderedDict((c,[ ]) for c in keys+columns[kind])
+  ptbins = { } # name -> (ptmin, ptmax, mean, rms)
+  order  = [_dms[d] for d in ['1prong','1prongpi0','3prong','3prongpi0']]
+  wp_vsmu = wp_vsele = wp = None
+  for line in data.decode('utf-8').splitlines():
+    line  = line.strip()
+    match = _poiexp.match(line)
+    if match:
+      era = getEra(match.group(2))
+      if wp_vsele is None or wp is None or era is None:
+        continue
+      ptbin = match.group(1)
+      if kind=='sf':
+        value  = float(match.group(3).split('+/-')[0])
+        errors = dict(('sys_era' if label.startswith('sys.') else label,float(err)) # e.g. 'sys.2016'
+                      for err, label in _errexp.findall(match.group(3)))
+        values = [value]+[errors.get(c,np.nan) for c in columns[kind][1:]]
+      else:
+        fracts = dict(zip(order,(float(v) for v in match.group(3).split(','))))
+        values = [fracts.get(c,np.nan) for c in columns[kind]]
+      for column, value in zip(keys+columns[kind],[tagger,wp_vsmu,wp_vsele,wp,era,ptbin]+
+                                                  list(ptbins.get(ptbin,[np.nan]*4))+values):
+        rows[column].append(value)
+    elif _vsjetexp.match(line):
+      wp = _vsjetexp.match(line).group(1)
+    elif _wpsexp.match(line):
+      wp_vsmu, wp_vsele = _wpsexp.match(line).groups()
+      wp = None
+    elif _ptbinexp.search(line):
+      low, high, min_, mean, rms, name = _ptbinexp.search(line).groups()
+      ptbins[name] = (float(low or min_),float(high) if high else np.inf,float(mean),float(rms))
+    elif _formexp.match(line):
+      order = [_dms.get(d.strip()) for d in _formexp.match(line).group(1).split(',')]
+  table = OrderedDict()
+  for column, values in rows.items():
+    table[column] = np.array(values,dtype=(object if column in keys[:6] else np.float64))
+  _cache[(digest,tagger)] = table
+  return table
+
+
+def readHighPTResults(taggers=None, kind='sf', path=datapath, verbose=False):
+  """Parse the results of one kind ('sf' or 'fractions') for a list of taggers (by default all files in the data directory),
+  and return the concatenated columns."""
+  prefix = next(k for k, v in kinds.items() if v==kind)
+  if taggers is None:
+    filenames = sorted(glob(os.path.join(path,"HighPT_%s_*.txt"%(prefix))))
+  else:
+    filenames = [ ]
+    for tagger in ([taggers] if isinstance(taggers,str) else taggers):
+      matches = sorted(glob(os.path.join(path,"HighPT_%s_*_%s.txt"%(prefix,tagger))))
+      if not matches:
+        raise IOError("Did not find high-pT results '%s' for %s in '%s'!"%(prefix,tagger,path))
+      filenames.extend(matches)
+  tables = [parseHighPTResults(f,verbose=verbose) for f in filenames]
+  table  = OrderedDict()
+  for column in keys+columns[kind]:
+    table[column] = np.concatenate([t[column] for t in tables]) if tables else np.zeros(0)
+  return table
+
+
+def iterGroups(table, *fields):
+  """Yield the values of the given key columns and the indices of the rows of each group,
+  in the order of their first appearance, e.g. iterGroups(table,'wp_vsele','wp','era')."""
+  groups = OrderedDict()
+  for i, values in enumerate(zip(*[table[f] for f in fields])):
+    groups.setdefault(values,[ ]).append(i)
+  for values, indices in groups.items():
+    yield values, np.array(indices,dtype=np.int64)
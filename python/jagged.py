@@ -0,0 +1,116 @@
+# Description: Support of jagged collections (e.g. taus per event) in the vectorized tool methods
+from __future__ import print_function
+import functools
+import numpy as np
+
+
+class JaggedArray:
+    """Minimal jagged array of flat content with offsets:
+    the values of event i are content[offsets[i]:offsets[i+1]]."""
+
+    def __init__(self, content, offsets):
+        self.content = np.asarray(content)
+        self.offsets = np.asarray(offsets,dtype=np.int64)
+        if self.offsets.ndim!=1 or len(self.offsets)<1:
+          raise ValueError("Offsets should be a 1D array with at least one element!")
+        if self.offsets[-1]>len(self.content):
+          raise ValueError("Last offset %d exceeds the length of the content (%d)!"%(self.offsets[-1],len(self.content)))
+
+    @classmethod
+    def fromCounts(cls, content, counts):
+        """Create from the number of values per event."""
+        offsets = np.zeros(len(counts)+1,dtype=np.int64)
+        np.cumsum(counts,out=offsets[1:])
+        return cls(content,offsets)
+
+    def __repr__(self):
+        return "<%s with %d events and %d values>"%(self.__class__.__name__,len(self),self.offsets[-1]-self.offsets[0])
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, i):
+        return self.content[self.offsets[i]:self.offsets[i+1]]
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def flat(self):
+        """Return the flat content of all events."""
+        return self.content[self.offsets[0]:self.offsets[-1]]
+
+
+def isAwkward(array):
+    """Check if an object is an Awkward Array, without importing awkward."""
+    return type(array).__module__.split('.')[0]=='awkward'
+
+
+def flatten(array):
+    """Flatten a JaggedArray or a jagged Awkward Array. Return the flat NumPy content and its layout
+    (counts per event), or the unchanged object and None if it is not jagged."""
+    if isinstance(array,JaggedArray):
+      return array.flat(), ('offsets',array.counts)
+    elif isAwkward(array) and array.ndim==2:
+      import awkward as ak
+      return ak.to_numpy(ak.flatten(array,axis=1)), ('awkward',ak.to_numpy(ak.num(array,axis=1)))
+    return array, None
+
+
+def unflatten(values, layout):
+    """Restore the jagged layout of flat values (array, tuple or dictionary of arrays)."""
+    if isinstance(values,dict):
+      return type(values)((key,unflatten(value,layout)) for key, value in values.items())
+    elif isinstance(values,tuple):
+      return tuple(unflatten(value,layout) for value in values)
+    elif layout[0]=='awkward':
+      import awkward as ak
+      return ak.unflatten(np.asarray(values),layout[1])
+    return JaggedArray.fromCounts(values,layout[1])
+
+
+def jaggedBatch(method):
+    """Decorator of vectorized methods to accept jagged arrays (JaggedArray or Awkward Array)
+    of taus per event. All jagged arguments should have the same layout; the flat content
+    is passed to the method, and the output is returned with the same layout."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+      layout = None
+      args   = list(args)
+      names  = list(range(len(args)))+list(kwargs)
+      for name in names:
+        value = args[name] if isinstance(name,int) else kwargs[name]
+        flat, layout_ = flatten(value)
+        if layout_ is None:
+          continue
+        if layout is None:
+          layout = layout_
+        elif not np.array_equal(layout[1],layout_[1]):
+          raise ValueError("Jagged arguments of %s should have the same number of values per event!"%(method.__name__))
+        if isinstance(name,int):
+          args[name] = flat
+        else:
+          kwargs[name] = flat
+      result = method(*args,**kwargs)
+      if layout is None:
+        return result
+      return unflatten(result,layout)
+    return wrapper
+
+
+def eventProduct(values):
+    """Multiply the values of each event, e.g. the SFs of all taus into an event weight.
+    Events without any values get 1. Returns a NumPy array with one value per event."""
+    if isinstance(values,JaggedArray):
+      content = np.asarray(values.flat(),dtype=np.float64)
+      counts  = values.counts
+      product = np.ones(len(counts))
+      filled  = counts>0
+      starts  = (values.offsets[:-1]-values.offsets[0])[filled]
+      if len(starts)>0:
+        product[filled] = np.multiply.reduceat(content,starts)
+      return product
+    elif isAwkward(values):
+      import awkward as ak
+      return ak.to_numpy(ak.prod(values,axis=1))
+    raise TypeError("Expected a JaggedArray or Awkward Array, got %r!"%(type(values)))
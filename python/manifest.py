@@ -0,0 +1,155 @@
+# Description: Index of the payload files in data/, parsed from their names and cached on disk,
+#              so the tools can resolve the file for an era, ID and WPs without globbing the directory
+from __future__ import print_function
+import os, re
+import json
+import hashlib
+manifestname = "TauIDSFs_manifest.json"
+_manifests   = { } # path -> Manifest, shared within a process
+_prefixes    = [ # file name prefix -> kind of payload
+  ('TauID_SF_pt_SplitHighPT',  'sf_pt_splithighpt'),
+  ('TauID_SF_pt',              'sf_pt'),
+  ('TauID_SF_dm',              'sf_dm'),
+  ('TauID_SF_eta-dm',          'sf_eta-dm'),
+  ('TauID_SF_eta',             'sf_eta'),
+  ('TauID_SF_HighptExtrap',    'sf_highpt_extrap'),
+  ('TauID_SF_Highpt',          'sf_highpt'),
+  ('TauID_Highpt_DMFracts_DY', 'highpt_dmfracts_dy'),
+  ('TauID_Highpt_DMFracts',    'highpt_dmfracts'),
+  ('TauES_dm_pt',              'tes_pt'),
+  ('TauES_SF_dm',              'tes_sf'),
+  ('TauES_dm',                 'tes'),
+  ('TauFES_eta-dm',            'fes'),
+  ('JetToTauFakeRates',        'fakerate'),
+]
+_fields    = ['kind','id','era','wp','wp_vsele','tag','variant']
+_eraexp    = re.compile(r"^(?:UL)?20\d\d(?:[A-Z]|ReReco|Legacy)?$")
+_suberas   = ['preVFP','postVFP','preEE','postEE']
+_tagexp    = re.compile(r"^[A-Z][a-z][a-z]\d\d$") # e.g. Mar07, Jul18, Dec05
+
+
+def parseFilename(filename):
+  """Parse the name of a payload file into a dictionary with kind, ID, era, WPs vs. jet and electrons,
+  version tag (e.g. 'Jul18' or 'Run3_Dec05') and variant (e.g. 'EMB' or 'ptgt100').
+  Fields that do not appear in the name are None. Return None for files that are not payloads."""
+  stem, ext = os.path.splitext(os.path.basename(filename))
+  if ext!='.root':
+    return None
+  for prefix, kind in _prefixes:
+    if stem.startswith(prefix+'_'):
+      break
+  else:
+    return None
+  tokens = stem[len(prefix)+1:].split('_')
+  entry  = dict((field,None) for field in _fields)
+  entry['kind'] = kind
+  entry['id']   = tokens.pop(0)
+  variant = [ ]
+  while tokens:
+    token = tokens.pop(0)
+    if _eraexp.match(token) and entry['era'] is None:
+      if tokens and tokens[0] in _suberas:
+        token += '_'+tokens.pop(0)
+      entry['era'] = token
+    elif token.startswith('VSjet') and len(token)>5:
+      entry['wp'] = token[5:]
+    elif token.startswith('VSele') and len(token)>5:
+      entry['wp_vsele'] = token[5:]
+    elif token=='Run3' and tokens and _tagexp.match(tokens[0]):
+      entry['tag'] = token+'_'+tokens.pop(0)
+    elif _tagexp.match(token):
+      entry['tag'] = token
+    else:
+      variant.append(token)
+  if variant:
+    entry['variant'] = '_'.join(variant)
+  return entry
+
+
+def eraAliases(era):
+  """Eras to look up for a given era, from the most to the least specific,
+  e.g. '2023C' is also found in files for '2023', and 'UL2018' in files for '2018'."""
+  eras = [era]
+  if re.match(r"^UL20\d\d",era):
+    eras.append(era[2:])
+  if re.match(r"^20\d\d[A-Z]$",era):
+    eras.append(era[:4])
+  return eras
+
+
+def normalizeEra(era):
+  """Common spelling of an era in the names of files and objects, i.e. without the 'UL' prefix of the Run 2 files,
+  e.g. 'UL2016_postVFP' -> '2016_postVFP'."""
+  if era and re.match(r"^UL20\d\d",era):
+    return eraAliases(era)[1]
+  return era
+
+
+class Manifest:
+  """Index of all payload files in a data directory.
+  The index is stored as JSON in the directory (or at the path set by the TAUIDSFs_MANIFEST environment variable),
+  and is only rebuilt if the list of ROOT files in the directory changed, which is checked with a single directory listing."""
+
+  def __init__(self, path, filename=None, verbose=False):
+    self.path     = path
+    self.filename = filename or os.environ.get('TAUIDSFs_MANIFEST',os.path.join(path,manifestname))
+    self.verbose  = verbose
+    self.entries  = None
+    filenames     = sorted(f for f in os.listdir(path) if f.endswith('.root'))
+    checksum      = hashlib.sha1('\n'.join(filenames).encode('utf-8')).hexdigest()
+    if os.path.isfile(self.filename):
+      try:
+        with open(self.filename) as file:
+          index = json.load(file)
+        if index.get('version')==1 and index.get('checksum')==checksum:
+          self.entries = index['entries']
+      except (IOError,ValueError):
+        pass # rebuild corrupt manifest
+    if self.entries is None:
+      self.build(filenames,checksum)
+
+  def __repr__(self):
+    return "<%s('%s') with %d files>"%(self.__class__.__name__,self.path,len(self.entries))
+
+  def build(self, filenames, checksum):
+    """Parse the names of the files in the data directory, and try to store the index on disk."""
+    if self.verbose:
+      print(">>> Manifest.build: Indexing %d files in '%s'..."%(len(filenames),self.path))
+    entries = [ ]
+    for filename in filenames:
+      entry = parseFilename(filename)
+      if entry is not None:
+        entry['filename'] = filename
+        entries.append(entry)
+    self.entries = entries
+    try:
+      tmpname = "%s.%d.tmp"%(self.filename,os.getpid())
+      with open(tmpname,'w') as file:
+        json.dump({ 'version': 1, 'checksum': checksum, 'entries': entries },file,sort_keys=True,indent=0)
+      os.rename(tmpname,self.filename) # atomic replacement for concurrent readers
+    except (IOError,OSError): # e.g. read-only release area: keep in memory only
+      if self.verbose:
+        print(">>> Manifest.build: Could not write '%s'..."%(self.filename))
+
+  def find(self, kind, era=None, variant=None, **fields):
+    """Return the full paths of all payload files of a kind that match the given fields,
+    e.g. id, wp, wp_vsele or tag; fields that are None are ignored, except the variant."""
+    eras = eraAliases(era) if era else [None]
+    for era_ in eras:
+      fields['era'] = era_
+      matches = [ os.path.join(self.path,e['filename']) for e in self.entries if e['kind']==kind and e['variant']==variant and
+                  all(e[k]==v for k, v in fields.items() if v is not None) ]
+      if matches:
+        return matches
+    return [ ]
+
+  def eras(self, kind=None):
+    """Return all eras with payloads (of a given kind)."""
+    return sorted(set(e['era'] for e in self.entries if e['era'] and (kind is None or e['kind']==kind)))
+
+
+def getManifest(path, verbose=False):
+  """Get the manifest of a data directory, shared within a process."""
+  if path not in _manifests:
+    _manifests[path] = Manifest(path,verbose=verbose)
+  return _manifests[path]
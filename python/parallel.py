@@ -0,0 +1,54 @@
+# Description: Evaluate the vectorized tool methods on chunks of taus in a pool of threads
+from __future__ import print_function
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.jagged import flatten, unflatten
+else:
+  from jagged import flatten, unflatten
+
+
+def concatenate(results):
+  """Concatenate the outputs of the chunks: arrays, tuples or dictionaries of arrays."""
+  first = results[0]
+  if isinstance(first,dict):
+    return type(first)((key,np.concatenate([r[key] for r in results])) for key in first)
+  elif isinstance(first,tuple):
+    return tuple(np.concatenate([r[i] for r in results]) for i in range(len(first)))
+  return np.concatenate(results)
+
+
+def evaluateThreaded(method, *args, **kwargs):
+  """Evaluate a vectorized method (e.g. tool.getSFvsDMandPTBatch) on chunks of the input arrays in parallel threads,
+  and concatenate the output. Array arguments are split into chunks; scalar arguments are passed to every chunk.
+  Jagged arrays (JaggedArray or Awkward Array) are flattened first, and the output is returned with the same layout.
+  All vectorized methods of the tools are reentrant: they only read the precomputed tables and compiled functions
+  of the tool, and spend most of their time in NumPy kernels that release the GIL, so the threads run concurrently.
+  Options (as keyword arguments):
+    nthreads:  number of threads, default: number of CPUs
+    chunksize: number of taus per chunk, default: 65536
+  """
+  nthreads  = kwargs.pop('nthreads',None) or os.cpu_count() or 1
+  chunksize = kwargs.pop('chunksize',65536)
+  layout    = None
+  flatargs  = [ ]
+  for arg in args:
+    flat, layout_ = flatten(arg)
+    if isinstance(flat,(list,tuple)):
+      flat = np.asarray(flat)
+    if layout_ is not None:
+      layout = layout_
+    flatargs.append(flat)
+  nvals = max([len(a) for a in flatargs if isinstance(a,np.ndarray) and a.ndim>0]+[0])
+  if nvals<=chunksize or nthreads<=1:
+    result = method(*flatargs,**kwargs)
+  else:
+    def evaluate(start):
+      chunk = [a[start:start+chunksize] if isinstance(a,np.ndarray) and a.ndim>0 else a for a in flatargs]
+      return method(*chunk,**kwargs)
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+      result = concatenate(list(pool.map(evaluate,range(0,nvals,chunksize))))
+  if layout is not None:
+    return unflatten(result,layout)
+  return result
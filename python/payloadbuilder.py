@@ -0,0 +1,324 @@
+# Description: Build the SF payloads (TH1 and TGraphAsymmErrors) from tables of SFs in JSON, YAML or CSV files,
+#              with the uncertainty propagation on NumPy arrays, and write the ROOT files in parallel
+# Format of a JSON or YAML file: { "payloads": [ payload, ... ] }, where each payload is a dictionary with
+#   file:     name of the output file, formatted with the keys of the nested SF tables, e.g. "TauES_dm_{id}_{era}.root"
+#   keys:     names of the levels of the nested SF tables, default: ["id","era","object"], or ["id","era"] if object is given
+#   object:   name of the object in each file (if it is not a key), e.g. "tes"
+#   type:     "TH1" (default) or "TGraphAsymmErrors"
+#   bins:     bin edges, or { "n": nbins, "min": xmin, "max": xmax } (TH1 only)
+#   sfs:      nested SF tables, whose leaves are either a list of SFs per bin, or a dictionary of SFs keyed by
+#             x value (TH1), or by the label of the point (TGraphAsymmErrors)
+#   overflow: fill the overflow bin with the last SF of a list, or the default of a dictionary, default: false
+#   default:  SF of bins that are not in a dictionary, default: [0,0]
+#   percent:  SFs (true) or only their errors ("errors") are given in percent, default: false
+#   offset:   add to all values after conversion from percent, e.g. 1 for energy shifts, default: 0
+#   xtitle, ytitle: axis titles (TH1 only)
+# An SF is [value, error] or [value, error down, error up] (TGraphAsymmErrors only),
+# or a list of [value, error] factors that are multiplied, adding their relative errors in quadrature.
+# Format of a CSV file: one row per SF with columns 'file', 'object', 'low', 'high', 'value' and 'error',
+# where rows for the same bin are multiplied as factors; every file in the CSV is one TH1 payload.
+from __future__ import print_function
+import os, json
+from fnmatch import fnmatch
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.compiled import CompiledTH1, CompiledGraph, compileObject
+  from TauPOG.TauIDSFs.helpers import getBackend, ensurePayloadFile
+else:
+  from compiled import CompiledTH1, CompiledGraph, compileObject
+  from helpers import getBackend, ensurePayloadFile
+_csvcols = ['file','object','low','high','value','error']
+_wporder = ['loose','medium','tight']
+
+
+def loadTables(filename):
+  """Load the list of payloads from a JSON, YAML or CSV file."""
+  ext = os.path.splitext(filename)[1].lower()
+  if ext=='.csv':
+    return readCSV(filename)
+  with open(filename) as file:
+    if ext in ['.yaml','.yml']:
+      try:
+        import yaml
+      except ImportError:
+        raise ImportError("Reading '%s' requires PyYAML! Install it with 'pip install pyyaml'."%(filename))
+      tables = yaml.safe_load(file)
+    else:
+      tables = json.load(file,object_pairs_hook=OrderedDict)
+  if isinstance(tables,dict):
+    tables = tables.get('payloads',[tables])
+  return tables
+
+
+def readCSV(filename):
+  """Read a CSV file with one SF per row into one TH1 payload per output file.
+  The bin edges of each file are the union of the low and high edges of its rows."""
+  import csv
+  payloads = OrderedDict()
+  with open(filename) as file:
+    reader  = csv.DictReader(row for row in file if not row.lstrip().startswith('#'))
+    missing = [c for c in _csvcols if c not in (reader.fieldnames or [ ])]
+    if missing:
+      raise ValueError("CSV file '%s' misses columns %s!"%(filename,', '.join(missing)))
+    for row in reader:
+      payload = payloads.setdefault(row['file'],OrderedDict([('file',"{file}"),('keys',['file','object']),('edges',set()),
+                                                             ('sfs',OrderedDict([(row['file'],OrderedDict())]))]))
+      low, high = float(row['low']), float(row['high'])
+      payload['edges'].update([low,high])
+      bins = payload['sfs'][row['file']].setdefault(row['object'],OrderedDict())
+      bins.setdefault((low+high)/2.,[ ]).append([float(row['value']),float(row['error'])])
+  for payload in payloads.values():
+    payload['bins'] = sorted(payload.pop('edges'))
+  return list(payloads.values())
+
+
+def iterLeaves(tree, keys, fields=()):
+  """Recursively yield the fields (tuple of key-value pairs) and the SF table of each leaf of the nested SF tables."""
+  if not keys:
+    yield fields, tree
+  else:
+    for value, subtree in tree.items():
+      for leaf in iterLeaves(subtree,keys[1:],fields+((keys[0],value),)):
+        yield leaf
+
+
+def wporder(key):
+  """Custom ordering of WPs, e.g. VVLoose < VLoose < Loose < Medium < Tight < VTight; other objects come last."""
+  key = key.lower()
+  if key.replace('v','') in _wporder:
+    return _wporder.index(key.replace('v',''))-key.count('v')*('loose' in key)+key.count('v')*('tight' in key)
+  return 100
+
+
+def getEdges(bins):
+  """Return the array of bin edges from a list of edges, or a dictionary with 'n', 'min' and 'max'."""
+  if isinstance(bins,dict):
+    return np.linspace(bins['min'],bins['max'],int(bins['n'])+1)
+  return np.asarray(bins,dtype=np.float64)
+
+
+def combineSFs(sfs):
+  """Combine a list of SFs, each [value, error] or a list of [value, error] factors, into arrays of values and errors.
+  Factors are multiplied, and their relative errors added in quadrature; single SFs are kept as they are."""
+  nfacts  = np.array([len(sf) if isinstance(sf[0],(list,tuple)) else 1 for sf in sfs],dtype=np.int64)
+  factors = np.zeros((len(sfs),max(nfacts.max(initial=1),1),2))
+  factors[:,:,0] = 1. # pad with SF 1 +- 0
+  for i, sf in enumerate(sfs):
+    factors[i,:nfacts[i]] = np.asarray(sf,dtype=np.float64).reshape(-1,2)[:,:2]
+  values = factors[:,:,0].prod(axis=1)
+  with np.errstate(divide='ignore',invalid='ignore'):
+    relerrs = factors[:,:,1]/factors[:,:,0]
+    errors  = np.where(nfacts==1,factors[:,0,1],values*np.sqrt((relerrs**2).sum(axis=1)))
+  return values, errors
+
+
+def convert(values, errors, payload):
+  """Convert values and errors from percent, and add the offset."""
+  percent = payload.get('percent',False)
+  if percent is True:
+    values = values/100.
+  if percent:
+    errors = [e/100. for e in errors] if isinstance(errors,list) else errors/100.
+  return payload.get('offset',0)+values, errors
+
+
+def buildTH1(name, sfs, payload):
+  """Build a CompiledTH1 from a list of SFs per bin, or a dictionary of SFs keyed by x value."""
+  edges    = getEdges(payload['bins'])
+  nbins    = len(edges)-1
+  overflow = payload.get('overflow',False)
+  default  = payload.get('default',[0,0])
+  if isinstance(sfs,dict): # x value -> SF
+    xvals  = np.array([float(x) for x in sfs],dtype=np.float64)
+    ibins  = np.searchsorted(edges,xvals,side='right') # bin number as TAxis::FindBin
+    table  = [default]*(nbins+1+overflow)
+    for x, ibin, sf in zip(xvals,ibins,sfs.values()):
+      if ibin==0 or ibin>nbins+overflow:
+        raise ValueError("SF at x = %s of '%s' is outside the range [%s,%s] of the bins!"%(x,name,edges[0],edges[-1]))
+      table[ibin] = sf
+    table  = table[1:]
+  else: # one SF per bin
+    table  = list(sfs)
+    if len(table)>nbins+1:
+      raise ValueError("Got %d SFs for %d bins of '%s'!"%(len(table),nbins,name))
+    table += [table[-1] if overflow else default]*(nbins+overflow-len(table))
+  values, errors = convert(*combineSFs(table),payload=payload)
+  contents = np.zeros(nbins+2) # including underflow and overflow
+  contents[1:len(values)+1] = values
+  errs     = np.zeros(nbins+2)
+  errs[1:len(errors)+1] = errors
+  return CompiledTH1(edges,contents,errs,name=name)
+
+
+def buildGraph(name, sfs, payload):
+  """Build a CompiledGraph with asymmetric errors from a dictionary of SFs keyed by the label of the point.
+  The points are sorted by label, and placed at x = 0.5, 1.5, ..."""
+  labels = sorted(sfs)
+  table  = np.array([sfs[k] if len(sfs[k])==3 else [sfs[k][0],sfs[k][1],sfs[k][1]] for k in labels],dtype=np.float64)
+  values, errors = convert(table[:,0],[table[:,1],table[:,2]],payload=payload)
+  x      = np.arange(len(labels))+0.5
+  graph  = CompiledGraph(x,values,None,None,errors[0],errors[1],name=name)
+  graph.labels = labels
+  return graph
+
+
+def buildPayloads(payloads, pattern=None):
+  """Build all objects of a list of payloads, and return an ordered dictionary of file name to a list of
+  (object, options) with options for the writer: axis titles, and 'double' to write a TH1D instead of a TH1F.
+  Files can be selected with a glob pattern (or list of patterns) on the file name."""
+  patterns = [pattern] if isinstance(pattern,str) else pattern
+  files    = OrderedDict()
+  for payload in payloads:
+    type = payload.get('type','TH1')
+    if type not in ['TH1','TGraphAsymmErrors']:
+      raise ValueError("Unknown payload type %r! Choose from TH1, TGraphAsymmErrors."%(type))
+    keys = payload.get('keys') or (['id','era'] if 'object' in payload else ['id','era','object'])
+    opts = { 'xtitle': payload.get('xtitle',""), 'ytitle': payload.get('ytitle',"SF") }
+    for fields, sfs in iterLeaves(payload['sfs'],keys):
+      fields   = dict(fields)
+      filename = payload['file'].format(**fields)
+      if patterns and not any(fnmatch(filename,p) for p in patterns):
+        continue
+      name     = payload['object'].format(**fields) if 'object' in payload else fields['object']
+      objects  = files.setdefault(filename,[ ])
+      if any(o.name==name for o, _ in objects):
+        raise ValueError("Duplicate object '%s' in '%s'!"%(name,filename))
+      obj      = buildGraph(name,sfs,payload) if type=='TGraphAsymmErrors' else buildTH1(name,sfs,payload)
+      objects.append((obj,opts))
+  for objects in files.values():
+    objects.sort(key=lambda o: wporder(o[0].name))
+  return files
+
+
+def writeROOT(filename, objects):
+  """Write a list of (object, options) into a ROOT file with ROOT."""
+  from array import array
+  from ROOT import TFile, TH1F, TH1D, TGraphAsymmErrors, kFullDotLarge
+  file = TFile(filename,'RECREATE')
+  for obj, opts in objects:
+    if isinstance(obj,CompiledGraph):
+      n     = obj.GetN()
+      graph = TGraphAsymmErrors(n,obj.x,obj.y,obj.exl,obj.exh,obj.eyl,obj.eyh)
+      if getattr(obj,'labels',None): # one label per point
+        graph.GetXaxis().SetNdivisions(n*2)
+        graph.GetXaxis().ChangeLabel(0,-1,0,-1,-1,-1,"")
+        for i, label in enumerate(obj.labels):
+          graph.GetXaxis().ChangeLabel(2+i*2,-1,0)
+          graph.GetXaxis().ChangeLabel(1+i*2,-1,-1,-1,-1,-1,label)
+      graph.Write(obj.name)
+      continue
+    nbins = obj.GetNbinsX()
+    TH1  = TH1D if opts.get('double') else TH1F
+    if np.allclose(np.diff(obj.edges),(obj.edges[-1]-obj.edges[0])/nbins):
+      hist = TH1(obj.name,obj.name,nbins,obj.edges[0],obj.edges[-1])
+    else:
+      hist = TH1(obj.name,obj.name,nbins,array('d',obj.edges))
+    hist.GetYaxis().SetTitle(opts['ytitle'])
+    hist.GetXaxis().SetTitle(opts['xtitle'])
+    hist.GetXaxis().SetLabelSize(0.04)
+    hist.GetYaxis().SetLabelSize(0.04)
+    hist.GetXaxis().SetTitleSize(0.05)
+    hist.GetYaxis().SetTitleSize(0.05)
+    hist.GetXaxis().SetTitleOffset(0.90)
+    hist.SetMinimum(0)
+    hist.SetLineWidth(2)
+    hist.SetMarkerStyle(kFullDotLarge)
+    hist.SetMarkerSize(0.8)
+    hist.SetOption('PEHIST')
+    hist.SetContent(array('d',obj.contents)) # all bins at once, including underflow and overflow
+    hist.SetError(array('d',obj.errors))
+    hist.Write(obj.name,TH1F.kOverwrite)
+  file.Close()
+
+
+def writeUproot(filename, objects):
+  """Write a list of (object, options) into a ROOT file with uproot, which can only write histograms."""
+  import uproot
+  from uproot.writing.identify import to_TH1x, to_TAxis
+  with uproot.recreate(filename) as file:
+    for obj, opts in objects:
+      nbins    = obj.GetNbinsX()
+      variable = not np.allclose(np.diff(obj.edges),(obj.edges[-1]-obj.edges[0])/nbins)
+      xaxis    = to_TAxis("xaxis",opts['xtitle'],nbins,obj.edges[0],obj.edges[-1],
+                          fXbins=obj.edges if variable else np.array([],dtype=np.float64),
+                          fLabelSize=0.04,fTitleSize=0.05,fTitleOffset=0.90)
+      yaxis    = to_TAxis("yaxis",opts['ytitle'],1,0.,1.,fLabelSize=0.04,fTitleSize=0.05)
+      dtype    = np.float64 if opts.get('double') else np.float32 # TH1D or TH1F
+      file[obj.name] = to_TH1x(obj.name,obj.name,obj.contents.astype(dtype),len(obj.contents),0.,0.,0.,0.,
+                               obj.errors**2,xaxis,yaxis,fMinimum=0.,fOption='PEHIST',fLineWidth=2,
+                               fMarkerStyle=20,fMarkerSize=0.8)
+
+
+def writePayloadFile(filename, objects, backend=None, verbose=False):
+  """Write a list of (object, options) into a ROOT file via a temporary file, so readers never see a partial file."""
+  backend = backend or getBackend()
+  outdir  = os.path.dirname(filename)
+  if outdir and not os.path.isdir(outdir):
+    try:
+      os.makedirs(outdir)
+    except OSError: # created by another process
+      pass
+  tmpname = "%s.%d.tmp"%(filename,os.getpid())
+  try:
+    if backend=='uproot':
+      writeUproot(tmpname,objects)
+    else:
+      writeROOT(tmpname,objects)
+    os.rename(tmpname,filename) # atomic replacement for concurrent readers
+  finally:
+    if os.path.exists(tmpname):
+      os.remove(tmpname)
+  if verbose:
+    print(">>> writePayloadFile: Wrote %s to '%s'"%(', '.join(o.name for o, _ in objects),filename))
+  return filename
+
+
+def _writePayloadFile(job):
+  """Unpack the arguments of writePayloadFile for the process pool."""
+  return writePayloadFile(*job)
+
+
+def writePayloads(files, outdir, backend=None, nprocs=1, verbose=False):
+  """Write the built payloads (ordered dictionary of file name to list of objects) into outdir,
+  with one process per file if nprocs>1. Returns the list of written files."""
+  backend = backend or getBackend()
+  if backend=='uproot':
+    for filename, objects in files.items():
+      for obj, _ in objects:
+        if not isinstance(obj,CompiledTH1):
+          raise IOError("Cannot write object '%s' of '%s' with uproot! Please use ROOT."%(obj.name,filename))
+  jobs    = [(os.path.join(outdir,f),objects,backend,verbose) for f, objects in files.items()]
+  if nprocs>1 and len(jobs)>1:
+    with ProcessPoolExecutor(max_workers=nprocs) as executor:
+      return list(executor.map(_writePayloadFile,jobs))
+  return [_writePayloadFile(job) for job in jobs]
+
+
+def comparePayloads(files, outdir):
+  """Compare the built payloads to the existing files in outdir, and return an ordered dictionary of
+  file name to a list of (object name, maximum deviation), where the deviation is None for missing objects.
+  The existing objects are converted to their ROOT-free equivalents, so that both backends can be compared.
+  Histogram contents are compared in single precision, as they are stored in TH1F, unless the option 'double' is set."""
+  result = OrderedDict()
+  for filename, objects in files.items():
+    path = os.path.join(outdir,filename)
+    file = ensurePayloadFile(path) if os.path.isfile(path) else None
+    devs = result.setdefault(filename,[ ])
+    for obj, opts in objects:
+      old = file.Get(obj.name) if file else None
+      old = compileObject(old) if old else None # ROOT-free equivalent for the ROOT backend
+      if isinstance(obj,CompiledTH1) and isinstance(old,CompiledTH1) and len(old.edges)==len(obj.edges):
+        cast      = np.float64 if opts.get('double') else np.float32
+        deviation = max(np.abs(cast(old.contents)-cast(obj.contents)).max(),
+                        np.abs(cast(old.errors)-cast(obj.errors)).max(),
+                        np.abs(old.edges-obj.edges).max())
+      elif isinstance(obj,CompiledGraph) and isinstance(old,CompiledGraph) and old.GetN()==obj.GetN():
+        deviation = max(np.abs(getattr(old,a)-getattr(obj,a)).max() for a in ['x','y','exl','exh','eyl','eyh'])
+      else:
+        deviation = None
+      devs.append((obj.name,deviation))
+    if file:
+      file.Close()
+  return result
@@ -0,0 +1,191 @@
+# Description: Precompiled binary store of the SF payloads (TH1, TGraph, TF1) in data/,
+#              which is memory-mapped so tools can be constructed without opening ROOT files
+# Layout of the store: 8-byte magic, 8-byte index length, JSON index, padding to 8 bytes,
+#                      followed by one flat array of little-endian float64 numbers
+from __future__ import print_function
+import os
+import json
+import struct
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.compiled import CompiledTF1, CompiledTH1, CompiledGraph, compileObject
+  from TauPOG.TauIDSFs.uprootfile import UprootFile
+else:
+  from compiled import CompiledTF1, CompiledTH1, CompiledGraph, compileObject
+  from uprootfile import UprootFile
+cachename = "TauIDSFs_payloads.bin"
+_magic    = b'TAUSFPL1'
+_caches   = { } # path -> PayloadCache, shared within a process
+
+
+def fileStamp(filename):
+  """Return size and modification time of a file to validate cache entries."""
+  stat = os.stat(filename)
+  return { 'size': stat.st_size, 'mtime': int(stat.st_mtime) }
+
+
+def iterObjects(filename, backend='ROOT'):
+  """Yield the name and ROOT-free equivalent (CompiledTF1, CompiledTH1 or CompiledGraph) of every object in a ROOT file,
+  reading it with ROOT or uproot. The object is None for classes that are not supported (e.g. TMultiGraph).
+  Older cycles of the same object are skipped."""
+  if backend=='uproot':
+    file  = UprootFile(filename)
+    names = file.keys()
+  else:
+    from ROOT import TFile
+    file  = TFile.Open(filename,'READ')
+    if not file or file.IsZombie():
+      raise IOError("Could not open file by name '%s'"%(filename))
+    names = [key.GetName() for key in file.GetListOfKeys()]
+  done = set()
+  try:
+    for name in names:
+      if name in done: continue # older cycle
+      done.add(name)
+      try:
+        obj = compileObject(file.Get(name))
+      except IOError: # class not supported by uproot reader
+        obj = None
+      if not isinstance(obj,(CompiledTF1,CompiledTH1,CompiledGraph)):
+        obj = None
+      yield name, obj
+  finally:
+    file.Close()
+
+
+def buildPayloadCache(filenames, output, backend='ROOT', verbose=False):
+  """Convert all TF1, TH1 and TGraph objects in a list of ROOT files into a single binary store,
+  reading them with ROOT or uproot. Objects of other classes (e.g. TMultiGraph) are listed as skipped in the index."""
+  index = { 'version': 1, 'files': { } }
+  data  = [ ]
+  size  = 0
+  def append(*arrays):
+    offset = size
+    for array in arrays:
+      data.append(np.asarray(array,dtype='<f8'))
+    return offset, sum(len(a) for a in arrays)
+  for filename in sorted(filenames):
+    if verbose:
+      print(">>> Converting '%s'..."%(filename))
+    objects = { }
+    skipped = [ ]
+    for name, obj in iterObjects(filename,backend=backend):
+      if isinstance(obj,CompiledTF1):
+        offset, length = append(obj.params)
+        objects[name] = { 'type': 'TF1', 'offset': offset, 'n': len(obj.params),
+                          'formula': obj.formula, 'xmin': obj.xmin, 'xmax': obj.xmax }
+      elif isinstance(obj,CompiledTH1):
+        offset, length = append(obj.edges,obj.contents,obj.errors)
+        objects[name] = { 'type': 'TH1', 'offset': offset, 'n': obj.GetNbinsX() }
+      elif isinstance(obj,CompiledGraph):
+        offset, length = append(obj.x,obj.y,obj.exl,obj.exh,obj.eyl,obj.eyh)
+        objects[name] = { 'type': 'TGraph', 'offset': offset, 'n': obj.GetN() }
+      else:
+        skipped.append(name)
+        continue
+      size += length
+    entry = fileStamp(filename)
+    entry['objects'] = objects
+    entry['skipped'] = skipped
+    index['files'][os.path.basename(filename)] = entry
+  header = json.dumps(index,sort_keys=True,separators=(',',':')).encode('utf-8')
+  header += b' '*(-len(header)%8) # align data to 8 bytes
+  tmpname = output+'.tmp'
+  with open(tmpname,'wb') as out:
+    out.write(_magic)
+    out.write(struct.pack('<Q',len(header)))
+    out.write(header)
+    for array in data:
+      out.write(array.tobytes())
+  os.rename(tmpname,output) # atomic replacement for concurrent readers
+  return output
+
+
+class PayloadCache:
+  """Memory-mapped binary store of SF payloads, indexed by file basename and object name.
+  The pages of the mapped file are shared between all processes on the same node."""
+
+  def __init__(self, filename):
+    self.filename = filename
+    with open(filename,'rb') as file:
+      if file.read(8)!=_magic:
+        raise IOError("File '%s' is not a payload cache!"%(filename))
+      length = struct.unpack('<Q',file.read(8))[0]
+      self.index = json.loads(file.read(length).decode('utf-8'))
+    offset = 16+length
+    if os.path.getsize(filename)>offset:
+      self.data = np.memmap(filename,dtype='<f8',mode='r',offset=offset)
+    else:
+      self.data = np.zeros(0)
+
+  def __repr__(self):
+    return "<%s('%s') with %d files>"%(self.__class__.__name__,self.filename,len(self.index['files']))
+
+  def contains(self, filename):
+    """Check if a ROOT file is in the cache, and still up to date if it exists on disk."""
+    entry = self.index['files'].get(os.path.basename(filename),None)
+    if entry is None:
+      return False
+    if os.path.isfile(filename):
+      stamp = fileStamp(filename)
+      return stamp['size']==entry['size'] and stamp['mtime']==entry['mtime']
+    return True
+
+  def open(self, filename):
+    """Return a TFile-like view of a cached ROOT file."""
+    basename = os.path.basename(filename)
+    if basename not in self.index['files']:
+      raise IOError("File '%s' is not in payload cache '%s'!"%(basename,self.filename))
+    return PayloadFile(self,basename)
+
+  def get(self, filename, objname):
+    """Build the ROOT-free object from views into the memory-mapped data."""
+    entry = self.index['files'][filename]['objects'].get(objname,None)
+    if entry is None:
+      return None
+    data, offset, n = self.data, entry['offset'], entry['n']
+    if entry['type']=='TF1':
+      return CompiledTF1(entry['formula'],data[offset:offset+n],name=objname,xmin=entry['xmin'],xmax=entry['xmax'])
+    elif entry['type']=='TH1':
+      edges    = data[offset:offset+n+1]
+      contents = data[offset+n+1:offset+2*n+3]
+      errors   = data[offset+2*n+3:offset+3*n+5]
+      return CompiledTH1(edges,contents,errors,name=objname)
+    elif entry['type']=='TGraph':
+      x, y, exl, exh, eyl, eyh = (data[offset+i*n:offset+(i+1)*n] for i in range(6))
+      return CompiledGraph(x,y,exl,exh,eyl,eyh,name=objname)
+    raise IOError("Unknown payload type %r for '%s' in '%s'!"%(entry['type'],objname,filename))
+
+
+class PayloadFile:
+  """TFile-like view of one ROOT file in a PayloadCache, supporting Get, GetName, IsZombie and Close."""
+
+  def __init__(self, cache, filename):
+    self.cache    = cache
+    self.filename = filename
+
+  def __repr__(self):
+    return "<%s('%s')>"%(self.__class__.__name__,self.filename)
+
+  def Get(self, name):
+    if name in self.cache.index['files'][self.filename]['skipped']:
+      raise IOError("Object '%s' in '%s' is of a class that is not supported by the payload cache!"%(name,self.filename))
+    return self.cache.get(self.filename,name)
+
+  def GetName(self):
+    return self.filename
+
+  def IsZombie(self):
+    return False
+
+  def Close(self):
+    pass # memory map is shared by all files of the cache
+
+
+def getPayloadCache(path):
+  """Get the payload cache in a given directory, or the one set by the TAUIDSFs_CACHE
+  environment variable. Return None if it does not exist."""
+  filename = os.environ.get('TAUIDSFs_CACHE',os.path.join(path,cachename))
+  if filename not in _caches:
+    _caches[filename] = PayloadCache(filename) if os.path.isfile(filename) else None
+  return _caches[filename]
@@ -0,0 +1,241 @@
+# Description: Define columns of tau SFs and TESs in a ROOT RDataFrame with the C++ TauIDSFTool,
+#              so they are evaluated in compiled code (and in multiple threads) in the same event loop as the selection
+from __future__ import print_function
+import os
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauESTool, campaigns, datapath, highptUncs
+  from TauPOG.TauIDSFs.registry import getTool
+else:
+  from TauIDSFTool import TauESTool, campaigns, datapath, highptUncs
+  from registry import getTool
+basedir    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_declared  = False
+_cpptools  = { } # constructor arguments -> name of C++ tool instance in the interpreter
+_helpers   = r"""
+#include <array>
+#include <cmath>
+#include <ROOT/RVec.hxx>
+namespace TauIDSFs {
+
+  // vectorized getters of the TauIDSFTool for the RVec columns of all taus in an event, with pre-resolved uncertainties
+  template<typename P, typename D, typename G>
+  ROOT::RVecF getSFvsDMandPT(const TauIDSFTool& tool, const P& pt, const D& dm, const G& genmatch, TauIDSFTool::UncHandle unc) {
+    ROOT::RVecF sfs;
+    tool.getSFvsDMandPT(pt,dm,genmatch,sfs,unc);
+    return sfs;
+  }
+
+  template<typename P, typename G>
+  ROOT::RVecF getHighPTSFvsPT(const TauIDSFTool& tool, const P& pt, const G& genmatch, TauIDSFTool::UncHandle unc) {
+    ROOT::RVecF sfs;
+    tool.getHighPTSFvsPT(pt,genmatch,sfs,unc);
+    return sfs;
+  }
+
+  template<typename E, typename G>
+  ROOT::RVecF getSFvsEta(const TauIDSFTool& tool, const E& eta, const G& genmatch, TauIDSFTool::UncHandle unc) {
+    ROOT::RVecF sfs(eta.size());
+    for (std::size_t i=0; i<eta.size(); ++i) // SFs are binned in |eta|, like in the python TauIDSFTool.getSFvsEta
+      sfs[i] = tool.getSFvsEta(std::abs(eta[i]),genmatch[i],unc);
+    return sfs;
+  }
+
+  // DM-dependent TES with the lookup tables (or pT-dependent functions) of the python TauESTool
+  struct TESTool {
+    std::map<int,std::array<double,4>> table; // TES, error at low and high pT, slope of error
+    std::map<int,std::array<TF1*,3>>   funcs; // down, nominal, up
+    double ptlow  = 34.;
+    double pthigh = 170.;
+    bool   jul18  = false;
+    double getTES(double pt, int dm, int genmatch, int shift) const {
+      if (genmatch!=5) return 1.0;
+      auto fit = funcs.find(dm);
+      if (fit!=funcs.end()) return fit->second[shift+1]->Eval(pt);
+      auto tit = table.find(dm);
+      if (tit==table.end()) return 1.0;
+      const auto& row = tit->second;
+      double tes = row[0], err = row[1];
+      if (jul18) {
+        if (pt>=140.) { tes = 1.0; err = row[2]; } // no nominal correction and larger uncertainty for high pT
+      } else if (pt>=pthigh) {
+        err = row[2];
+      } else if (pt>ptlow) { // linearly interpolate between low and high pT
+        err = row[1]+row[3]*(pt-ptlow);
+      }
+      if (shift>0) return tes+err;
+      if (shift<0) return err<tes ? tes-err : 0.0; // prevent negative TES
+      return tes;
+    }
+  };
+
+  template<typename P, typename D, typename G>
+  ROOT::RVecF getTES(const TESTool& tool, const P& pt, const D& dm, const G& genmatch, int shift) {
+    ROOT::RVecF tes(pt.size());
+    for (std::size_t i=0; i<pt.size(); ++i)
+      tes[i] = tool.getTES(pt[i],dm[i],genmatch[i],shift);
+    return tes;
+  }
+
+}
+"""
+
+
+def declareTools(verbose=False):
+  """Make the C++ TauIDSFTool and the helpers for RVec columns known to the ROOT interpreter, once per process.
+  In CMSSW, the compiled library of this package is loaded; otherwise the source is compiled just in time.
+  The C++ tool reads the payloads from $CMSSW_BASE/src/TauPOG/TauIDSFs/data, or else $TAUIDSFs/data."""
+  global _declared
+  if _declared:
+    return
+  import ROOT
+  header = '#include "TauPOG/TauIDSFs/interface/TauIDSFTool.h"'
+  if 'CMSSW_BASE' in os.environ and ROOT.gSystem.Load('libTauPOGTauIDSFs')>=0:
+    if verbose:
+      print(">>> declareTools: Loaded libTauPOGTauIDSFs")
+    if not ROOT.gInterpreter.Declare(header):
+      raise RuntimeError("Could not include the header of TauIDSFTool!")
+  else:
+    source = os.path.join(basedir,"src/TauIDSFTool.cc")
+    if verbose:
+      print(">>> declareTools: Compiling %s..."%(source))
+    with open(source) as file:
+      code = file.read().replace(header,'#include "%s"'%(os.path.join(basedir,"interface/TauIDSFTool.h")))
+    if not ROOT.gInterpreter.Declare(code):
+      raise RuntimeError("Could not compile %s!"%(source))
+  if not ROOT.gInterpreter.Declare(_helpers):
+    raise RuntimeError("Could not compile the RDataFrame helpers of TauIDSFTool!")
+  _declared = True
+
+
+def cppString(value):
+  """Format a python value as a C++ literal."""
+  if isinstance(value,bool):
+    return 'true' if value else 'false'
+  elif isinstance(value,str):
+    return '"%s"'%(value)
+  return repr(float(value))
+
+
+def getCppObject(name):
+  """Get an object declared in the TauIDSFs namespace of the interpreter by its full name."""
+  import ROOT
+  return getattr(ROOT.TauIDSFs,name.split('::')[-1])
+
+
+def getCppTool(year, id, wp='Medium', wp_vsele='VVLoose', dm=False, ptdm=True, emb=False, highpT=False):
+  """Get the name of a C++ TauIDSFTool instance in the interpreter, which is created once per set of arguments.
+  All TF1s are evaluated once here, so they are fully initialized before they are called from several threads."""
+  key = ('TauIDSFTool',year,id,wp,wp_vsele,dm,ptdm,emb,highpT)
+  if key not in _cpptools:
+    if year not in campaigns:
+      raise ValueError("The C++ TauIDSFTool is only available for %s! Got %r."%(', '.join(campaigns),year))
+    declareTools()
+    import ROOT
+    var  = "tool%d"%(len(_cpptools))
+    args = ', '.join(cppString(a) for a in key[1:])
+    if not ROOT.gInterpreter.Declare("namespace TauIDSFs { TauIDSFTool %s(%s); }"%(var,args)):
+      raise RuntimeError("Could not declare the C++ TauIDSFTool(%s)!"%(args))
+    tool = getCppObject(var)
+    if tool.isHighPTVsPT:
+      for unc in ['']+highptUncs:
+        tool.getHighPTSFvsPT(150.,5,unc)
+        tool.getHighPTSFvsPT(250.,5,unc)
+    elif tool.isVsDMandPT:
+      for unc in ['']+list(tool.getUncertainties()):
+        for dm_ in tool.DMs:
+          tool.getSFvsDMandPT(50.,dm_,5,unc)
+    elif tool.isVsPT:
+      for unc in ['','Up','Down']:
+        tool.getSFvsPT(50.,5,unc)
+    _cpptools[key] = "TauIDSFs::"+var
+  return _cpptools[key]
+
+
+def getUncHandle(tool, unc):
+  """Resolve an uncertainty of a C++ tool instance to its integer handle, before the (multithreaded) event loop."""
+  return int(getCppObject(tool).getUncHandle(unc))
+
+
+def getCppTESTool(year, id='DeepTau2017v2p1VSjet', wp='Medium', wp_vsele='VVLoose', path=datapath):
+  """Get the name of a C++ TES tool instance in the interpreter, filled with the lookup tables
+  (or the pT-dependent functions) of the python TauESTool for the same arguments."""
+  key = ('TauESTool',year,id,wp,wp_vsele,path)
+  if key not in _cpptools:
+    declareTools()
+    import ROOT
+    pytool = getTool(TauESTool,year,id,wp,wp_vsele=wp_vsele,path=path)
+    var    = "testool%d"%(len(_cpptools))
+    lines  = [ "tool.ptlow = %s; tool.pthigh = %s; tool.jul18 = %s;"%(
+               cppString(pytool.pt_low),cppString(pytool.pt_high),cppString(pytool.Jul18_scheme)) ]
+    if pytool.funcs_dm is not None:
+      for dm, funcs in sorted(pytool.funcs_dm.items()):
+        for i, func in enumerate(funcs):
+          lines.append('tool.funcs[%d][%d] = new TF1("%s_%d_%d","%s",%s,%s);'%(
+                       dm,i,var,dm,i,func.GetExpFormula(),cppString(func.GetXmin() or 0),cppString(func.GetXmax() or 1)))
+          for ipar in range(func.GetNpar()):
+            lines.append("tool.funcs[%d][%d]->SetParameter(%d,%s);"%(dm,i,ipar,cppString(func.GetParameter(ipar))))
+          lines.append("tool.funcs[%d][%d]->Eval(50.);"%(dm,i)) # initialize before multithreaded use
+    else:
+      for dm, row in sorted(pytool.table.items()):
+        lines.append("tool.table[%d] = {%s};"%(dm,', '.join(cppString(x) for x in row)))
+    code = "namespace TauIDSFs { TESTool %s = [](){\n  TESTool tool;\n  %s\n  return tool;\n}(); }"%(
+           var,'\n  '.join(lines))
+    if not ROOT.gInterpreter.Declare(code):
+      raise RuntimeError("Could not declare the C++ TES tool for %s!"%(', '.join(str(k) for k in key[1:])))
+    _cpptools[key] = "TauIDSFs::"+var
+  return _cpptools[key]
+
+
+def defineTauSFs(df, year, id='DeepTau2018v2p5VSjet', wp='Medium', wp_vsele='VVLoose', highpT=False,
+                 id_vsele=None, wp_antiele='VVLoose', id_vsmu=None, wp_antimu='Tight', tes=False,
+                 unc='All', prefix="Tau_", pt='Tau_pt', eta='Tau_eta', dm='Tau_decayMode', genmatch='Tau_genPartFlav'):
+  """Define RVec columns with the SFs of all taus in an event in a RDataFrame, and return the new RDataFrame node.
+  The columns have the same names as the keys of TauCorrectionTool.getCorrections, with a prefix, e.g.
+    'Tau_sf_vsjet', 'Tau_sf_vsjet_highpt', 'Tau_sf_vsele', 'Tau_sf_vsmu', 'Tau_tes',
+  and if unc=='All', also all variations, e.g. 'Tau_sf_vsjet_syst_alleras_up' or 'Tau_tes_down'.
+  Set an ID to None (or highpT, tes to False) to leave out a correction.
+  Options:
+    id, wp, wp_vsele:     tau ID vs. jet for DM- and pT-dependent SFs (getSFvsDMandPT)
+    highpT:               also get the high-pT SFs (getHighPTSFvsPT) for this ID
+    id_vsele, wp_antiele: anti-electron discriminator for eta-dependent e -> tau fake SFs
+    id_vsmu,  wp_antimu:  anti-muon discriminator for eta-dependent mu -> tau fake SFs
+    tes:                  tau energy scale for this ID (see defineTES)
+    pt, eta, dm, genmatch: input columns
+  """
+  if unc not in [None,'All']:
+    raise ValueError("Uncertainty should be None or 'All', got %r!"%(unc))
+  def define(df, column, expr):
+    return df.Define(prefix+column,expr)
+  if id:
+    tool = getCppTool(year,id,wp,wp_vsele,ptdm=True)
+    uncs = [''] + (list(getCppObject(tool).getUncertainties()) if unc else [ ])
+    for u in uncs:
+      df = define(df,'sf_vsjet_'+u if u else 'sf_vsjet',
+                  'TauIDSFs::getSFvsDMandPT(%s,%s,%s,%s,%d)'%(tool,pt,dm,genmatch,getUncHandle(tool,u)))
+    if highpT:
+      tool = getCppTool(year,id,wp,wp_vsele,ptdm=False,highpT=True)
+      for u in ['']+(highptUncs if unc else [ ]):
+        df = define(df,'sf_vsjet_highpt_'+u if u else 'sf_vsjet_highpt',
+                    'TauIDSFs::getHighPTSFvsPT(%s,%s,%s,%d)'%(tool,pt,genmatch,getUncHandle(tool,u)))
+    if tes:
+      df = defineTES(df,year,id,wp,wp_vsele,unc=unc,prefix=prefix,pt=pt,dm=dm,genmatch=genmatch)
+  for name, id_, wp_ in [('sf_vsele',id_vsele,wp_antiele),('sf_vsmu',id_vsmu,wp_antimu)]:
+    if id_:
+      tool = getCppTool(year,id_,wp_)
+      for u in ['']+(['Up','Down'] if unc else [ ]):
+        df = define(df,"%s_%s"%(name,u.lower()) if u else name,
+                    'TauIDSFs::getSFvsEta(%s,%s,%s,%d)'%(tool,eta,genmatch,getUncHandle(tool,u)))
+  return df
+
+
+def defineTES(df, year, id='DeepTau2017v2p1VSjet', wp='Medium', wp_vsele='VVLoose', unc='All',
+              prefix="Tau_", pt='Tau_pt', dm='Tau_decayMode', genmatch='Tau_genPartFlav', path=datapath):
+  """Define RVec columns with the TES of all taus in an event in a RDataFrame ('Tau_tes', and if unc=='All',
+  'Tau_tes_up' and 'Tau_tes_down'), and return the new RDataFrame node.
+  The TESs are the same as TauESTool.getTES for the same year, ID and WPs."""
+  if unc not in [None,'All']:
+    raise ValueError("Uncertainty should be None or 'All', got %r!"%(unc))
+  tool = getCppTESTool(year,id,wp,wp_vsele,path=path)
+  for name, shift in [('tes',0)]+([('tes_up',1),('tes_down',-1)] if unc else [ ]):
+    df = df.Define(prefix+name,'TauIDSFs::getTES(%s,%s,%s,%s,%d)'%(tool,pt,dm,genmatch,shift))
+  return df
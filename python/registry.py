@@ -0,0 +1,134 @@
+# Description: Process-wide registry of tools, shared between all call sites with the same constructor arguments
+from __future__ import print_function
+import inspect
+import threading
+from collections import OrderedDict
+
+
+class PendingTool:
+    """Placeholder for a tool under construction, for which other threads can wait."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.tool  = None
+        self.error = None
+
+    def done(self, tool):
+        self.tool = tool
+        self.event.set()
+
+    def fail(self, error):
+        self.error = error
+        self.event.set()
+
+    def wait(self):
+        """Wait for the construction, and return the tool, or raise the error of the constructor."""
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.tool
+
+
+class ToolRegistry:
+    """Least-recently-used cache of tool instances, keyed by the tool class and its constructor arguments.
+    The same instance is shared by all call sites, so tools must not be modified after construction,
+    except under the module _lock of TauIDSFTool (e.g. the lazy high-pT plans of TauIDSFTool.getHighPTUncHandle).
+    Tools are constructed outside the registry lock, so loading a slow payload does not block the look up
+    of other tools, while concurrent calls with the same arguments wait for a single construction.
+    Usage:
+      from TauIDSFTool import TauIDSFTool
+      from registry import getTool
+      tool = getTool(TauIDSFTool,'UL2018','DeepTau2018v2p5VSjet','Medium') # constructed once
+      tool = getTool(TauIDSFTool,'UL2018',id='DeepTau2018v2p5VSjet')       # shared instance
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.tools   = OrderedDict() # key -> tool, oldest first
+        self.pending = { } # key -> PendingTool, under construction
+        self.lock    = threading.RLock()
+
+    def __len__(self):
+        return len(self.tools)
+
+    def __contains__(self, key):
+        return key in self.tools
+
+    @staticmethod
+    def key(cls, *args, **kwargs):
+        """Key of a tool class and constructor arguments, where the arguments are normalized
+        with the constructor's signature, so that defaults, positional and keyword arguments
+        of the same value give the same key. Options that do not change the payload are ignored."""
+        callargs = inspect.getcallargs(cls.__init__,None,*args,**kwargs)
+        extra    = callargs.pop('kwargs',{ }) # in case of **kwargs
+        callargs.update(extra)
+        for name in ['self','verbose']:
+            callargs.pop(name,None)
+        return (cls,)+tuple(sorted(callargs.items()))
+
+    def get(self, cls, *args, **kwargs):
+        """Return a shared tool, and construct it if it does not exist yet.
+        Only the first caller constructs the tool, other callers with the same key wait for it."""
+        key = self.key(cls,*args,**kwargs)
+        with self.lock:
+            if key in self.tools:
+                tool = self.tools.pop(key) # move to the end as most recently used
+                self.tools[key] = tool
+                return tool
+            pending = self.pending.get(key)
+            owner   = pending is None
+            if owner:
+                pending = PendingTool()
+                self.pending[key] = pending
+        if not owner:
+            return pending.wait()
+        try:
+            tool = cls(*args,**kwargs) # outside the lock
+        except Exception as error:
+            with self.lock:
+                self.pending.pop(key,None)
+            pending.fail(error)
+            raise
+        with self.lock:
+            self.pending.pop(key,None)
+            self.tools[key] = tool
+            while self.maxsize and len(self.tools)>self.maxsize:
+                self.tools.popitem(last=False) # evict least recently used
+        pending.done(tool)
+        return tool
+
+    def evict(self, cls, *args, **kwargs):
+        """Remove a tool from the registry. Return True if it was found."""
+        key = self.key(cls,*args,**kwargs)
+        with self.lock:
+            return self.tools.pop(key,None) is not None
+
+    def clear(self):
+        """Remove all tools from the registry."""
+        with self.lock:
+            self.tools.clear()
+
+    def resize(self, maxsize):
+        """Change the maximum number of tools, evicting the least recently used ones if needed."""
+        with self.lock:
+            self.maxsize = maxsize
+            while self.maxsize and len(self.tools)>self.maxsize:
+                self.tools.popitem(last=False)
+
+
+registry = ToolRegistry()
+
+
+def getTool(cls, *args, **kwargs):
+    """Return a shared tool from the process-wide registry."""
+    return registry.get(cls,*args,**kwargs)
+
+
+def evictTool(cls, *args, **kwargs):
+    """Remove a tool from the process-wide registry."""
+    return registry.evict(cls,*args,**kwargs)
+
+
+def clearTools():
+    """Remove all tools from the process-wide registry."""
+    registry.clear()
@@ -0,0 +1,198 @@
+# Description: Flat columnar tables of all SF payloads in data/ (histogram bins, graph points and function parameters),
+#              keyed by era, ID, WPs and uncertainty, and their export to Apache Arrow or Parquet
+from __future__ import print_function
+import os, re
+from collections import OrderedDict
+from glob import glob
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import datapath
+  from TauPOG.TauIDSFs.helpers import getBackend
+  from TauPOG.TauIDSFs.manifest import parseFilename, normalizeEra
+  from TauPOG.TauIDSFs.payloadcache import getPayloadCache, iterObjects
+  from TauPOG.TauIDSFs.compiled import CompiledTF1, CompiledTH1, CompiledGraph
+else:
+  from TauIDSFTool import datapath
+  from helpers import getBackend
+  from manifest import parseFilename, normalizeEra
+  from payloadcache import getPayloadCache, iterObjects
+  from compiled import CompiledTF1, CompiledTH1, CompiledGraph
+keys     = ['file','kind','id','era','wp','wp_vsele','tag','variant','object','dm','uncertainty']
+formats  = { 'parquet': '.parquet', 'arrow': '.arrow' }
+_wps     = ['VVVLoose','VVLoose','VLoose','Loose','Medium','Tight','VTight','VVTight']
+_eraexp  = re.compile(r"^20\d\d[A-Z]?$")
+_suberas = ['preVFP','postVFP','preEE','postEE']
+_dmexp   = re.compile(r"^DM(\d+)$")
+_direxp  = re.compile(r"^(\w*?)_?(up|down)$",re.I) # e.g. 'up', 'TESUp' or 'syst_alleras_up'
+_uncexp  = re.compile(r"^(?:uncert\d+|stat\w*|syst\w*|TES\w*)$") # first token of an uncertainty
+
+
+def parseObjectName(name):
+  """Parse the name of a payload object into era, WPs, DM and uncertainty, e.g.
+    'DM0_2018_syst_alleras_up_fit' -> era '2018', DM 0, uncertainty 'syst_alleras_up'
+    'DM1_2022_postEE_TESDown_fit'  -> era '2022_postEE', DM 1, uncertainty 'TES_down'
+    'Medium_up'                    -> WP 'Medium', uncertainty 'up'
+    'DMinclusive_2018_syst_2018'   -> era '2018', uncertainty 'syst_2018'
+  Fields that do not appear in the name are None."""
+  entry  = { 'era': None, 'wp': None, 'wp_vsele': None, 'dm': None, 'uncertainty': None }
+  tokens = [t for t in name.split('_') if t not in ['fit','cent']]
+  rest   = [ ]
+  while tokens:
+    token = tokens.pop(0)
+    wp    = token[2:] if token.startswith('wp') else token[:-5] if token.endswith('VSjet') else token
+    if _dmexp.match(token) and entry['dm'] is None:
+      entry['dm'] = int(_dmexp.match(token).group(1))
+    elif token.isdigit() and entry['dm'] is None and entry['wp'] and not rest: # e.g. 'Tight_10'
+      entry['dm'] = int(token)
+    elif _eraexp.match(token) and entry['era'] is None and not any(_uncexp.match(t) for t in rest):
+      if tokens and tokens[0] in _suberas:
+        token += '_'+tokens.pop(0)
+      entry['era'] = token
+    elif wp in _wps and entry['wp'] is None:
+      entry['wp'] = wp
+    elif token.endswith('VSe') and token[:-3] in _wps:
+      entry['wp_vsele'] = token[:-3]
+    else:
+      rest.append(token)
+  start = next((i for i, t in enumerate(rest) if _uncexp.match(t)),None)
+  for i, token in enumerate(rest): # uncertainty with direction, e.g. 'uncert0_up', or error graph, e.g. 'syst_2018'
+    match = _direxp.match(token)
+    if match:
+      unc = (rest[start:i] if start is not None and start<i else [ ])+([match.group(1)] if match.group(1) else [ ])
+      entry['uncertainty'] = '_'.join(unc+[match.group(2).lower()])
+      break
+  else:
+    if start is not None:
+      entry['uncertainty'] = '_'.join(rest[start:])
+  return entry
+
+
+def getEra(fileera, objera):
+  """Return the era of an object from the eras parsed from the names of the file and the object, in their common spelling
+  (see manifest.normalizeEra). The era of the object is used if it is more specific, e.g. 'DM0_2023C' in a file for '2023'."""
+  fileera, objera = normalizeEra(fileera), normalizeEra(objera)
+  if objera and (not fileera or objera.startswith(fileera)):
+    return objera
+  return fileera or objera
+
+
+def payloadTables(filenames=None, path=datapath, backend=None, verbose=False):
+  """Walk all payload files (by default all ROOT files in the data directory), and collect the contents of
+  all histograms, graphs and functions in three flat tables, returned as ordered dictionaries of columns:
+    'histograms': one row per bin: keys, 'bin', 'low', 'high', 'content', 'error'
+    'graphs':     one row per point: keys, 'point', 'x', 'y', 'exl', 'exh', 'eyl', 'eyh'
+    'functions':  one row per TF1: keys, 'formula', 'xmin', 'xmax', 'params' (list of parameters)
+  The keys are the file name, the fields parsed from the file name by parseFilename (kind, id, era, WPs, tag, variant),
+  and the object name with the era, WPs, DM and uncertainty parsed by parseObjectName (where the file name has none,
+  or for a more specific era, see getEra).
+  Objects are read from the payload cache if it is up to date, else with ROOT or uproot."""
+  filenames = filenames or sorted(glob(os.path.join(path,"*.root")))
+  backend   = backend or getBackend()
+  rows      = { 'histograms': [ ], 'graphs': [ ], 'functions': [ ] } # (key values, object) per object
+  for filename in filenames:
+    fields = parseFilename(filename) or dict((k,None) for k in keys)
+    cache  = getPayloadCache(os.path.dirname(filename))
+    if cache and cache.contains(filename):
+      if verbose:
+        print(">>> payloadTables: Reading '%s' from payload cache..."%(filename))
+      basename = os.path.basename(filename)
+      objects  = ((n,cache.get(basename,n)) for n in cache.index['files'][basename]['objects'])
+    else:
+      if verbose:
+        print(">>> payloadTables: Reading '%s' with %s..."%(filename,backend))
+      objects  = iterObjects(filename,backend=backend)
+    for name, obj in sorted(objects,key=lambda o: o[0]):
+      if obj is None: continue # unsupported class
+      entry = parseObjectName(name)
+      entry['era'] = getEra(fields['era'],entry['era'])
+      for key in ['wp','wp_vsele']:
+        entry[key] = fields[key] or entry[key]
+      values = [os.path.basename(filename),fields['kind'],fields['id'],entry['era'],entry['wp'],entry['wp_vsele'],
+                fields['tag'],fields['variant'],name,entry['dm'],entry['uncertainty']]
+      table  = 'functions' if isinstance(obj,CompiledTF1) else 'histograms' if isinstance(obj,CompiledTH1) else 'graphs'
+      rows[table].append((values,obj))
+  tables = OrderedDict()
+  tables['histograms'] = buildTable(rows['histograms'],lambda h: h.GetNbinsX(),[
+    ('bin',     lambda h: np.arange(1,h.GetNbinsX()+1)),
+    ('low',     lambda h: h.edges[:-1]),
+    ('high',    lambda h: h.edges[1:]),
+    ('content', lambda h: h.contents[1:-1]),
+    ('error',   lambda h: h.errors[1:-1]),
+  ])
+  tables['graphs'] = buildTable(rows['graphs'],lambda g: g.GetN(),[
+    ('point',   lambda g: np.arange(g.GetN())),
+  ]+[(a,(lambda a: lambda g: getattr(g,a))(a)) for a in ['x','y','exl','exh','eyl','eyh']])
+  tables['functions'] = buildTable(rows['functions'],lambda f: 1,[
+    ('formula', lambda f: [f.formula]),
+    ('xmin',    lambda f: np.array([np.nan if f.xmin is None else f.xmin])),
+    ('xmax',    lambda f: np.array([np.nan if f.xmax is None else f.xmax])),
+    ('params',  lambda f: [list(f.params)]),
+  ])
+  return tables
+
+
+def buildTable(rows, nrows, columns):
+  """Build the columns of a table from a list of (key values, object), where each object gives nrows(obj) rows,
+  and the values of the other columns are given by functions of the object."""
+  sizes = np.array([nrows(obj) for _, obj in rows],dtype=np.int64)
+  table = OrderedDict()
+  for i, key in enumerate(keys):
+    values = np.array([v[i] for v, _ in rows],dtype=object)
+    table[key] = np.repeat(values,sizes) # one per row
+  for column, func in columns:
+    arrays = [func(obj) for _, obj in rows]
+    if arrays and isinstance(arrays[0],list): # python objects, e.g. strings
+      values = np.empty(sizes.sum(),dtype=object)
+      for i, value in enumerate(x for a in arrays for x in a):
+        values[i] = value
+      table[column] = values
+    else:
+      table[column] = np.concatenate(arrays) if arrays else np.zeros(0)
+  return table
+
+
+def toArrow(table):
+  """Convert a table (dictionary of columns) to a pyarrow Table. Numeric columns are passed to Arrow without copies;
+  key columns are dictionary-encoded, since they repeat for every row of the same object."""
+  import pyarrow as pa
+  arrays = OrderedDict()
+  for column, values in table.items():
+    if column=='params':
+      arrays[column] = pa.array(list(values),type=pa.list_(pa.float64()))
+    elif column=='dm':
+      arrays[column] = pa.array(list(values),type=pa.int32())
+    elif values.dtype==object: # strings
+      arrays[column] = pa.array(list(values),type=pa.string())
+      if column in keys:
+        arrays[column] = arrays[column].dictionary_encode()
+    else:
+      arrays[column] = pa.array(values)
+  return pa.table(arrays)
+
+
+def writeTables(tables, outdir, format='parquet', compression='zstd', verbose=False):
+  """Write each table to '<outdir>/<name>.parquet' (or '.arrow' for the Arrow IPC file format,
+  which can be memory-mapped by the reader). Requires pyarrow. Returns the list of written files."""
+  if format not in formats:
+    raise ValueError("Unknown format %r! Choose from %s."%(format,', '.join(formats)))
+  try:
+    import pyarrow as pa
+  except ImportError:
+    raise ImportError("Exporting tables to %s requires pyarrow! Install it with 'pip install pyarrow'."%(format))
+  if not os.path.isdir(outdir):
+    os.makedirs(outdir)
+  outfiles = [ ]
+  for name, table in tables.items():
+    outfile = os.path.join(outdir,name+formats[format])
+    atable  = toArrow(table)
+    if format=='parquet':
+      import pyarrow.parquet as pq
+      pq.write_table(atable,outfile,compression=compression)
+    else:
+      with pa.OSFile(outfile,'wb') as sink:
+        with pa.ipc.new_file(sink,atable.schema) as writer:
+          writer.write_table(atable)
+    if verbose:
+      print(">>> writeTables: Wrote %d rows to '%s'"%(atable.num_rows,outfile))
+    outfiles.append(outfile)
+  return outfiles
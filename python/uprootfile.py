@@ -0,0 +1,69 @@
+# Description: Read the SF payloads (TH1, TGraph, TF1) from ROOT files with uproot, without loading ROOT
+from __future__ import print_function
+import os
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.compiled import CompiledTF1, CompiledTH1, CompiledGraph
+else:
+  from compiled import CompiledTF1, CompiledTH1, CompiledGraph
+
+
+class UprootFile:
+  """TFile-like reader based on uproot, supporting Get, GetName, IsZombie and Close.
+  Get returns the ROOT-free equivalents (CompiledTF1, CompiledTH1, CompiledGraph) of the stored objects."""
+
+  def __init__(self, filename):
+    import uproot
+    self.filename = filename
+    self.file     = uproot.open(filename)
+
+  def __repr__(self):
+    return "<%s('%s')>"%(self.__class__.__name__,self.filename)
+
+  def keys(self):
+    """Return the names of all objects in the file."""
+    return self.file.keys(cycle=False)
+
+  def Get(self, name):
+    try:
+      key = self.file.key(name)
+    except KeyError:
+      return None
+    classname = key.classname()
+    if classname=='TF1':
+      return self.readTF1(key,name)
+    obj = key.get()
+    if classname.startswith('TH1'):
+      return CompiledTH1(obj.axis().edges(),obj.values(flow=True),obj.errors(flow=True),name=name)
+    elif classname=='TGraphAsymmErrors':
+      return CompiledGraph(obj.member('fX'),obj.member('fY'),obj.member('fEXlow'),obj.member('fEXhigh'),
+                           obj.member('fEYlow'),obj.member('fEYhigh'),name=name)
+    elif classname=='TGraphErrors':
+      return CompiledGraph(obj.member('fX'),obj.member('fY'),obj.member('fEX'),obj.member('fEX'),
+                           obj.member('fEY'),obj.member('fEY'),name=name)
+    elif classname=='TGraph':
+      return CompiledGraph(obj.member('fX'),obj.member('fY'),name=name)
+    raise IOError("Cannot read object '%s' of class %s from '%s' without ROOT!"%(name,classname,self.filename))
+
+  def readTF1(self, key, name):
+    """Read the formula and parameters of a TF1."""
+    try:
+      func    = key.get()
+      formula = func.member('fFormula')
+      return CompiledTF1(str(formula.member('fFormula')),formula.member('fClingParameters'),name=name,
+                         xmin=func.member('fXmin'),xmax=func.member('fXmax'))
+    except ValueError: # uproot cannot read the empty parameter map of a TFormula without parameters
+      from uproot.deserialization import numbytes_version
+      from uproot.models.TNamed import Model_TNamed
+      chunk, cursor = key.get_uncompressed_chunk_cursor()
+      numbytes_version(chunk,cursor,{ })
+      named = Model_TNamed.read(chunk,cursor,{ },self.file.file,self.file.file,None)
+      return CompiledTF1(str(named.member('fTitle')),name=name) # title is the formula
+
+  def GetName(self):
+    return self.filename
+
+  def IsZombie(self):
+    return False
+
+  def Close(self):
+    self.file.close()
@@ -1,130 +1,261 @@
-import ROOT
+#! /usr/bin/env python
+# Description: Check the compatibility of the high-pT SFs measured in W* -> tau nu with the DM-dependent SFs measured
+#              in Z -> tautau, averaged over DMs with the DM fractions of the W* selection, on a dense pT grid.
+#              The pulls of the W/Z ratios are summarized per WP with a chi2 that accounts for correlated uncertainties,
+#              and all results are stored in a JSON report
+# Usage:
+#   ./scripts/compareZtoWSF.py
+#   ./scripts/compareZtoWSF.py -o compareZtoWSF.json --ptmax 1000
+#   ./scripts/compareZtoWSF.py -t DeepTau2017v2p1VSjet --tag Mar07
+from __future__ import print_function
+import os, sys
+import json
+import math
+from collections import OrderedDict
+from argparse import ArgumentParser
 import numpy as np
-
-pt_vals = [145, 250]
-#pt_vals = [145]
-
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.helpers import ensurePayloadFile
+  from TauPOG.TauIDSFs.compiled import compileObject
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from helpers import ensurePayloadFile
+  from compiled import compileObject
+datapath   = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../data")
+eras       = ['2016_preVFP','2016_postVFP','2017','2018']
 vs_jet_wps = ['Loose','Medium','Tight','VTight']
 vs_ele_wps = ['VVLoose','Tight']
+dms        = [0,1,10,11]
+systs      = [ # name, function of up and down variation, correlated across eras
+  ('syst',          'syst_alleras_up_fit',     'syst_alleras_down_fit',     True ),
+  ('syst_byera',    'syst_alldms_$ERA_up_fit', 'syst_alldms_$ERA_down_fit', False),
+  ('syst_TES',      'TESUp_fit',               'TESDown_fit',               False),
+  ('stat_uncert0',  'fit_uncert0_up',          'fit_uncert0_down',          False),
+  ('stat_uncert1',  'fit_uncert1_up',          'fit_uncert1_down',          False),
+]
+
+
+def getObject(file, name):
+  """Get an object from a payload file as its ROOT-free equivalent (e.g. a CompiledGraph instead of a TGraphAsymmErrors),
+  which can be evaluated on arrays with both the ROOT and uproot backends."""
+  obj = file.Get(name)
+  if not obj:
+    raise IOError("Did not find object '%s'!"%(name))
+  return compileObject(obj)
+
+
+def getFraction(graph, pts):
+  """Evaluate a graph of DM fractions for an array of pT values, which are clamped to the range of the measured points
+  (e.g. [145,250] GeV), so the fractions are held constant instead of extrapolated, and clipped at 0."""
+  return np.maximum(graph(np.clip(pts,graph.x.min(),graph.x.max())),0.)
+
+
+def getZSF(fracfile, sffile, era, pts):
+  """Average the fitted DM-dependent SFs of the Z -> tautau measurement over DMs, weighted by the DM fractions,
+  for an array of pT values. The error is the weighted sum of the errors of each DM, where the up and down shifts
+  of all variations are added in quadrature separately, and averaged. The DM fractions are held constant
+  outside the pT range of their measured points. Also return the symmetrized shift
+  of the average for each variation (nuisance)."""
+  weights = np.array([getFraction(getObject(fracfile,"DMFrac_DM%d_%s"%(dm,era)),pts) for dm in dms])
+  weights = weights/weights.sum(axis=0) # make sure weights sum to 1
+  noms    = np.array([getObject(sffile,"DM%d_%s_fit"%(dm,era))(pts) for dm in dms])
+  errup   = np.zeros_like(noms)
+  errdown = np.zeros_like(noms)
+  shifts  = OrderedDict()
+  for name, up, down, correlated in systs:
+    variations = [ ]
+    for func in [up,down]:
+      func  = func.replace('$ERA',era)
+      diffs = np.array([getObject(sffile,"DM%d_%s_%s"%(dm,era,func))(pts) for dm in dms])-noms
+      errup   += np.where(diffs>0,diffs**2,0.)
+      errdown += np.where(diffs>0,0.,diffs**2)
+      variations.append(diffs)
+    key = name if correlated else "%s_%s"%(name,era)
+    shifts['Z_'+key] = (weights*(variations[0]-variations[1])/2.).sum(axis=0)
+  errors = (errup**.5+errdown**.5)/2.
+  value  = (weights*np.maximum(noms,0.)).sum(axis=0)
+  error  = (weights*errors).sum(axis=0)
+  return value, error, shifts
+
+
+def getWSF(wfile, era, pts):
+  """Get the high-pT SFs of the W* -> tau nu measurement in the pT bins of the histogram (clamped to the first and last bin),
+  with the total error, and the shift of each uncertainty (nuisance): the statistical uncertainty per pT bin,
+  the systematic uncertainty correlated across eras, and the systematic uncertainty of the era."""
+  hist   = getObject(wfile,"DMinclusive_%s_hist"%(era))
+  nbins  = hist.GetNbinsX()
+  ibins  = np.clip(np.searchsorted(hist.edges,pts,side='right')-1,0,nbins-1) # 0-based bin index
+  value  = hist.contents[1:-1][ibins]
+  error  = hist.errors[1:-1][ibins]
+  stat   = getObject(wfile,"DMinclusive_%s"%(era)).eyh[ibins]
+  shifts = OrderedDict()
+  for i in range(nbins):
+    shifts['W_stat_%s_bin%d'%(era,i)] = np.where(ibins==i,stat,0.)
+  shifts['W_syst'] = getObject(wfile,"DMinclusive_%s_syst_alleras"%(era)).eyh[ibins]
+  shifts['W_syst_%s'%(era)] = getObject(wfile,"DMinclusive_%s_syst_%s"%(era,era)).eyh[ibins]
+  return value, error, shifts
+
+
+def getRatio(W, W_e, Z, Z_e):
+  """Return the ratio W/Z, its error, and the pull of the ratio with respect to 1."""
+  r   = W/Z
+  r_e = r*((Z_e/Z)**2+(W_e/W)**2)**.5
+  return r, r_e, (1.-r)/r_e
+
+
+def chi2Prob(chi2, ndof):
+  """Return the probability to find a larger chi2 for ndof degrees of freedom."""
+  x = chi2/2.
+  if ndof%2==0:
+    term = total = math.exp(-x)
+    for i in range(1,ndof//2):
+      term  *= x/i
+      total += term
+    return total
+  total = math.erfc(math.sqrt(x))
+  for i in range(1,(ndof+1)//2):
+    total += math.exp(-x+(i-0.5)*math.log(x)-math.lgamma(i+0.5)) if x>0 else 0.
+  return total
+
+
+def summarizePulls(points, ratios, nuisances):
+  """Summarize the pulls of the W/Z ratios of all measurement points with a chi2 of (ratio-1),
+  using the covariance matrix from the shifts of the ratios by each (symmetrized) nuisance,
+  and the decorrelated pulls, i.e. the pulls after transforming with the Cholesky decomposition of the covariance."""
+  shifts = np.array(list(nuisances.values())).T # points x nuisances
+  cov    = shifts.dot(shifts.T)
+  diffs  = ratios-1.
+  chi2   = float(diffs.dot(np.linalg.solve(cov,diffs)))
+  pulls  = -np.linalg.solve(np.linalg.cholesky(cov),diffs)
+  naive  = -diffs/np.sqrt(np.diag(cov))
+  errors = np.sqrt(np.diag(cov))
+  return OrderedDict([
+    ('points',              points),
+    ('chi2',                chi2),
+    ('ndof',                len(diffs)),
+    ('pvalue',              chi2Prob(chi2,len(diffs))),
+    ('pulls',               list(naive)),
+    ('decorrelated_pulls',  list(pulls)),
+    ('n1sigma',             int((abs(pulls)>1).sum())),
+    ('n2sigma',             int((abs(pulls)>2).sum())),
+    ('correlation',         (cov/np.outer(errors,errors)).tolist()),
+  ])
+
+
+def compareWP(args, wp, wp_vse):
+  """Compare the W and Z SFs of one WP combination on the pT grid and at the W measurement points."""
+  fname    = "TauID_%%s_%s_VSjet%s_VSele%s_%s.root"%(args.tauid,wp,wp_vse,args.tag)
+  fracfile = ensurePayloadFile(os.path.join(args.datapath,fname%('Highpt_DMFracts'))) # DM fractions of W* selection
+  wfile    = ensurePayloadFile(os.path.join(args.datapath,fname%('SF_Highpt')))
+  zfile    = ensurePayloadFile(os.path.join(args.datapath,fname%('SF_dm')))
+  result   = OrderedDict([('wp',wp),('wp_vsele',wp_vse),('eras',OrderedDict())])
+  points   = [ ]
+  ratios   = { 'extrap': [ ], 'noextrap': [ ] }
+  nuisances = { 'extrap': OrderedDict(), 'noextrap': OrderedDict() }
+  for era in eras:
+    ptpoints = getObject(wfile,"DMinclusive_%s"%(era)).x # measurement points
+    pts      = np.concatenate([args.pts,ptpoints])
+    W, W_e, W_shifts = getWSF(wfile,era,pts)
+    Z, Z_e, Z_shifts = getZSF(fracfile,zfile,era,pts)
+    Z_noextrap, Z_e_noextrap, Z_shifts_noextrap = getZSF(fracfile,zfile,era,np.minimum(pts,args.maxpt))
+    r, r_e, pull = getRatio(W,W_e,Z,Z_e)
+    r_noextrap, r_e_noextrap, pull_noextrap = getRatio(W,W_e,Z_noextrap,Z_e_noextrap)
+    columns = OrderedDict([
+      ('W',W),('W_err',W_e),('Z',Z),('Z_err',Z_e),('Z_noextrap',Z_noextrap),('Z_err_noextrap',Z_e_noextrap),
+      ('ratio',r),('ratio_err',r_e),('pull',pull),
+      ('ratio_noextrap',r_noextrap),('ratio_err_noextrap',r_e_noextrap),('pull_noextrap',pull_noextrap),
+    ])
+    npts = len(args.pts)
+    fracpts = np.concatenate([getObject(fracfile,"DMFrac_DM%d_%s"%(dm,era)).x for dm in dms])
+    result['eras'][era] = OrderedDict([('fraction_range',[float(fracpts.min()),float(fracpts.max())]),
+                                       ('grid',OrderedDict((k,list(v[:npts])) for k, v in columns.items())),
+                                       ('points',OrderedDict([('pt',list(ptpoints))]+[(k,list(v[npts:])) for k, v in columns.items()]))])
+    points.extend([era,float(pt)] for pt in ptpoints)
+    for variant, ratio, Zval, Zshifts in [('extrap',r,Z,Z_shifts),('noextrap',r_noextrap,Z_noextrap,Z_shifts_noextrap)]:
+      ratios[variant].extend(ratio[npts:])
+      for name, shift in list(W_shifts.items())+list(Zshifts.items()): # shift of ratio by each nuisance
+        sign = 1. if name.startswith('W_') else -1.
+        rel  = shift[npts:]/(W[npts:] if sign>0 else Zval[npts:])
+        nuisances[variant].setdefault(name,{ })[era] = sign*ratio[npts:]*rel
+  result['summary'] = OrderedDict()
+  for variant in ['extrap','noextrap']:
+    shifts = OrderedDict((n,np.concatenate([s.get(e,np.zeros(len(result['eras'][e]['points']['pt']))) for e in eras]))
+                         for n, s in nuisances[variant].items())
+    result['summary'][variant] = summarizePulls(points,np.array(ratios[variant]),shifts)
+  return result
+
+
+def printResult(result, maxpt):
+  """Print the comparison at the measurement points, and the summary of the pulls of one WP combination."""
+  print("\n-----------------------------------")
+  print("VSjet = %s, VSe = %s"%(result['wp'],result['wp_vsele']))
+  print("-----------------------------------")
+  for era, values in result['eras'].items():
+    points = values['points']
+    for i, pt in enumerate(points['pt']):
+      v   = dict((k,points[k][i]) for k in points)
+      out = ("ERA = %s, pT = %.0f GeV, W*TNu = %.3f +/- %.3f, ZTT (extrap) = %.3f +/- %.3f, ZTT (no extrap above %.0f GeV) %.3f +/- %.3f, "
+             "ratio (extrap) = %.3f +/- %.3f, ratio (no extrap) %.3f +/- %.3f, pull (extrap) = %.2f, pull (no extrap) = %.2f")%(
+             era.ljust(12),pt,v['W'],v['W_err'],v['Z'],v['Z_err'],maxpt,v['Z_noextrap'],v['Z_err_noextrap'],
+             v['ratio'],v['ratio_err'],v['ratio_noextrap'],v['ratio_err_noextrap'],v['pull'],v['pull_noextrap'])
+      if abs(v['pull'])>1 or abs(v['pull_noextrap'])>1:
+        out = "\033[1;31m"+out+"\033[0m"
+      print(out)
+  for variant, summary in result['summary'].items():
+    print("%-8s: chi2/ndof = %.2f/%d (p = %.3f), decorrelated pulls: %d > 1 sigma, %d > 2 sigma"%(
+          variant,summary['chi2'],summary['ndof'],summary['pvalue'],summary['n1sigma'],summary['n2sigma']))
+  print("-----------------------------------\n")
+
+
+def main(args):
+  args.pts = np.arange(args.ptmin,args.ptmax+args.ptstep/2.,args.ptstep)
+  report   = OrderedDict([('tauid',args.tauid),('tag',args.tag),('maxpt_noextrap',args.maxpt),
+                          ('pt',list(args.pts)),('results',[ ])])
+  npoints  = N_1sig = N_2sig = 0
+  for wp in args.wps:
+    for wp_vse in args.wps_vse:
+      result = compareWP(args,wp,wp_vse)
+      report['results'].append(result)
+      printResult(result,args.maxpt)
+      for values in result['eras'].values():
+        pulls   = np.array([values['points']['pull'],values['points']['pull_noextrap']])
+        npoints += pulls.shape[1]
+        N_1sig  += int((abs(pulls)>1).any(axis=0).sum())
+        N_2sig  += int((abs(pulls)>2).any(axis=0).sum())
+  report['summary'] = OrderedDict([('npoints',npoints),('n1sigma',N_1sig),('n2sigma',N_2sig)])
+  print("%d / %d (%.0f%%) 1 sigma pulls"%(N_1sig,npoints,100.*N_1sig/npoints))
+  print("%d / %d (%.0f%%) 2 sigma pulls"%(N_2sig,npoints,100.*N_2sig/npoints))
+  print("Note that these numbers do not account for correlations between measurements, unlike the chi2 per WP")
+  ranges = sorted(set(tuple(v['fraction_range']) for r in report['results'] for v in r['eras'].values()))
+  print("Note that the DM fractions are held constant outside %s GeV"%(', '.join("[%.0f,%.0f]"%r for r in ranges)))
+  if args.output:
+    with open(args.output,'w') as file:
+      json.dump(report,file,indent=1)
+    print(">>> Wrote report to '%s'"%(args.output))
+
 
-syst_key = {
-  'syst_up' : 'syst_alleras_up_fit',
-  'syst_down' : 'syst_alleras_down_fit',
-  'syst_byera_up' : 'syst_alldms_$ERA_up_fit',
-  'syst_byera_down' : 'syst_alldms_$ERA_down_fit',
-  #'syst_byera_bydm_up' : 'syst_dm$DM_$ERA_up_fit',
-  #'syst_byera_bydm_down' : 'syst_dm$DM_$ERA_down_fit',
-  'syst_TES_up': 'TESUp_fit', 
-  'syst_TES_down': 'TESDown_fit', 
-  'stat_uncert0_up': 'fit_uncert0_up',
-  'stat_uncert0_down': 'fit_uncert0_down',
-  'stat_uncert1_up': 'fit_uncert1_up',
-  'stat_uncert1_down': 'fit_uncert1_down',
-}
-
-def GetDMAveragedSF(f1,f2,pt,era):
-  # f1 = graph containing average DM's
-  # f2 = graph containing fitted functions
-  dms=[0,1,10,11]
-  dm_weights=[]
-  values=[]
-  errors=[]
-  for dm in dms:
-    dm_weights.append(f1.Get('DMFrac_DM%(dm)s_%(era)s' % vars()).Eval(pt))
-    nom=f2.Get('DM%(dm)s_%(era)s_fit' % vars()).Eval(pt)
-    values.append(nom) 
-    err_up=0.
-    err_down=0.
-    for syst in syst_key:
-      syst_func = syst_key[syst].replace('$ERA',era).replace('$DM',str(dm))
-      e=f2.Get('DM%(dm)s_%(era)s_%(syst_func)s' % vars()).Eval(pt)-nom
-      if e>0: err_up+=e**2
-      else: err_down+=e**2
-    err_up=err_up**.5
-    err_down=err_down**.5
-    err=(err_up+err_down)/2
-    errors.append(err) 
-
-  dm_weights = [x / sum(dm_weights) for x in dm_weights] # make sure weights sum to 1
-  values = [max(v,0.) for v in values]
-
-  dm_weights = np.array(dm_weights)
-  values = np.array(values)
-  errors = np.array(errors)
- 
-  weighted_values = dm_weights*values
-  weighted_errors = dm_weights*errors
-  #print dm_weights, values, weighted_values
-  ave_val= sum(weighted_values)
-  ave_err= sum(weighted_errors)
-  return ave_val, ave_err
-
-N_2sig=0
-N_1sig=0
-N_tot=0
-
-for wp in vs_jet_wps:
-  for wp_VSe in vs_ele_wps:
-    print '\n-----------------------------------'
-    print 'VSjet = %(wp)s, VSe = %(wp_VSe)s' % vars()   
-    print '-----------------------------------'
-
-    f1 = ROOT.TFile('data/TauID_Highpt_DMFracts_DeepTau2018v2p5VSjet_VSjet%(wp)s_VSele%(wp_VSe)s_Jul18.root' % vars()) # note DM fracts were not updated for DeepTauv2p5, but should be very similar
-    f2 = ROOT.TFile('data/TauID_SF_Highpt_DeepTau2018v2p5VSjet_VSjet%(wp)s_VSele%(wp_VSe)s_Jul18.root' % vars())
-    f3 = ROOT.TFile('data/TauID_SF_dm_DeepTau2018v2p5VSjet_VSjet%(wp)s_VSele%(wp_VSe)s_Jul18.root' % vars())
-
-
-    for y in ['2016_preVFP','2016_postVFP', '2017', '2018']:
-      h1 = f2.Get('DMinclusive_%(y)s_hist' % vars())
-
-      for pt in pt_vals:
-        W_val = h1.GetBinContent(h1.FindBin(pt))
-        W_e = h1.GetBinError(h1.FindBin(pt))
-
-
-        Z_val, Z_e = GetDMAveragedSF(f1,f3,pt,y)
-        max_pt=140.
-        Z_val_noextrap, Z_e_noextrap  = GetDMAveragedSF(f1,f3,max_pt,y)
-        r = W_val/Z_val
-        r_noextrap = W_val/Z_val_noextrap
-
-        r_e = r*((Z_e/Z_val)**2 + (W_e/W_val)**2)**.5
-        r_e_noextrap = r_noextrap*((Z_e_noextrap/Z_val_noextrap)**2 + (W_e/W_val)**2)**.5
-
-        sig=(1.-r)/r_e
-        sig_noextrap=(1.-r_noextrap)/r_e_noextrap
-
-        y_str = y.ljust(12)
-
-        print_out= 'ERA = %(y_str)s, pT = %(pt)s GeV, W*TNu = %(W_val).3f +/- %(W_e).3f, ZTT (extrap) = %(Z_val).3f +/- %(Z_e).3f, ZTT (no extrap above %(max_pt).0f GeV) %(Z_val_noextrap).3f +/- %(Z_e_noextrap).3f,  ratio (extrap) = %(r).3f +/- %(r_e).3f, ratio (no extrap) %(r_noextrap).3f +/- %(r_e_noextrap).3f, pull (extrap) = %(sig).2f, pull (no extrap) = %(sig_noextrap).2f ' % vars()
-        
-       # # uncomment for short version
-       # print_out= 'ERA = %(y_str)s, pT = %(pt)s GeV, W/Z ratio (extrap) = %(r).3f +/- %(r_e).3f, W/Z ratio (no extrap) %(r_noextrap).3f +/- %(r_e_noextrap).3f, pull (extrap) = %(sig)+.2f, pull (no extrap) = %(sig_noextrap)+.2f ' % vars()
-
-        N_tot+=1
-        if abs(sig)>1 or abs(sig_noextrap)>1: 
-          print_out = "\033[1;31m" + print_out + "\033[0m"
-          N_1sig+=1
-        if abs(sig>2) or abs(sig_noextrap)>2: 
-        #  print_out="\033[1;31;47m" + print_out + "\033[0m"  
-          N_2sig+=1
-        print print_out
-
-        # uncomment to compare SF for different DM mix (using DY events)
-        #if (wp=='Medium' and wp_VSe=='VVLoose'):
-        #  f4=ROOT.TFile('data/TauID_Highpt_DMFracts_DY_DeepTau2017v2p1VSjet_VSjetMedium_VSeleVVLoose_Mar07.root')
-        #  Z_val_noextrap_alt, Z_e_noextrap_alt = GetDMAveragedSF(f4,f3,max_pt.,y)
-
-        #  alt_dm_ratio = Z_val_noextrap/Z_val_noextrap_alt
-        #  print '\n Also comparing average scale factors using W DM fractions and DR DM fractions'
-        #  print 'W fracs = %(Z_val_noextrap).3f, Z fracs = %(Z_val_noextrap_alt).3f, ratio = %(alt_dm_ratio).3f \n' % vars()
-    print '-----------------------------------\n'
-
-
-frac_1sig = float(N_1sig)/float(N_tot)*100
-frac_2sig = float(N_2sig)/float(N_tot)*100
-
-print '%(N_1sig)i / %(N_tot)i (%(frac_1sig).0f%%) 1 sigma pulls' % vars()
-print '%(N_2sig)i / %(N_tot)i (%(frac_2sig).0f%%) 2 sigma pulls' % vars()
-
-print 'Note that these numbers do not account for correlations between measurments'
+if __name__ == '__main__':
+  description = """Check the compatibility of the high-pT SFs (W* -> tau nu) with the DM-averaged SFs (Z -> tautau)."""
+  parser = ArgumentParser(prog="compareZtoWSF.py",description=description,epilog="Good luck!")
+  parser.add_argument('-t', '--tauid',    default='DeepTau2018v2p5VSjet',
+                                          help="tagger, default: %(default)s" )
+  parser.add_argument('--tag',            default='Jul18',
+                                          help="tag of the payload files, default: %(default)s" )
+  parser.add_argument('-w', '--wp',       dest='wps', nargs='+', default=vs_jet_wps,
+                                          help="WPs of the VSjet discriminator, default: %(default)s" )
+  parser.add_argument('-e', '--wp-vse',   dest='wps_vse', nargs='+', default=vs_ele_wps,
+                                          help="WPs of the VSe discriminator, default: %(default)s" )
+  parser.add_argument('--ptmin',          type=float, default=100.,
+                                          help="minimum pT of the grid, default: %(default)s" )
+  parser.add_argument('--ptmax',          type=float, default=500.,
+                                          help="maximum pT of the grid, default: %(default)s" )
+  parser.add_argument('--ptstep',         type=float, default=5.,
+                                          help="step of the pT grid, default: %(default)s" )
+  parser.add_argument('--maxpt',          type=float, default=140.,
+                                          help="evaluate the Z SFs at most at this pT for the comparison without extrapolation, default: %(default)s" )
+  parser.add_argument('-d', '--datapath', default=datapath,
+                                          help="data directory, default: %(default)s" )
+  parser.add_argument('-o', '--output',   default="compareZtoWSF.json",
+                                          help="output JSON report, default: %(default)s" )
+  args = parser.parse_args()
+  main(args)
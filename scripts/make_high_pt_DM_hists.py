@@ -1,43 +1,21 @@
-import re
+import os, sys
 import ROOT
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.highptresults import readHighPTResults, iterGroups
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from highptresults import readHighPTResults, iterGroups
 
 #tauid='DeepTau2017v2p1VSjet'
 tauid='DeepTau2018v2p5VSjet'
 
-input_file = 'data/HighPT_fractions_4eras_%s.txt' % tauid
-vs_ele_wp=None
-
 sf_maps = {}
-
-with open(input_file) as file:
-    for line in file:
-        if 'TightVSmu' in line and 'discriminants' in line:
-          vs_ele_wp=line.split()[2]
-          sf_maps[vs_ele_wp] = {}
-        if 'VSjet' in line and not 'TightVSmu' in line and not 'discriminants' in line:
-          vs_jet_wp=line.split()[0]
-          sf_maps[vs_ele_wp][vs_jet_wp] = {}
-
-
-        if vs_ele_wp and ('r_lowpt' in line or 'r_highpt' in line):
-          var=line.split('=')[0].split()[0]
-          vals = [float(x) for x in re.findall(r'\d+\.\d+', line)]
-          vals = [x / sum(vals) for x in vals]
-          print var, vals
-
-          if 'low' in var:  pt = [145.]
-          if 'high' in var: pt = [250.]
-
-          if '17' in var: year = '2017'
-          elif '18' in var: year = '2018'
-          elif '16APV' in var: year = '2016_preVFP'
-          elif '16' in var: year = '2016_postVFP'
-          else: continue
-          # add for 2016 eventually as well
-
-          if year in sf_maps[vs_ele_wp][vs_jet_wp]: sf_maps[vs_ele_wp][vs_jet_wp][year] += [pt+vals]
-
-          else: sf_maps[vs_ele_wp][vs_jet_wp][year] = [pt+vals]
+pts     = {'lowpt': [145.], 'highpt': [250.]} # pT of each bin
+results = readHighPTResults(tauid,'fractions')
+for (vs_ele_wp, vs_jet_wp, year), rows in iterGroups(results,'wp_vsele','wp','era'):
+  sf_maps.setdefault(vs_ele_wp+'VSe',{}).setdefault(vs_jet_wp+'VSjet',{})[year] = [
+    pts[ptbin]+[x/sum(vals) for x in vals] for ptbin, vals in zip(
+      results['ptbin'][rows],zip(*[results[c][rows] for c in ['dm0','dm1','dm10','dm11']]))]
 
 if tauid=='DeepTau2017v2p1VSjet':
   outname = 'data/TauID_Highpt_DMFracts_DeepTau2017v2p1VSjet_VSjetXXX_VSeleYYY_Mar07.root'
@@ -56,7 +34,6 @@ for key1 in sf_maps:
           pt = x[0]
           if dm<10: dm_index = 1+dm
           else: dm_index=dm-10+3
-          print dm_index, x
           dm_val=x[dm_index]
           Npoint = g1.GetN()
           g1.SetPoint(Npoint,pt,dm_val) 
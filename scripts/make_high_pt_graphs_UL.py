@@ -1,144 +1,143 @@
-import re
-import ROOT
-from array import array
-from argparse import ArgumentParser
+#! /usr/bin/env python
+# Description: Create the high-pT SF payloads (TauID_SF_Highpt_*.root) for all WP combinations from the results of
+#              the combined fits in data/HighPT_tauIdSF_4eras_*.txt, writing the files in parallel, and only
+#              rebuilding the files of WP combinations whose results changed
+# Usage:
+#   ./scripts/make_high_pt_graphs_UL.py -t DeepTau2018v2p5VSjet
+#   ./scripts/make_high_pt_graphs_UL.py -j 8 --force
+#   ./scripts/make_high_pt_graphs_UL.py --saveJson
+from __future__ import print_function
+import os, sys
 import json
-
-parser = ArgumentParser()
-parser.add_argument('--saveJson', dest='saveJson', default=False, action='store_true', help="if specified then store the scale factors into jsons")
-args = parser.parse_args()
-
-#tauid='DeepTau2017v2p1VSjet'
-tauid='DeepTau2018v2p5VSjet'
-
-input_file = 'data/HighPT_tauIdSF_4eras_%s.txt' % tauid
-vs_ele_wp=None
-
-sf_maps = {}
-
-with open(input_file) as file:
-    for line in file:
-        if 'TightVSmu' in line and 'discriminants' in line:
-          vs_ele_wp=line.split()[2]
-          sf_maps[vs_ele_wp] = {}
-        if 'VSjet' in line and not 'TightVSmu' in line and not 'discriminants' in line:
-          vs_jet_wp=line.split()[0]
-          sf_maps[vs_ele_wp][vs_jet_wp] = {}
-
-
-        if vs_ele_wp and ('r_lowpt' in line or 'r_highpt' in line):
-          var=line.split('=')[0].split()[0]
-          vals=line.split('=')[1].split('+/-')
-          for i,v in enumerate(vals): 
-            vals[i]= float(re.findall("[+-]?\d+\.\d+",v)[0])
-
-          if 'low' in var:  pt = [145., 25.]
-          if 'high' in var: pt = [250., 50.]
-
-          if '17' in var: year = '2017'
-          elif '18' in var: year = '2018'
-          elif '16APV' in var: year = '2016_preVFP'
-          elif '16' in var: year = '2016_postVFP'
-          else: continue
-          # add for 2016 eventually as well
-
-          if year in sf_maps[vs_ele_wp][vs_jet_wp]: sf_maps[vs_ele_wp][vs_jet_wp][year] += [pt+vals]
-
-          else: sf_maps[vs_ele_wp][vs_jet_wp][year] = [pt+vals]
- 
-
-if tauid == 'DeepTau2018v2p5VSjet': outname = 'data/TauID_SF_Highpt_%s_VSjetXXX_VSeleYYY_Jul18.root' % tauid
-else: outname = 'data/TauID_SF_Highpt_%s_VSjetXXX_VSeleYYY_Mar07.root' % tauid
-h1=ROOT.TH1D('h1','',2,array('d',[100.,200.,300.]))
-
-def ScaleByHighPT(gin):
-  g=gin.Clone()
-  #scale = gin.Eval(145.) #scale to low pT bin
-  func=ROOT.TF1('func','pol0') # scale to pol0 fit of both bins
-  g.Fit(func)
-  scale = func.GetParameter(0) 
-  
-  for i in range(0,g.GetN()):
-    x = ROOT.Double()
-    y = ROOT.Double()
-    g.GetPoint(i, x, y)
-    g.SetPoint(i, x,y/scale)
-  return g
-
-for key1 in sf_maps:
-  for key2 in sf_maps[key1]:
-
-    fout = ROOT.TFile(outname.replace('XXX', key2.replace('VSjet','')).replace('YYY',key1.replace('VSe','')), 'RECREATE')
-
-    for year in ['2016_preVFP','2016_postVFP','2017','2018']:
-      name = 'DMinclusive_'+year
-      g1=ROOT.TGraphAsymmErrors()
-      g2=ROOT.TGraphAsymmErrors()
-      g3=ROOT.TGraphAsymmErrors()
-      g4=ROOT.TGraphAsymmErrors()
-      for x in sf_maps[key1][key2][year]:
-        pt = x[0]
-        pt_e = x[1]
-        sf=x[2]
-        sf_e_syst=x[3]
-        sf_e_syst_byera=x[4]
-        sf_e_stat=x[5]
-        sf_e_stat_and_syst_byera=(sf_e_syst_byera**2+sf_e_stat**2)**.5
-        Npoint = g1.GetN()
-        g1.SetPoint(Npoint,pt,sf) 
-        g2.SetPoint(Npoint,pt,0.) 
-        g3.SetPoint(Npoint,pt,0.) 
-        g4.SetPoint(Npoint,pt,sf) 
-        g1.SetPointError(Npoint,pt_e, pt_e, sf_e_stat, sf_e_stat) 
-        g2.SetPointError(Npoint,pt_e, pt_e, sf_e_syst, sf_e_syst) 
-        g3.SetPointError(Npoint,pt_e, pt_e, sf_e_syst_byera, sf_e_syst_byera) 
-        g4.SetPointError(Npoint,pt_e, pt_e, sf_e_stat_and_syst_byera, sf_e_stat_and_syst_byera) 
-        total_e = (sf_e_stat**2+sf_e_syst_byera**2+sf_e_syst**2)**.5
-        bini = h1.FindBin(pt)
-        h1.SetBinContent(bini,sf)
-        h1.SetBinError(bini,total_e)
-      g1.Write(name)
-      g2.Write(name+'_syst_alleras')
-      g3.Write(name+'_syst_%s' % year)
-      g4.Write(name+'_statandsyst_%s' % year)
-      h1.Write(name+'_hist')
-
-      g5=ScaleByHighPT(g4)
-      g5.Write(name+'_statandsyst_%s_scaled' % year)
-
-
-
-    g = ROOT.TGraphAsymmErrors()
-    for year in ['2016_preVFP','2016_postVFP','2017','2018']:
-      name = 'DMinclusive_'+year+'_statandsyst_'+year+'_scaled'
-      gi=fout.Get(name)
-      x = ROOT.Double()
-      y = ROOT.Double()
-      for i in [0,1]:
-        gi.GetPoint(i, x, y)
-        x_e=gi.GetErrorX(i)
-        y_e=gi.GetErrorY(i)
-        Npoint = g.GetN()
-        g.SetPoint(Npoint, x, y)
-        g.SetPointError(Npoint, x_e, x_e, y_e, y_e)
-        print y, i, Npoint, x_e, y_e, x , y
-    g.Write('comb_eras') 
-
-    fout.Close()
-
-if args.saveJson:
-  json_map = {}
-  for key in sf_maps:
-    for key2 in sf_maps[key]:
-      wp='%s_%sle' %(key2.lower(), key.lower())
-      json_map[wp]={}
-      for year in ['2016_preVFP','2016_postVFP','2017','2018']:
-        low = sf_maps[key][key2][year][0][2]
-        high = sf_maps[key][key2][year][1][2]
-        out='((gen_match_2!=5) + (gen_match_2==5)*(%(low).4f*(pt_2<200.)+%(high).4f*(pt_2>=200.)))' % vars()
-        json_map[wp][year] = out
-
-
-  json_out_name = 'tau_SF_pt_binned_highpT_%(tauid)s.json' % vars()
-  with open(json_out_name, 'w') as fp:
-    json.dump(json_map, fp, sort_keys=True, indent=4)
+from collections import OrderedDict
+from argparse import ArgumentParser
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.highptresults import readHighPTResults, iterGroups
+  from TauPOG.TauIDSFs.payloadbuilder import writePayloads, comparePayloads
+  from TauPOG.TauIDSFs.compiled import CompiledTH1, CompiledGraph
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from highptresults import readHighPTResults, iterGroups
+  from payloadbuilder import writePayloads, comparePayloads
+  from compiled import CompiledTH1, CompiledGraph
+datapath = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../data")
+eras     = ['2016_preVFP','2016_postVFP','2017','2018']
+tags     = { 'DeepTau2017v2p1VSjet': 'Mar07', 'DeepTau2018v2p5VSjet': 'Jul18' } # tag of output files
+ptbins   = { 'lowpt': (145.,25.), 'highpt': (250.,50.) } # pT and error of the points of the graphs
+edges    = [100.,200.,300.] # bins of the histogram
+
+
+def scaleByHighPT(y, ey):
+  """Scale the SFs to the pol0 fit of both pT bins, i.e. their weighted average."""
+  weights = 1./ey**2
+  return y*weights.sum()/(weights*y).sum()
+
+
+def buildObjects(results, rows):
+  """Build all graphs and histograms of one WP combination from the rows of the fit results,
+  and return them as a list of (object, options)."""
+  objects = [ ]
+  scaled  = [ ]
+  for era in eras:
+    irows = rows[results['era'][rows]==era]
+    irows = irows[np.argsort([list(ptbins).index(b) for b in results['ptbin'][irows]])] # low, then high pT
+    x     = np.array([ptbins[b][0] for b in results['ptbin'][irows]])
+    ex    = np.array([ptbins[b][1] for b in results['ptbin'][irows]])
+    y     = results['value'][irows]
+    stat, syst, syst_era = results['stat'][irows], results['sys'][irows], results['sys_era'][irows]
+    statandsyst = (syst_era**2+stat**2)**.5
+    total = (stat**2+syst_era**2+syst**2)**.5
+    name  = 'DMinclusive_'+era
+    ybins = np.zeros(len(edges)+1)
+    ebins = np.zeros(len(edges)+1)
+    ibins = np.searchsorted(edges,x,side='right')
+    ybins[ibins], ebins[ibins] = y, total
+    objects.extend([
+      (CompiledGraph(x,y,ex,ex,stat,stat,name=name),{ }),
+      (CompiledGraph(x,0*y,ex,ex,syst,syst,name=name+'_syst_alleras'),{ }),
+      (CompiledGraph(x,0*y,ex,ex,syst_era,syst_era,name=name+'_syst_%s'%(era)),{ }),
+      (CompiledGraph(x,y,ex,ex,statandsyst,statandsyst,name=name+'_statandsyst_%s'%(era)),{ }),
+      (CompiledTH1(edges,ybins,ebins,name=name+'_hist'),{ 'xtitle': "", 'ytitle': "", 'double': True }),
+    ])
+    scaled.append(CompiledGraph(x,scaleByHighPT(y,statandsyst),ex,ex,statandsyst,statandsyst,
+                                name=name+'_statandsyst_%s_scaled'%(era)))
+    objects.append((scaled[-1],{ }))
+  objects.append((CompiledGraph(*[np.concatenate([getattr(g,a) for g in scaled]) for a in ['x','y','exl','exh','eyl','eyh']],
+                                name='comb_eras'),{ }))
+  return objects
+
+
+def buildFiles(results, tag=None):
+  """Build the objects of all WP combinations, and return an ordered dictionary of file name to list of objects."""
+  files = OrderedDict()
+  for (tauid, wp_vsele, wp), rows in iterGroups(results,'tagger','wp_vsele','wp'):
+    filename = "TauID_SF_Highpt_%s_VSjet%s_VSele%s_%s.root"%(tauid,wp,wp_vsele,tag or tags[tauid])
+    files[filename] = buildObjects(results,rows)
+  return files
+
+
+def outdatedFiles(files, outdir, tolerance=1e-6, verbose=False):
+  """Return the names of the files that are missing in outdir, or whose objects differ from the new results."""
+  outdated = [ ]
+  for filename, deviations in comparePayloads(files,outdir).items():
+    if all(d is not None and d<=tolerance for _, d in deviations):
+      if verbose:
+        print(">>> Up to date: '%s'"%(filename))
+    else:
+      outdated.append(filename)
+  return outdated
+
+
+def saveJson(results, tauid):
+  """Store the pT-binned SFs as strings of selections per WP combination and era."""
+  json_map = { }
+  for (wp_vsele, wp, era), rows in iterGroups(results,'wp_vsele','wp','era'):
+    sfs = dict(zip(results['ptbin'][rows],results['value'][rows]))
+    key = '%svsjet_%svsele'%(wp.lower(),wp_vsele.lower())
+    json_map.setdefault(key,{ })[era] = '((gen_match_2!=5) + (gen_match_2==5)*(%.4f*(pt_2<200.)+%.4f*(pt_2>=200.)))'%(
+                                        sfs['lowpt'],sfs['highpt'])
+  json_out_name = 'tau_SF_pt_binned_highpT_%s.json'%(tauid)
+  with open(json_out_name,'w') as fp:
+    json.dump(json_map,fp,sort_keys=True,indent=4)
+  print(">>> Wrote '%s'"%(json_out_name))
+
+
+def main(args):
+  for tauid in args.tauids:
+    results = readHighPTResults(tauid,'sf',path=args.datapath)
+    files   = buildFiles(results,tag=args.tag)
+    if not args.force: # only rebuild files that are missing or differ from the new results
+      outdated = outdatedFiles(files,args.outdir,args.tolerance,verbose=args.verbose)
+      files    = OrderedDict((f,o) for f, o in files.items() if f in outdated)
+    print(">>> Writing %d files for %s in '%s'..."%(len(files),tauid,args.outdir))
+    for filename in writePayloads(files,args.outdir,nprocs=args.nprocs,verbose=args.verbose):
+      print(">>>   Created '%s'"%(filename))
+    if args.saveJson:
+      saveJson(results,tauid)
+
+
+if __name__ == '__main__':
+  description = """Create the high-pT SF payloads for all WP combinations from the results of the combined fits."""
+  parser = ArgumentParser(prog="make_high_pt_graphs_UL.py",description=description,epilog="Good luck!")
+  parser.add_argument('-t', '--tauid',     dest='tauids', nargs='+', default=['DeepTau2018v2p5VSjet'],
+                                           help="taggers to create files for, default: %(default)s" )
+  parser.add_argument('--tag',             default=None,
+                                           help="tag of the output files, default: %s"%(', '.join("%s for %s"%(v,k) for k, v in tags.items())) )
+  parser.add_argument('-d', '--datapath',  default=datapath,
+                                           help="directory with the fit results, default: %(default)s" )
+  parser.add_argument('-o', '--outdir',    default=datapath,
+                                           help="output directory, default: %(default)s" )
+  parser.add_argument('-j', '--nprocs',    type=int, default=os.cpu_count() or 1,
+                                           help="number of parallel processes, default: %(default)s" )
+  parser.add_argument('-f', '--force',     action='store_true',
+                                           help="rebuild all files, even if they are up to date" )
+  parser.add_argument('--tolerance',       type=float, default=1e-6,
+                                           help="maximum deviation of an up-to-date file, default: %(default)s" )
+  parser.add_argument('--saveJson',        action='store_true',
+                                           help="if specified then store the scale factors into jsons" )
+  parser.add_argument('-v', '--verbose',   action='store_true',
+                                           help="print verbose" )
+  args = parser.parse_args()
+  main(args)
+  print(">>> Done!")
@@ -85,7 +85,9 @@ void TauIDSFTool::disabled() const {
 TauIDSFTool::TauIDSFTool(const std::string& year, const std::string& id, const std::string& wp, const std::string& wp_vsele,  const bool dm, const bool ptdm, const bool embedding, const bool highpT): ID(id), WP(wp), WP_VSELE(wp_vsele){
 
   bool verbose = false;
-  std::string datapath                = Form("%s/src/TauPOG/TauIDSFs/data",getenv("CMSSW_BASE"));
+  const char* cmsswbase               = getenv("CMSSW_BASE");
+  const char* tauidsfs                = getenv("TAUIDSFs"); // outside CMSSW, like the python tools
+  std::string datapath                = cmsswbase ? Form("%s/src/TauPOG/TauIDSFs/data",cmsswbase) : Form("%s/data",tauidsfs ? tauidsfs : ".");
   std::vector<std::string> years      = {"2016Legacy","2017ReReco","2018ReReco","UL2016_preVFP","UL2016_postVFP","UL2017","UL2018"};
   std::vector<std::string> antiJetIDs = {"MVAoldDM2017v2","DeepTau2017v2p1VSjet", "DeepTau2018v2p5VSjet"};
   std::vector<std::string> antiEleIDs = {"antiEleMVA6",   "DeepTau2017v2p1VSe"};
@@ -148,6 +150,12 @@ TauIDSFTool::TauIDSFTool(const std::string& year, const std::string& id, const s
       TFile* file_extrap = ensureTFile(fname_extrap, verbose);
       func["syst_extrap"] = extractTF1(file_extrap,Form("uncert_func_%sVSjet_%sVSe",WP.data(),WP_VSELE.data()));
       file_extrap->Close();
+      extrapFunc = func["syst_extrap"];
+      for (int bin=0; bin<2; bin++) {
+        Double_t x=0., y=0.;
+        graph[""]->GetPoint(bin,x,y);
+        highptSF[bin] = y;
+      }
 
       isHighPTVsPT = true;
 
@@ -215,6 +223,11 @@ TauIDSFTool::TauIDSFTool(const std::string& year, const std::string& id, const s
       funcs_dm1 = extractTF1DMandPT(file,"DM1_"+year_+"_fit", uncerts_dm1);
       funcs_dm10 = extractTF1DMandPT(file,"DM10_"+year_+"_fit", uncerts_dm10);
       funcs_dm11 = extractTF1DMandPT(file,"DM11_"+year_+"_fit", uncerts_dm11);
+      for (const auto* funcs: {&funcs_dm0,&funcs_dm1,&funcs_dm10,&funcs_dm11}) {
+        for (const auto& f: *funcs) {
+          if (f.second) uncs_dm.insert(f.first);
+        }
+      }
       
       isVsDMandPT = true;
 
@@ -293,6 +306,7 @@ TauIDSFTool::TauIDSFTool(const std::string& year, const std::string& id, const s
       std::cerr << "Did not recognize tau ID '" << ID << "'!" << std::endl;
       assert(0);
   }
+  getUncHandle(""); // nominal has handle 0
 }
 
 
@@ -398,22 +412,20 @@ float TauIDSFTool::getSFvsDM(double pt, int dm, const std::string& unc) const{
 
 float TauIDSFTool::getSFvsDMandPT(double pt, int dm, int genmatch, const std::string& unc) const{
   if(!isVsDMandPT) disabled();
+  if(!unc.empty() && uncs_dm.find(unc)==uncs_dm.end())
+    throw std::invalid_argument("Unknown uncertainty '"+unc+"' for the DM- and pT-dependent SFs of tau ID '"+ID+"'!");
   if(std::find(DMs.begin(),DMs.end(),dm)!=DMs.end()){
     if(genmatch==5){
       // get correct functions depending on DM
-      std::map<std::string, const TF1*> funcs = {};
-      if (dm==0) funcs = funcs_dm0;
-      if (dm>0&&dm<=2) funcs = funcs_dm1;
-      if (dm==10) funcs = funcs_dm10;
-      if (dm==11) funcs = funcs_dm11;
-
-
-      float SF;
-      if (unc.empty()) {
-          SF = funcs["nom"]->Eval(std::max(std::min(pt,140.0),20.0));
-      } else {
-          SF = funcs[unc]->Eval(std::max(std::min(pt,140.0),20.0));
-      }
+      const std::map<std::string, const TF1*>* funcs = &funcs_dm0;
+      if (dm>0&&dm<=2) funcs = &funcs_dm1;
+      if (dm==10) funcs = &funcs_dm10;
+      if (dm==11) funcs = &funcs_dm11;
+
+      // variations that only exist for other DMs (e.g. syst_dm0_2018_up) give the nominal SF
+      auto it = funcs->find(unc.empty() ? "nom" : unc);
+      const TF1* func = (it!=funcs->end() && it->second) ? it->second : funcs->at("nom");
+      float SF = func->Eval(std::max(std::min(pt,140.0),20.0));
       return SF;
     }
     return 1.0;
@@ -427,6 +439,15 @@ float TauIDSFTool::getSFvsDMandPT(double pt, int dm, const std::string& unc) con
   return getSFvsDMandPT(pt,dm,5,unc);
 }
 
+std::vector<std::string> TauIDSFTool::getUncertainties() const{
+  // names of the variations of the DM- and pT-dependent SFs that are available for at least one DM
+  std::vector<std::string> uncs;
+  for (const auto& unc: uncs_dm) {
+    if (unc!="nom") uncs.push_back(unc);
+  }
+  return uncs;
+}
+
 float TauIDSFTool::getSFvsEta(double eta, int genmatch, const std::string& unc) const{
   if(!isVsEta) disabled();
   if(std::find(genmatches.begin(),genmatches.end(),genmatch)!=genmatches.end()){
@@ -440,3 +461,128 @@ float TauIDSFTool::getSFvsEta(double eta, int genmatch, const std::string& unc)
   }
   return 1.0;
 }
+
+
+
+int TauIDSFTool::dmIndex(int dm) const{
+  // index of the functions of a DM in Variation::funcs, or -1 for DMs without SFs
+  switch(dm){
+    case 0:  return 0;
+    case 1:  return 1;
+    case 10: return 2;
+    case 11: return DMs.size()>3 ? 3 : -1;
+    default: return -1;
+  }
+}
+
+TauIDSFTool::UncHandle TauIDSFTool::getUncHandle(const std::string& unc){
+  auto it = handles.find(unc);
+  if(it!=handles.end()) return it->second;
+  Variation var;
+  bool known = unc.empty();
+  if(isVsPT){
+    auto fit = func.find(unc);
+    known = (fit!=func.end() && fit->second);
+    var.funcs[0] = known ? fit->second : nullptr;
+  }else if(isVsDMandPT){
+    // variations that only exist for other DMs (e.g. syst_dm0_2018_up) give the nominal SF
+    const std::array<const std::map<std::string, const TF1*>*,4> funcs = {{&funcs_dm0,&funcs_dm1,&funcs_dm10,&funcs_dm11}};
+    known = unc.empty() || uncs_dm.find(unc)!=uncs_dm.end();
+    for(std::size_t i=0; i<funcs.size() && known; i++){
+      auto fit = funcs[i]->find(unc.empty() ? "nom" : unc);
+      if(fit!=funcs[i]->end() && fit->second){
+        var.funcs[i] = fit->second;
+      }else{
+        auto nom = funcs[i]->find("nom");
+        var.funcs[i] = (nom!=funcs[i]->end()) ? nom->second : nullptr;
+      }
+    }
+  }else if(isHighPTVsPT){
+    // same substring rules as getHighPTSFvsPT(pt,genmatch,unc)
+    auto has = [&unc](const char* s){ return unc.find(s)!=std::string::npos; };
+    int sign = (has("up") ? 1 : 0) - (has("down") ? 1 : 0);
+    for(int bin=0; bin<2; bin++){
+      if((bin==0 && has("stat_bin1")) || (bin==1 && has("stat_bin2")) || (has("stat") && !has("bin")))
+        var.statShift[bin] = sign*sqrt(pow(graph[""]->GetErrorY(bin),2) + pow(graph["syst_oneera"]->GetErrorY(bin),2));
+      if(has("syst"))
+        var.systShift[bin] = sign*graph["syst_alleras"]->GetErrorY(bin);
+    }
+    var.extrapUp   = has("extrap") && has("up");
+    var.extrapDown = has("extrap") && has("down");
+    known = known || has("stat") || has("syst") || has("extrap");
+  }else{ // vs. DM or eta
+    var.sign = (unc=="Up") ? 1 : (unc=="Down") ? -1 : 0;
+    known = known || var.sign!=0;
+  }
+  if(!known)
+    throw std::invalid_argument("Unknown uncertainty '"+unc+"' for tau ID '"+ID+"'!");
+  UncHandle handle = variations.size();
+  variations.push_back(var);
+  handles[unc] = handle;
+  return handle;
+}
+
+float TauIDSFTool::getSFvsPT(double pt, int genmatch, UncHandle unc) const{
+  if(!isVsPT) disabled();
+  if(genmatch==5){
+    float SF = static_cast<float>(variations[unc].funcs[0]->Eval(pt));
+    return SF;
+  }
+  return 1.0;
+}
+
+float TauIDSFTool::getHighPTSFvsPT(double pt, int genmatch, UncHandle unc) const{
+  if(!isHighPTVsPT) disabled();
+  if(genmatch==5){
+    const Variation& var = variations[unc];
+    int bin = (pt>=200) ? 1 : 0;
+    float SF = highptSF[bin];
+    SF += var.statShift[bin];
+    SF += var.systShift[bin];
+    if(var.extrapUp) SF *= extrapFunc->Eval(pt);
+    if(var.extrapDown) SF *= (2. - extrapFunc->Eval(pt));
+    return SF;
+  }
+  return 1.0;
+}
+
+float TauIDSFTool::getSFvsDM(double pt, int dm, int genmatch, UncHandle unc) const{
+  if(!isVsDM) disabled();
+  if(std::find(DMs.begin(),DMs.end(),dm)!=DMs.end() or pt<=40){
+    if(genmatch==5){
+      Int_t bin = hist->GetXaxis()->FindBin(dm);
+      float SF  = static_cast<float>(hist->GetBinContent(bin));
+      if(variations[unc].sign>0)
+        SF += hist->GetBinError(bin);
+      else if(variations[unc].sign<0)
+        SF -= hist->GetBinError(bin);
+      return SF;
+    }
+    return 1.0;
+  }
+  return 0.0;
+}
+
+float TauIDSFTool::getSFvsEta(double eta, int genmatch, UncHandle unc) const{
+  if(!isVsEta) disabled();
+  if(std::find(genmatches.begin(),genmatches.end(),genmatch)!=genmatches.end()){
+    Int_t bin = hist->GetXaxis()->FindBin(eta);
+    float SF  = static_cast<float>(hist->GetBinContent(bin));
+    if(variations[unc].sign>0)
+      SF += hist->GetBinError(bin);
+    else if(variations[unc].sign<0)
+      SF -= hist->GetBinError(bin);
+    return SF;
+  }
+  return 1.0;
+}
+
+float TauIDSFTool::getSFvsDMandPT(double pt, int dm, int genmatch, UncHandle unc) const{
+  if(!isVsDMandPT) disabled();
+  int idm = dmIndex(dm);
+  if(idm>=0 && genmatch==5){
+    float SF = variations[unc].funcs[idm]->Eval(std::max(std::min(pt,140.0),20.0));
+    return SF;
+  }
+  return 1.0;
+}
@@ -0,0 +1,204 @@
+#! /usr/bin/env python
+# Description: Benchmark the construction and getters of the tau SF tools, and write the results to JSON
+# Usage:
+#   ./test/benchmarkTauIDSFTool.py -o bench.json
+#   ./test/benchmarkTauIDSFTool.py -o bench_new.json -c bench.json # compare to previous results
+from __future__ import print_function
+import os, sys
+import time; start0 = time.time()
+import json
+import platform
+import tracemalloc
+from argparse import ArgumentParser
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool
+  from TauPOG.TauIDSFs.corrections import highptUncs
+  from TauPOG.TauIDSFs.helpers import getBackend
+  from TauPOG.TauIDSFs.parallel import evaluateThreaded
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool
+  from corrections import highptUncs
+  from helpers import getBackend
+  from parallel import evaluateThreaded
+start1 = time.time()
+try:
+  import resource
+except ImportError: # not available on Windows
+  resource = None
+
+def green(string,**kwargs): return "\x1b[0;32;40m%s\033[0m"%string
+
+
+def getModes(year):
+  """Tool configurations: (mode, class, args, kwargs, getters), where each getter is
+  (name, inputs, uncertainties for scalar calls, uncertainties for batch calls)."""
+  ptdmtool = TauIDSFTool(year,'DeepTau2018v2p5VSjet','Medium')
+  ptdmuncs = sorted(set(u for f in ptdmtool.funcs_dm.values() for u in f if u!='nom'))
+  updown   = [None,'Up','Down','All']
+  return [
+    ('pt',       TauIDSFTool, (year,'DeepTau2017v2p1VSjet','Medium'), dict(ptdm=False),
+                 [('getSFvsPT',('pt','genmatch'),updown,updown)]),
+    ('dm',       TauIDSFTool, (year,'DeepTau2017v2p1VSjet','Medium'), dict(ptdm=False,dm=True),
+                 [('getSFvsDM',('pt','dm','genmatch'),updown,updown)]),
+    ('ptdm',     TauIDSFTool, (year,'DeepTau2018v2p5VSjet','Medium'), dict(),
+                 [('getSFvsDMandPT',('pt','dm','genmatch'),[None]+ptdmuncs,[None]+ptdmuncs+['All'])]),
+    ('highpT',   TauIDSFTool, (year,'DeepTau2018v2p5VSjet','Medium'), dict(ptdm=False,highpT=True),
+                 [('getHighPTSFvsPT',('pt','genmatch'),[None]+highptUncs,[None]+highptUncs)]),
+    ('eta_vse',  TauIDSFTool, (year,'DeepTau2017v2p1VSe','VVLoose'), dict(),
+                 [('getSFvsEta',('eta','genmatch_ele'),updown,updown)]),
+    ('eta_vsmu', TauIDSFTool, (year,'DeepTau2017v2p1VSmu','Tight'), dict(),
+                 [('getSFvsEta',('eta','genmatch_mu'),updown,updown)]),
+    ('tes',      TauESTool,   (year,'DeepTau2017v2p1VSjet'), dict(),
+                 [('getTES',('pt','dm','genmatch'),updown,updown),
+                  ('getTES_highpt',('dm','genmatch'),updown,updown)]),
+    ('tes_v2p5', TauESTool,   (year,'DeepTau2018v2p5VSjet','Medium'), dict(),
+                 [('getTES',('pt','dm','genmatch'),updown,updown)]),
+    ('fes',      TauFESTool,  (year,), dict(),
+                 [('getFES',('eta','dm','genmatch_ele'),updown,updown)]),
+    ('fakerate', JetToTauFakeRateTool, (year,'DeepTau2018v2p5VSjet','Medium'), dict(),
+                 [('getFakeRate',('pt','eta','genmatch_jet'),updown,updown)]),
+  ]
+
+
+def getInputs(nevts, seed=123):
+  """Random tau properties."""
+  rng = np.random.RandomState(seed)
+  return {
+    'pt':           rng.uniform(20,300,nevts),
+    'eta':          rng.uniform(-2.3,2.3,nevts),
+    'dm':           rng.choice([0,1,10,11],nevts),
+    'genmatch':     np.full(nevts,5),
+    'genmatch_ele': rng.choice([1,3],nevts),
+    'genmatch_mu':  rng.choice([2,4],nevts),
+    'genmatch_jet': rng.choice([0,6],nevts),
+  }
+
+
+def timeit(func, repeat, number=1):
+  """Return the minimum time of one call in seconds over several repeats."""
+  times = [ ]
+  for _ in range(repeat):
+    start = time.perf_counter()
+    for _ in range(number):
+      func()
+    times.append((time.perf_counter()-start)/number)
+  return min(times)
+
+
+def peakMemory(func):
+  """Return the peak memory in bytes allocated in one call."""
+  tracemalloc.start()
+  func()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+def benchmark(args):
+  results = {
+    'meta': {
+      'python':   platform.python_version(),
+      'numpy':    np.__version__,
+      'platform': platform.platform(),
+      'date':     time.strftime("%Y-%m-%d %H:%M:%S"),
+      'backend':  getBackend(),
+      'cache':    os.environ.get('TAUIDSFs_CACHE',""),
+      'ncalls':   args.ncalls,
+      'nbatch':   args.nbatch,
+      'nthreads': args.nthreads,
+      'import':   start1-start0,
+    },
+    'construction': [ ], 'scalar': [ ], 'batch': [ ],
+  }
+  scalars = getInputs(args.ncalls)
+  batches = getInputs(args.nbatch)
+  for year in args.years:
+    for mode, cls, targs, kwargs, getters in getModes(year):
+      if args.modes and mode not in args.modes: continue
+      print(">>> %s: %s%s"%(green(mode),cls.__name__,targs))
+
+      # CONSTRUCTION
+      tconst = timeit(lambda: cls(*targs,**kwargs),args.repeat)
+      mconst = peakMemory(lambda: cls(*targs,**kwargs))
+      results['construction'].append({ 'year': year, 'mode': mode, 'time': tconst, 'peakmem': mconst })
+      print(">>>   construction: %8.3f ms, peak memory %8.1f kB"%(1e3*tconst,mconst/1024.))
+      tool = cls(*targs,**kwargs)
+
+      for getter, inputs, scalaruncs, batchuncs in getters:
+
+        # PER CALL
+        method = getattr(tool,getter)
+        values = list(zip(*[scalars[i].tolist() for i in inputs]))
+        for unc in scalaruncs:
+          def loop():
+            for value in values:
+              method(*value,unc=unc)
+          tcall = timeit(loop,args.repeat)/len(values)
+          results['scalar'].append({ 'year': year, 'mode': mode, 'getter': getter, 'unc': unc,
+                                     'time': tcall, 'rate': 1./tcall })
+          print(">>>   %-16s %-18s %8.3f us/call"%(getter,unc,1e6*tcall))
+
+        # PER BATCH
+        method = getattr(tool,getter+'Batch')
+        values = [batches[i] for i in inputs]
+        if args.nthreads>1: # evaluate chunks in parallel threads
+          method = (lambda m: lambda *a, **k: evaluateThreaded(m,*a,nthreads=args.nthreads,**k))(method)
+        for unc in batchuncs:
+          tbatch = timeit(lambda: method(*values,unc=unc),args.repeat)
+          mbatch = peakMemory(lambda: method(*values,unc=unc))
+          results['batch'].append({ 'year': year, 'mode': mode, 'getter': getter+'Batch', 'unc': unc,
+                                    'time': tbatch, 'rate': args.nbatch/tbatch, 'peakmem': mbatch })
+          print(">>>   %-16s %-18s %8.3f ms/batch, %6.1f M taus/s, peak memory %8.1f MB"%(
+                getter+'Batch',unc,1e3*tbatch,1e-6*args.nbatch/tbatch,mbatch/1024.**2))
+
+  if resource: # maximum resident set size of the process in kB on Linux
+    results['meta']['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return results
+
+
+def compare(results, oldresults, threshold=1.2):
+  """Print the ratio of new to old times for the same benchmarks."""
+  print(">>> Comparing to previous results (new/old time, >1 is slower)...")
+  for section in ['construction','scalar','batch']:
+    old = { tuple(r.get(k) for k in ['year','mode','getter','unc']): r['time'] for r in oldresults.get(section,[ ]) }
+    for result in results[section]:
+      key = tuple(result.get(k) for k in ['year','mode','getter','unc'])
+      if key in old:
+        ratio = result['time']/old[key]
+        print(">>>   %-12s %s: %5.2f%s"%(section,' '.join(str(k) for k in key if k!=None),ratio,
+              " \033[1m\033[93m<-- slower!\033[0m" if ratio>threshold else ""))
+
+
+if __name__ == '__main__':
+  description = """Benchmark the construction and (vectorized) getters of the tau SF tools."""
+  parser = ArgumentParser(prog="benchmarkTauIDSFTool.py",description=description,epilog="Good luck!")
+  parser.add_argument('-y', '--years',     nargs='+', default=['UL2018'],
+                                           help="years to benchmark, default: %(default)s" )
+  parser.add_argument('-m', '--modes',     nargs='+', default=None,
+                                           help="modes to benchmark (pt, dm, ptdm, highpT, eta_vse, eta_vsmu, tes, tes_v2p5, fes, fakerate), default: all" )
+  parser.add_argument('-n', '--ncalls',    type=int, default=2000,
+                                           help="number of taus for per-call timing, default: %(default)s" )
+  parser.add_argument('-N', '--nbatch',    type=int, default=1000000,
+                                           help="number of taus per batch, default: %(default)s" )
+  parser.add_argument('-r', '--repeat',    type=int, default=3,
+                                           help="number of repetitions (minimum time is taken), default: %(default)s" )
+  parser.add_argument('-j', '--nthreads',  type=int, default=1,
+                                           help="number of threads for the batches, default: %(default)s" )
+  parser.add_argument('-o', '--output',    default=None,
+                                           help="output JSON file" )
+  parser.add_argument('-c', '--compare',   default=None,
+                                           help="JSON file with previous results to compare to" )
+  parser.add_argument('-t', '--threshold', type=float, default=1.2,
+                                           help="flag benchmarks that are slower by this factor, default: %(default)s" )
+  args = parser.parse_args()
+  results = benchmark(args)
+  if args.output:
+    with open(args.output,'w') as outfile:
+      json.dump(results,outfile,indent=1)
+    print(">>> Wrote results to %s"%(args.output))
+  if args.compare:
+    with open(args.compare) as infile:
+      compare(results,json.load(infile),threshold=args.threshold)
+  print(">>> Done!")
@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# Description: Check that the high-pT SF payloads built from the fit results (scripts/make_high_pt_graphs_UL.py)
+#              are up to date in data/, and, with the ROOT backend, that a second run after writing them rebuilds no files
+# Usage:
+#   ./test/testHighPTPayloads.py
+#   ./test/testHighPTPayloads.py -t DeepTau2017v2p1VSjet DeepTau2018v2p5VSjet
+from __future__ import print_function
+import os, sys
+import shutil, tempfile
+from argparse import ArgumentParser
+basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+sys.path.insert(0,os.path.join(basedir,"scripts"))
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.helpers import getBackend
+  from TauPOG.TauIDSFs.highptresults import readHighPTResults
+  from TauPOG.TauIDSFs.payloadbuilder import writePayloads
+else:
+  sys.path.insert(0,os.path.join(basedir,"python"))
+  from helpers import getBackend
+  from highptresults import readHighPTResults
+  from payloadbuilder import writePayloads
+from make_high_pt_graphs_UL import datapath, buildFiles, outdatedFiles
+
+def green(string,**kwargs): return "\x1b[0;32;40m%s\033[0m"%string
+def red(string,**kwargs):   return "\x1b[1;31m%s\033[0m"%string
+
+
+def checkRebuild(files, outdir, label):
+  """Check that none of the built files would be rebuilt in outdir."""
+  outdated = outdatedFiles(files,outdir)
+  print(">>>   %-28s %s"%(label,red("%d / %d files would be rebuilt: %s"%(len(outdated),len(files),', '.join(outdated)))
+                                   if outdated else green("0 / %d files would be rebuilt"%(len(files)))))
+  return len(outdated)
+
+
+def main(args):
+  nbad = 0
+  for tauid in args.tauids:
+    print(">>> Checking %s..."%(tauid))
+    files = buildFiles(readHighPTResults(tauid,'sf',path=datapath))
+    nbad += checkRebuild(files,datapath,"data/:")
+    if getBackend()=='ROOT': # graphs can only be written with ROOT
+      outdir = tempfile.mkdtemp(prefix="testHighPTPayloads_")
+      try:
+        writePayloads(files,outdir,nprocs=args.nprocs)
+        nbad += checkRebuild(files,outdir,"second run:")
+      finally:
+        shutil.rmtree(outdir)
+    else:
+      print(">>>   Skipping the second run, which needs the ROOT backend to write the graphs")
+  print(">>> %s"%(red("%d files would be rebuilt"%(nbad)) if nbad else green("All files are up to date")))
+  return nbad
+
+
+if __name__ == '__main__':
+  description = """Check that the high-pT SF payloads are not rebuilt if the fit results did not change."""
+  parser = ArgumentParser(prog="testHighPTPayloads.py",description=description,epilog="Good luck!")
+  parser.add_argument('-t', '--tauid', dest='tauids', nargs='+', default=['DeepTau2017v2p1VSjet','DeepTau2018v2p5VSjet'],
+                                       help="taggers to check, default: %(default)s" )
+  parser.add_argument('-j', '--nprocs', type=int, default=1,
+                                       help="number of parallel processes to write the files, default: %(default)s" )
+  args = parser.parse_args()
+  sys.exit(1 if main(args) else 0)
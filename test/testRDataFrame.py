@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# Description: Compare the SF columns defined in a RDataFrame with the C++ TauIDSFTool (python/rdataframe.py)
+#              to the vectorized getters of the python tools, including taus with negative eta
+# Usage:
+#   ./test/testRDataFrame.py
+#   ./test/testRDataFrame.py -y UL2017 UL2018
+from __future__ import print_function
+import os, sys
+from argparse import ArgumentParser
+import numpy as np
+import ROOT
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauIDSFTool
+  from TauPOG.TauIDSFs.rdataframe import defineTauSFs
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from TauIDSFTool import TauIDSFTool
+  from rdataframe import defineTauSFs
+etas      = [-2.4,-2.2,-1.6,-1.5,-1.0,-0.2,0.0,0.2,1.0,1.5,1.6,2.2,2.4]
+pts       = [20.,25.,30.,45.,70.,100.,139.,150.]
+dms       = [0,1,10,11]
+genmatches = [1,2,3,4,5,6]
+
+def green(string,**kwargs): return "\x1b[0;32;40m%s\033[0m"%string
+def red(string,**kwargs):   return "\x1b[1;31m%s\033[0m"%string
+
+
+def getTaus():
+  """Return arrays of the pT, eta, DM and genmatch of all combinations of test values, one event per pT value."""
+  grid = np.array(np.meshgrid(etas,dms,genmatches,indexing='ij')).reshape(3,-1)
+  return [(pt,grid[0],grid[1].astype(np.int32),grid[2].astype(np.int32)) for pt in pts]
+
+
+def rvecString(values, type):
+  return "ROOT::RVec<%s>{%s}"%(type,','.join(repr(v) for v in values))
+
+
+def checkRDataFrame(year, id, wp, wp_vsele, id_vsele, wp_antiele, id_vsmu, wp_antimu, tolerance=1e-5):
+  """Define the SF columns for one tau per combination of test values, and compare to the python tools.
+  Return the number of SF columns that differ."""
+  taus   = getTaus()
+  df     = ROOT.RDataFrame(len(taus))
+  for column, index, type in [('Tau_pt',0,'float'),('Tau_eta',1,'float'),('Tau_decayMode',2,'int'),('Tau_genPartFlav',3,'int')]:
+    values = [ (np.full(len(t[1]),t[0]) if index==0 else t[index]) for t in taus ]
+    expr   = "std::vector<ROOT::RVec<%s>>{%s}[rdfentry_]"%(type,','.join(rvecString(v,type) for v in values))
+    df     = df.Define(column,expr)
+  df = defineTauSFs(df,year,id,wp=wp,wp_vsele=wp_vsele,id_vsele=id_vsele,wp_antiele=wp_antiele,
+                    id_vsmu=id_vsmu,wp_antimu=wp_antimu,unc='All')
+  tool_vsjet = TauIDSFTool(year,id,wp,wp_vsele=wp_vsele)
+  tool_vsele = TauIDSFTool(year,id_vsele,wp_antiele)
+  tool_vsmu  = TauIDSFTool(year,id_vsmu,wp_antimu)
+  pytools = [ # column, python tool, uncertainty, vectorized getter
+    ('Tau_sf_vsjet',      tool_vsjet, None,   'getSFvsDMandPTBatch'),
+    ('Tau_sf_vsele',      tool_vsele, None,   'getSFvsEtaBatch'),
+    ('Tau_sf_vsele_up',   tool_vsele, 'Up',   'getSFvsEtaBatch'),
+    ('Tau_sf_vsele_down', tool_vsele, 'Down', 'getSFvsEtaBatch'),
+    ('Tau_sf_vsmu',       tool_vsmu,  None,   'getSFvsEtaBatch'),
+    ('Tau_sf_vsmu_up',    tool_vsmu,  'Up',   'getSFvsEtaBatch'),
+    ('Tau_sf_vsmu_down',  tool_vsmu,  'Down', 'getSFvsEtaBatch'),
+  ]
+  results  = dict((column,df.Take['ROOT::RVec<float>'](column)) for column, _, _, _ in pytools) # single event loop
+  pt       = np.concatenate([np.full(len(t[1]),t[0]) for t in taus])
+  eta, dm, genmatch = [np.concatenate([t[i] for t in taus]) for i in [1,2,3]]
+  nbad     = 0
+  for column, tool, unc, getter in pytools:
+    sfs = np.concatenate([np.array(v) for v in results[column].GetValue()])
+    if getter=='getSFvsEtaBatch':
+      expected = getattr(tool,getter)(eta,genmatch,unc)
+    else:
+      expected = getattr(tool,getter)(pt,dm,genmatch,unc)
+    diff = np.abs(sfs-expected)
+    bad  = diff>tolerance*np.maximum(1.,np.abs(expected))
+    print(">>>   %-20s %s"%(column,red("%d / %d differ (max. %.3g)"%(bad.sum(),len(bad),diff.max())) if bad.any() else
+                                   green("%d SFs agree (max. diff. %.3g)"%(len(bad),diff.max()))))
+    if bad.any():
+      nbad += 1
+      for i in np.flatnonzero(bad)[:5]:
+        print(">>>     pt=%s, eta=%s, dm=%s, genmatch=%s: RDataFrame %.6f vs. python %.6f"%(
+              pt[i],eta[i],dm[i],genmatch[i],sfs[i],expected[i]))
+  return nbad
+
+
+def main(args):
+  nbad = 0
+  for year in args.years:
+    print(">>> Checking %s..."%(year))
+    nbad += checkRDataFrame(year,args.id,args.wp,args.wp_vsele,'DeepTau2017v2p1VSe','VVLoose','DeepTau2017v2p1VSmu','Tight')
+  print(">>> %s"%(red("%d columns differ"%(nbad)) if nbad else green("All columns agree")))
+  return nbad
+
+
+if __name__ == '__main__':
+  description = """Compare the SF columns of RDataFrame to the python tools."""
+  parser = ArgumentParser(prog="testRDataFrame.py",description=description,epilog="Good luck!")
+  parser.add_argument('-y', '--year',     dest='years', nargs='+', default=['UL2016_preVFP','UL2016_postVFP','UL2017','UL2018'],
+                                          help="years to check, default: %(default)s" )
+  parser.add_argument('-i', '--id',       default='DeepTau2018v2p5VSjet',
+                                          help="tau ID vs. jet, default: %(default)s" )
+  parser.add_argument('-w', '--wp',       default='Medium',
+                                          help="WP vs. jet, default: %(default)s" )
+  parser.add_argument('-e', '--wp-vsele', dest='wp_vsele', default='VVLoose',
+                                          help="WP vs. electrons of the tau ID vs. jet, default: %(default)s" )
+  args = parser.parse_args()
+  sys.exit(1 if main(args) else 0)
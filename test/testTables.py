@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+# Description: Check the keys of the flat payload tables (python/tables.py): eras are spelled the same for
+#              eras parsed from file and object names, and objects of different eras in one file are not merged
+# Usage:
+#   ./test/testTables.py
+from __future__ import print_function
+import os, sys
+from glob import glob
+import numpy as np
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import datapath
+  from TauPOG.TauIDSFs.tables import payloadTables, getEra
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from TauIDSFTool import datapath
+  from tables import payloadTables, getEra
+
+def green(string,**kwargs): return "\x1b[0;32;40m%s\033[0m"%string
+def red(string,**kwargs):   return "\x1b[1;31m%s\033[0m"%string
+
+
+def checkGetEra():
+  """Check the era of an object for eras parsed from the file and object names."""
+  nbad = 0
+  for fileera, objera, expected in [
+    ('2023',           '2023C',        '2023C'),        # more specific era of object
+    ('2023',           None,           '2023'),
+    ('UL2016_postVFP', '2016_postVFP', '2016_postVFP'), # same spelling for file and object
+    ('UL2018',         None,           '2018'),
+    (None,             '2022_postEE',  '2022_postEE'),
+    ('2018',           '2017',         '2018'),         # file wins if the eras are inconsistent
+  ]:
+    era = getEra(fileera,objera)
+    if era!=expected:
+      print(">>>   getEra(%r,%r) = %r, expected %r"%(fileera,objera,era,expected))
+      nbad += 1
+  return nbad
+
+
+def checkTables(path=datapath):
+  """Check that the rows of each object in the 2023 TES files have a unique era, DM and uncertainty,
+  and that no era has the 'UL' prefix."""
+  nbad      = 0
+  filenames = sorted(glob(os.path.join(path,"TauES_SF_dm_*_2023_*.root")))
+  tables    = payloadTables(path=path)
+  for name, table in tables.items():
+    eras = set(e for e in table['era'] if e)
+    if any(e.startswith('UL') for e in eras):
+      print(">>>   %s: eras with 'UL' prefix: %s"%(name,', '.join(sorted(e for e in eras if e.startswith('UL')))))
+      nbad += 1
+  functions = tables['functions']
+  for filename in filenames:
+    mask  = functions['file']==os.path.basename(filename)
+    keys  = list(zip(functions['era'][mask],functions['dm'][mask],functions['uncertainty'][mask]))
+    eras  = sorted(set(functions['era'][mask]))
+    if not mask.any() or len(set(keys))!=len(keys) or eras!=['2023C','2023D']:
+      print(">>>   %s: %d objects, %d unique keys, eras %s"%(os.path.basename(filename),mask.sum(),len(set(keys)),eras))
+      nbad += 1
+  print(">>> Checked %d 2023 TES files"%(len(filenames)))
+  return nbad
+
+
+def main():
+  nbad  = checkGetEra()
+  nbad += checkTables()
+  print(">>> %s"%(red("%d checks failed"%(nbad)) if nbad else green("All checks passed")))
+  return nbad
+
+
+if __name__ == '__main__':
+  sys.exit(1 if main() else 0)
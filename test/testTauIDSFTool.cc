@@ -14,6 +14,7 @@
 #include <string>
 #include <vector>
 #include <chrono>
+#include <stdexcept> // std::invalid_argument
 
 
 void printSFTable(std::string year, std::string id, std::string wp, std::string wp_vsele, std::string vs, const bool emb=false){
@@ -195,6 +196,50 @@ void printSFTable(std::string year, std::string id, std::string wp, std::string
 
 
 
+void checkBatch(std::string year, std::string id, std::string wp, std::string wp_vsele, std::string vs){
+  // compare the batched getters with pre-resolved uncertainties to the scalar getters
+  TauIDSFTool* sftool = new TauIDSFTool(year,id,wp,wp_vsele,vs=="dm",vs=="ptdm",false,vs=="highpt");
+  std::vector<std::string> uncerts = {"","Up","Down"};
+  if (vs=="ptdm") uncerts = sftool->getUncertainties();
+  if (vs=="highpt") uncerts = {"stat_up","stat_down","stat_bin1_up","stat_bin1_down","stat_bin2_up","stat_bin2_down","syst_up","syst_down","extrap_up","extrap_down"};
+  if (vs=="ptdm" || vs=="highpt") uncerts.insert(uncerts.begin(),"");
+  ROOT::RVec<double> xvals; // pT, or eta
+  ROOT::RVec<int> DMs, genmatches;
+  for (double x: {-2.2,-1.0,0.0,0.5,1.6,2.4,20.,25.,30.,45.,70.,100.,139.,150.,199.,200.,300.,1000.})
+    for (int dm: {0,1,2,10,11})
+      for (int genmatch: {0,1,2,3,4,5,6}) {
+        xvals.push_back(x); DMs.push_back(dm); genmatches.push_back(genmatch);
+      }
+  ROOT::RVec<float> sfs;
+  int nbad = 0;
+  for(auto const& unc: uncerts){
+    TauIDSFTool::UncHandle handle = sftool->getUncHandle(unc);
+    if (vs=="ptdm")        sftool->getSFvsDMandPT(xvals,DMs,genmatches,sfs,handle);
+    else if (vs=="highpt") sftool->getHighPTSFvsPT(xvals,genmatches,sfs,handle);
+    else if (vs=="pt")     sftool->getSFvsPT(xvals,genmatches,sfs,handle);
+    else if (vs=="dm")     sftool->getSFvsDM(xvals,DMs,genmatches,sfs,handle);
+    else                   sftool->getSFvsEta(xvals,genmatches,sfs,handle);
+    for(std::size_t i=0; i<xvals.size(); i++){
+      float sf = (vs=="ptdm")   ? sftool->getSFvsDMandPT(xvals[i],DMs[i],genmatches[i],unc) :
+                 (vs=="highpt") ? sftool->getHighPTSFvsPT(xvals[i],genmatches[i],unc) :
+                 (vs=="pt")     ? sftool->getSFvsPT(xvals[i],genmatches[i],unc) :
+                 (vs=="dm")     ? sftool->getSFvsDM(xvals[i],DMs[i],genmatches[i],unc) :
+                                  sftool->getSFvsEta(xvals[i],genmatches[i],unc);
+      if (sf!=sfs[i]) nbad++;
+    }
+  }
+  if (vs=="ptdm") { // unknown uncertainties should not silently give the nominal SF
+    for (const std::string unc: {"uncert0_upp","syst_alldms_2000_up"}) {
+      try { sftool->getSFvsDMandPT(50.,0,5,unc); nbad++; } catch (const std::invalid_argument&) { }
+      try { sftool->getUncHandle(unc); nbad++; } catch (const std::invalid_argument&) { }
+    }
+  }
+  std::cout << ">>> Batched "<<vs<<" SFs for "<<wp<<" WP of "<<id<<" in "<<year<<" with "<<uncerts.size()<<" variations: "
+            << (nbad ? std::to_string(nbad)+" differences from the scalar getters!" : "OK") << std::endl;
+  delete sftool;
+}
+
+
 int main(int argc, char* argv[]){
   std::cout << ">>> " << std::endl;
   std::cout << ">>> testTauIDSFTool" << std::endl;
@@ -227,6 +272,7 @@ int main(int argc, char* argv[]){
         for(auto const& wp: WPs){
           if(id=="antiMu3" and wp=="Medium") continue;
           if(vs!="pt" && vs!="dm") printSFTable(year,id,wp,wp_vsele,vs);
+          if(vs!="pt" && vs!="dm") checkBatch(year,id,wp,wp_vsele,vs);
           if(year.find("UL")==std::string::npos  && !(vs=="ptdm" || vs=="highpt")&&(id=="DeepTau2017v2p1VSjet" || id=="DeepTau2018v2p5VSjet")) // do not test embed for UL at the moment as these SFs don't exist yet
             printSFTable(year,id,wp,wp_vsele,vs,true);
         }
@@ -10,12 +10,12 @@ start1 = time.time()
 def green(string,**kwargs): return "\x1b[0;32;40m%s\033[0m"%string
 
 def printSFTable(year,id,wp,vs='pt',emb=False,otherVSlepWP=False):
-  assert vs in ['pt','highpt','dm','ptdm','eta'], "'vs' argument should be 'pt', 'dm', 'ptdm', or 'eta'!"
+  assert vs in ['pt','highpt','dm','ptdm','dmincl','eta'], "'vs' argument should be 'pt', 'dm', 'ptdm', 'dmincl', or 'eta'!"
   dm = (vs=='dm')
   if emb and 'VSjet' not in id:
       print("SFs for ID '%s' not available for embedded samples. Skipping..."%id)
       return
-  sftool = TauIDSFTool(year,id,wp,dm=dm,emb=emb,otherVSlepWP=otherVSlepWP,highpT=(vs is 'highpt'))
+  sftool = TauIDSFTool(year,id,wp,dm=dm,emb=emb,otherVSlepWP=otherVSlepWP,highpT=(vs is 'highpt'),dminclusive=(vs=='dmincl'))
   if vs=='ptdm':
       ptvals = [10,20,40,100,140,200]
       dmvals = [0,1,5,6,10,11]
@@ -36,6 +36,18 @@ def printSFTable(year,id,wp,vs='pt',emb=False,otherVSlepWP=False):
           print(">>> %20s"%(u+"_up")      +''.join("%9.5f"%sftool.getSFvsDMandPT(pt,dm,5,u.replace('dmX','dm%s' % dm)+'_up')   for dm in dmvals))
           print(">>> %20s"%(u+"_down")    +''.join("%9.5f"%sftool.getSFvsDMandPT(pt,dm,5,u.replace('dmX','dm%s' % dm)+'_down') for dm in dmvals))
         print(">>> ")
+  elif vs=='dmincl':
+      ptvals = [10,20,40,100,140,145,200,250,300]
+      uncerts=sorted(set(u[:u.rindex('_')] for u in sftool.funcs_incl if u!='nom'))
+      print(">>> ")
+      print(">>> DM-inclusive SF for %s WP of %s in %s"%(wp,green(id),year))
+      print(">>> ")
+      print(">>> %20s"%('var \ pt')+''.join("%9.1f"%pt for pt in ptvals))
+      print(">>> %20s"%("central") +''.join("%9.5f"%sftool.getDMInclusiveSFvsPT(pt,5)        for pt in ptvals))
+      for u in uncerts:
+        print(">>> %20s"%(u+"_up")      +''.join("%9.5f"%sftool.getDMInclusiveSFvsPT(pt,5,u+"_up")   for pt in ptvals))
+        print(">>> %20s"%(u+"_down")    +''.join("%9.5f"%sftool.getDMInclusiveSFvsPT(pt,5,u+"_down") for pt in ptvals))
+      print(">>> ")
   elif vs=='highpt':
       ptvals = [50,100,150,200,300,400,500,690,1000]
       uncerts=['stat','stat_bin1','stat_bin2','syst','extrap']
@@ -169,7 +181,7 @@ if __name__ == "__main__":
 
   for year in years:
     for id in tauIDs:
-      vslist = ['eta'] if any(s in id for s in ['anti','VSe','VSmu']) else (['pt','dm'] if emb else ['ptdm','highpt']) 
+      vslist = ['eta'] if any(s in id for s in ['anti','VSe','VSmu']) else (['pt','dm'] if emb else ['ptdm','dmincl','highpt']) 
       for vs in vslist:
         for wp in WPs:
           if 'antiMu' in id and wp=='Medium': continue
@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+# Description: Compile the SF payloads of all ROOT files in data/ into a single memory-mapped binary store
+#              that is used by the tools instead of opening the ROOT files
+from __future__ import print_function
+import os, sys
+from glob import glob
+from argparse import ArgumentParser
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.payloadcache import buildPayloadCache, PayloadCache, cachename
+  from TauPOG.TauIDSFs.helpers import getBackend
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from payloadcache import buildPayloadCache, PayloadCache, cachename
+  from helpers import getBackend
+datapath = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../data")
+
+
+def main(args):
+  filenames = args.filenames or sorted(glob(os.path.join(args.datapath,"*.root")))
+  output    = args.output or os.path.join(args.datapath,cachename)
+  backend   = args.backend or getBackend()
+  print(">>> Compiling %d files into '%s' with %s..."%(len(filenames),output,backend))
+  buildPayloadCache(filenames,output,backend=backend,verbose=args.verbose)
+  cache   = PayloadCache(output)
+  nobjs   = sum(len(f['objects']) for f in cache.index['files'].values())
+  skipped = sum(len(f['skipped']) for f in cache.index['files'].values())
+  print(">>> Wrote %d objects (%d numbers, %.1f kB); skipped %d objects of unsupported classes"%(
+        nobjs,len(cache.data),os.path.getsize(output)/1024.,skipped))
+
+
+if __name__ == '__main__':
+  description = """Compile the SF payloads (TH1, TGraph, TF1) into a memory-mapped binary store."""
+  parser = ArgumentParser(prog="createPayloadCache.py",description=description,epilog="Good luck!")
+  parser.add_argument('filenames',        nargs='*',
+                                          help="ROOT files to compile, default: all in the data directory" )
+  parser.add_argument('-d', '--datapath', default=datapath,
+                                          help="data directory, default: %(default)s" )
+  parser.add_argument('-o', '--output',   default=None,
+                                          help="output file, default: %s in the data directory"%(cachename) )
+  parser.add_argument('-b', '--backend',  choices=['ROOT','uproot'], default=None,
+                                          help="read ROOT files with ROOT or uproot, default: ROOT if available" )
+  parser.add_argument('-v', '--verbose',  action='store_true',
+                                          help="print verbose" )
+  args = parser.parse_args()
+  main(args)
+  print(">>> Done!")
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# Description: Convert the tau SF tools for all available years, IDs and WPs into correctionlib (schema v2) corrections,
+#              and write them to one JSON file, optionally validated against the tools
+# Usage:
+#   ./utils/exportCorrectionlib.py -o TauIDSFs.json.gz
+#   ./utils/exportCorrectionlib.py -y UL2018 -m ptdm highpT tes -o TauIDSFs_UL2018.json --validate
+from __future__ import print_function
+import os, sys
+from argparse import ArgumentParser
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool, campaigns, datapath
+  from TauPOG.TauIDSFs.correctionset import getCorrections, correctionSet, writeCorrectionSet, CorrectionlibTool
+  from TauPOG.TauIDSFs.helpers import ensurePayloadFile
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from TauIDSFTool import TauIDSFTool, TauESTool, TauFESTool, JetToTauFakeRateTool, campaigns, datapath
+  from correctionset import getCorrections, correctionSet, writeCorrectionSet, CorrectionlibTool
+  from helpers import ensurePayloadFile
+modes    = ['pt','dm','ptdm','highpT','eta','tes','fes','fakerate']
+wps      = ['VVVLoose','VVLoose','VLoose','Loose','Medium','Tight','VTight','VVTight']
+wps_ptdm = ['Loose','Medium','Tight','VTight']
+wps_vse  = ['VVLoose','Tight']
+
+
+def hasObject(filename, name):
+  """Check if a payload file exists and contains an object."""
+  if not os.path.isfile(filename):
+    return False
+  file  = ensurePayloadFile(filename)
+  found = bool(file.Get(name))
+  file.Close()
+  return found
+
+
+def getConfigs(year, modes):
+  """Yield the name of the correction, and the class and arguments of the tool for all IDs and WPs of a year."""
+  run2 = year in campaigns
+  for id in ['MVAoldDM2017v2','DeepTau2017v2p1VSjet']:
+    for wp in wps:
+      if run2 and 'pt' in modes and hasObject(os.path.join(datapath,"TauID_SF_pt_%s_%s.root"%(id,year)),wp+"_cent"):
+        yield "TauID_SF_pt_%s_%s_%s"%(id,year,wp), TauIDSFTool, (year,id,wp), dict(ptdm=False)
+      if run2 and 'dm' in modes:
+        yield "TauID_SF_dm_%s_%s_%s"%(id,year,wp), TauIDSFTool, (year,id,wp), dict(ptdm=False,dm=True)
+  for id in ['DeepTau2017v2p1VSjet','DeepTau2018v2p5VSjet']:
+    for wp in wps_ptdm:
+      for wp_vsele in wps_vse:
+        if not year.startswith('UL'): # only for UL campaigns
+          continue
+        if 'ptdm' in modes:
+          yield "TauID_SF_dm_pt_%s_%s_VSjet%s_VSele%s"%(id,year,wp,wp_vsele), TauIDSFTool, (year,id,wp,wp_vsele), dict()
+        if 'highpT' in modes:
+          yield "TauID_SF_Highpt_%s_%s_VSjet%s_VSele%s"%(id,year,wp,wp_vsele), TauIDSFTool, (year,id,wp,wp_vsele), dict(ptdm=False,highpT=True)
+  for id in ['antiMu3','antiEleMVA6','DeepTau2017v2p1VSmu','DeepTau2017v2p1VSe']:
+    for wp in wps:
+      if run2 and 'eta' in modes:
+        yield "TauID_SF_eta_%s_%s_%s"%(id,year,wp), TauIDSFTool, (year,id,wp), dict()
+  if 'tes' in modes:
+    for id in ['MVAoldDM2017v2','DeepTau2017v2p1VSjet']:
+      if run2:
+        yield "TauES_dm_%s_%s"%(id,year), TauESTool, (year,id), dict()
+    for wp in wps_ptdm:
+      for wp_vsele in wps_vse:
+        yield "TauES_dm_DeepTau2018v2p5VSjet_%s_VSjet%s_VSele%s"%(year,wp,wp_vsele), TauESTool, (year,'DeepTau2018v2p5VSjet',wp,wp_vsele), dict()
+  if 'fes' in modes:
+    if run2:
+      yield "TauFES_eta-dm_DeepTau2017v2p1VSe_%s"%(year), TauFESTool, (year,), dict()
+    else:
+      for wp in wps_vse:
+        yield "TauFES_eta-dm_DeepTau2018v2p5VSe_%s_%s"%(year,wp), TauFESTool, (year,'DeepTau2018v2p5VSe'), dict(wp=wp)
+  if 'fakerate' in modes and year.startswith('UL'):
+    for wp in ['Loose','Medium','Tight']:
+      yield "JetToTauFakeRates_DeepTau2018v2p5VSjet_%s_%s"%(year,wp), JetToTauFakeRateTool, (year,'DeepTau2018v2p5VSjet',wp), dict()
+
+
+def main(args):
+  corrections = [ ]
+  for year in args.years:
+    for name, cls, targs, kwargs in getConfigs(year,args.modes):
+      try:
+        tool = cls(*targs,verbose=args.verbose,**kwargs)
+      except (IOError, AssertionError) as error: # payload not available
+        if args.verbose:
+          print(">>> Skipping %s: %s"%(name,error))
+        continue
+      if args.validate:
+        deviation = max(CorrectionlibTool(tool,name,tolerance=args.tolerance).validate().values())
+        print(">>> %-70s maximum deviation %.3g"%(name,deviation))
+      elif args.verbose:
+        print(">>> %s"%(name))
+      corrections.extend(getCorrections(tool,name))
+  cset = correctionSet(corrections,description="Tau SFs, energy scales and fake rates of the TauPOG")
+  writeCorrectionSet(cset,args.output)
+  print(">>> Wrote %d corrections to %s (%.1f kB)"%(len(corrections),args.output,os.path.getsize(args.output)/1024.))
+
+
+if __name__ == '__main__':
+  description = """Convert the tau SF tools into correctionlib (schema v2) corrections in one JSON file."""
+  parser = ArgumentParser(prog="exportCorrectionlib.py",description=description,epilog="Good luck!")
+  parser.add_argument('-y', '--years',     nargs='+', default=campaigns,
+                                           help="years to export (including Run 3 eras), default: all Run 2 campaigns" )
+  parser.add_argument('-m', '--modes',     nargs='+', choices=modes, default=modes,
+                                           help="modes to export, default: all" )
+  parser.add_argument('-o', '--output',    default="TauIDSFs.json.gz",
+                                           help="output JSON file, compressed if it ends with '.gz', default: %(default)s" )
+  parser.add_argument('--validate',        action='store_true',
+                                           help="compare the corrections to the tools with correctionlib" )
+  parser.add_argument('-t', '--tolerance', type=float, default=1e-12,
+                                           help="maximum deviation allowed in the validation, default: %(default)s" )
+  parser.add_argument('-v', '--verbose',   action='store_true',
+                                           help="print verbose" )
+  args = parser.parse_args()
+  main(args)
+  print(">>> Done!")
@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+# Description: Export the contents of all SF payloads in data/ (histogram bins, graph points and function parameters)
+#              to flat Apache Arrow or Parquet tables, which can be joined onto tau tables without ROOT
+# Usage:
+#   ./utils/exportTables.py -o tables/                 # tables/{histograms,graphs,functions}.parquet
+#   ./utils/exportTables.py -o tables/ -f arrow         # Arrow IPC files
+from __future__ import print_function
+import os, sys
+from argparse import ArgumentParser
+if 'CMSSW_BASE' in os.environ: # assume CMSSW environment
+  from TauPOG.TauIDSFs.tables import payloadTables, writeTables, formats
+else:
+  sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"../python"))
+  from tables import payloadTables, writeTables, formats
+datapath = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../data")
+
+
+def main(args):
+  tables = payloadTables(args.filenames,path=args.datapath,backend=args.backend,verbose=args.verbose)
+  for name, table in tables.items():
+    nobjs = len(set(table['file']+'/'+table['object'])) if len(table['file']) else 0
+    print(">>> %-10s %6d rows from %4d objects"%(name,len(table['file']),nobjs))
+  for outfile in writeTables(tables,args.outdir,format=args.format,compression=args.compression):
+    print(">>> Wrote %s (%.1f kB)"%(outfile,os.path.getsize(outfile)/1024.))
+
+
+if __name__ == '__main__':
+  description = """Export all SF payloads (TH1, TGraph, TF1) to Apache Arrow or Parquet tables."""
+  parser = ArgumentParser(prog="exportTables.py",description=description,epilog="Good luck!")
+  parser.add_argument('filenames',           nargs='*',
+                                             help="ROOT files to export, default: all in the data directory" )
+  parser.add_argument('-d', '--datapath',    default=datapath,
+                                             help="data directory, default: %(default)s" )
+  parser.add_argument('-o', '--outdir',      default="tables",
+                                             help="output directory, default: %(default)s" )
+  parser.add_argument('-f', '--format',      choices=sorted(formats), default='parquet',
+                                             help="output format, default: %(default)s" )
+  parser.add_argument('-c', '--compression', default='zstd',
+                                             help="Parquet compression, default: %(default)s" )
+  parser.add_argument('-b', '--backend',     choices=['ROOT','uproot'], default=None,
+                                             help="read ROOT files with ROOT or uproot, default: ROOT if available" )
+  parser.add_argument('-v', '--verbose',     action='store_true',
+                                             help="print verbose" )
+  args = parser.parse_args()
+  main(args)
+  print(">>> Done!")